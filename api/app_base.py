@@ -1,14 +1,32 @@
+import functools
 import logging
 import os
 import pathlib
+from inference.admission import AdmissionController
+from inference.batch_predict import predict_frame
+from inference.columnar import predictions_to_frame
+from inference.jobs import BulkJobs
+from inference.micro_batching import MicroBatcher
+from inference.model_reload import (
+    ModelReloader,
+    pickle_bundle_version,
+    mlflow_registry_version,
+)
+from inference.prediction_cache import PredictionCache
+from inference.shadow import ShadowScorer
+from inference.warmup import synthetic_frame
 from log.sqlite_logging_handler import SQLiteLoggingHandler
 from metrics.prometheus_metrics import (
     RequestMonitor,
     DriftMonitor,
+    DriftQueue,
+    StreamingDriftMonitor,
+    WindowedDriftMonitor,
     distribution_summary_statistics,
     categorical_summary_statistics,
     pass_api_version_to_prometheus,
     record_metrics_from_dict,
+    unregister_metrics,
 )
 import sys
 
@@ -17,12 +35,24 @@ import sys
 current = os.path.dirname(os.path.realpath(__file__))
 parent_directory = os.path.dirname(current)
 sys.path.append(parent_directory)
-from model_store import ModelStore, MlFlowModelStore, PickleModelStore
+from model_store import ModelStore, load_model_store
 
 # Do other local imports in similar manner if needed, i.e.
 # from ml_pipe import your_module
 
 
+def env_flag(name: str, default: str = "false") -> bool:
+    """
+    Read a boolean environment variable, accepts 'true' or 'false'
+    """
+    value = os.getenv(name, default).lower()
+    if "false" == value:
+        return False
+    elif "true" == value:
+        return True
+    raise ValueError(f"Invalid value for {name}: {value}")
+
+
 LOG_DB = "sqlite:///../local_data/logs.sqlite"
 # model store path and version if using pickle store
 PICKLE_STORE_PATH = os.getenv("PICKLE_STORE_PATH", "../local_data/pickle_store/")
@@ -39,6 +69,77 @@ MLFLOW_REGISTRY_URI = os.getenv(
 MLFLOW_MODEL_NAME = os.getenv("MLFLOW_MODEL_NAME", "model")
 MLFLOW_MODEL_VERSION = os.getenv("MLFLOW_MODEL_VERSION", "latest")
 
+# maximum number of rows passed to the model in a single call.
+# larger requests are predicted in chunks to cap peak memory
+PREDICT_CHUNK_SIZE = int(os.getenv("PREDICT_CHUNK_SIZE", 10000))
+# number of rows scored at a time by the streaming (ndjson) endpoint
+NDJSON_CHUNK_SIZE = int(os.getenv("NDJSON_CHUNK_SIZE", 1000))
+# opt-in micro-batching of concurrent requests: wait up to MICRO_BATCH_MAX_WAIT_SECONDS
+# for other requests, or until MICRO_BATCH_MAX_SIZE rows are queued, and predict them at once
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", 256))
+MICRO_BATCH_MAX_WAIT_SECONDS = float(os.getenv("MICRO_BATCH_MAX_WAIT_SECONDS", 0.005))
+# opt-in cache of predictions for repeated feature vectors
+PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", 100000))
+PREDICTION_CACHE_TTL_SECONDS = float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", 3600))
+# opt-in warm up of the prediction path with synthetic rows at startup
+WARMUP_ROWS = int(os.getenv("WARMUP_ROWS", 100))
+# poll the model store for a new model version every MODEL_RELOAD_INTERVAL_SECONDS
+# and swap it in without restart. 0 disables hot reload
+MODEL_RELOAD_INTERVAL_SECONDS = float(os.getenv("MODEL_RELOAD_INTERVAL_SECONDS", 0))
+# opt-in shadow model, scored in background and compared with the primary model.
+# loaded from the same model store as the primary model
+SHADOW_PICKLE_FILENAME = os.getenv("SHADOW_PICKLE_FILENAME", "bundle_shadow.pickle")
+SHADOW_MLFLOW_MODEL_NAME = os.getenv("SHADOW_MLFLOW_MODEL_NAME", MLFLOW_MODEL_NAME)
+SHADOW_MLFLOW_MODEL_VERSION = os.getenv("SHADOW_MLFLOW_MODEL_VERSION", "Staging")
+SHADOW_QUEUE_SIZE = int(os.getenv("SHADOW_QUEUE_SIZE", 100))
+SHADOW_WORKERS = int(os.getenv("SHADOW_WORKERS", 1))
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", 1.0))
+# opt-in admission control: limit requests and rows processed at once, and reject
+# requests with 503 when too many are waiting. keep threads free for other endpoints
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", 8))
+ADMISSION_MAX_QUEUE_DEPTH = int(os.getenv("ADMISSION_MAX_QUEUE_DEPTH", 32))
+ADMISSION_MAX_ROWS_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_ROWS_IN_FLIGHT", 100000))
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", 1.0))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", 1))
+ADMISSION_RESERVED_THREADS = int(os.getenv("ADMISSION_RESERVED_THREADS", 4))
+# bulk scoring jobs: spool directory, rows scored at a time, scoring threads
+JOBS_SPOOL_DIR = os.getenv("JOBS_SPOOL_DIR", "../local_data/jobs")
+JOBS_CHUNK_SIZE = int(os.getenv("JOBS_CHUNK_SIZE", 10000))
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", 1))
+JOBS_MAX_QUEUED = int(os.getenv("JOBS_MAX_QUEUED", 100))
+# drift queue backups: new rows are logged every DRIFT_BACKUP_INTERVAL_SECONDS and
+# the queues compacted every DRIFT_SNAPSHOT_INTERVAL_SECONDS by a background thread
+DRIFT_QUEUE_OPTIONS = {
+    "backup_interval_seconds": float(os.getenv("DRIFT_BACKUP_INTERVAL_SECONDS", 1.0)),
+    "snapshot_interval_seconds": float(
+        os.getenv("DRIFT_SNAPSHOT_INTERVAL_SECONDS", 60.0)
+    ),
+    "backup_fsync": os.getenv("DRIFT_BACKUP_FSYNC", "snapshot"),
+    "backup_compression": os.getenv("DRIFT_BACKUP_COMPRESSION", "lz4"),
+    # store float columns as float32, opt-in: changes summary statistics values
+    "compact_dtypes": env_flag("DRIFT_QUEUE_COMPACT_DTYPES"),
+}
+# sliding windows of windowed drift statistics: comma separated name=seconds pairs,
+# refreshed every DRIFT_REFRESH_SECONDS. DRIFT_DECAY_HALF_LIFE is a fraction of the window
+DRIFT_WINDOWS = {
+    name: float(seconds)
+    for name, _, seconds in (
+        window.strip().partition("=")
+        for window in os.getenv("DRIFT_WINDOWS", "5m=300,1h=3600,24h=86400").split(",")
+    )
+}
+DRIFT_REFRESH_SECONDS = float(os.getenv("DRIFT_REFRESH_SECONDS", 15.0))
+DRIFT_DECAY_HALF_LIFE = float(os.getenv("DRIFT_DECAY_HALF_LIFE", 0.0))
+# characters stored per string value in shared drift queues
+DRIFT_QUEUE_STRING_WIDTH = int(os.getenv("DRIFT_QUEUE_STRING_WIDTH", 64))
+# input drift queue: 'fifo' keeps the latest rows, 'reservoir' a random sample of
+# the rows of each DRIFT_SAMPLING_HORIZON_SECONDS, e.g. a daily baseline
+DRIFT_QUEUE_SAMPLING = os.getenv("DRIFT_QUEUE_SAMPLING", "fifo")
+DRIFT_SAMPLING_HORIZON_SECONDS = float(
+    os.getenv("DRIFT_SAMPLING_HORIZON_SECONDS", 86400)
+)
+
+
 # Introduce SQL logging after init
 logging.getLogger().addHandler(SQLiteLoggingHandler(db_uri=LOG_DB))
 logging.getLogger().setLevel(logging.INFO)
@@ -54,25 +155,16 @@ else:
 
 # Load model and schema definitions & train/val workflow metrics from model store
 model_store_impl = str(os.getenv("MODEL_STORE", "").lower())
-logging.info(f"Configured model store: {model_store_impl}")
-if "mlflow" == model_store_impl:
-    logging.info(
-        f"Loading model from mlflow store: model_name={MLFLOW_MODEL_NAME}, model_version={MLFLOW_MODEL_VERSION}, tracking_uri={MLFLOW_TRACKING_URI}, registry_uri={MLFLOW_REGISTRY_URI}"
-    )
-    model_store: ModelStore = MlFlowModelStore(
-        model_name=MLFLOW_MODEL_NAME,
-        model_version=MLFLOW_MODEL_VERSION,
-        tracking_uri=MLFLOW_TRACKING_URI,
-        registry_uri=MLFLOW_REGISTRY_URI,
-    )
-elif "pickle" == model_store_impl:
-    logging.info(f"Loading model from pickle store: {MODEL_PATH}")
-    model_store: ModelStore = PickleModelStore(bundle_uri=MODEL_PATH).load_bundle()
-else:
-    raise ValueError(f"Invalid value for MODEL_STORE: {model_store_impl}")
-
-# ML model
-model = model_store.model
+load_configured_model_store = functools.partial(
+    load_model_store,
+    model_store_impl,
+    bundle_uri=MODEL_PATH,
+    model_name=MLFLOW_MODEL_NAME,
+    model_version=MLFLOW_MODEL_VERSION,
+    tracking_uri=MLFLOW_TRACKING_URI,
+    registry_uri=MLFLOW_REGISTRY_URI,
+)
+model_store: ModelStore = load_configured_model_store()
 
 # Model train/test workflow metrics
 train_val_metrics = model_store.train_metrics
@@ -80,6 +172,123 @@ train_val_metrics = model_store.train_metrics
 # pass metrics to prometheus
 train_metrics = record_metrics_from_dict(train_val_metrics)
 
+
+def warm_up_model_store(new_model_store: ModelStore):
+    """
+    Warm up a newly loaded model with synthetic rows before it is swapped in
+    """
+    X = synthetic_frame(new_model_store.request_columns, WARMUP_ROWS)
+    predict_frame(new_model_store.model, X, chunk_size=PREDICT_CHUNK_SIZE)
+
+
+def swap_train_metrics(old_model_store: ModelStore, new_model_store: ModelStore):
+    """
+    Replace train/test workflow metrics of the old model with those of the new one
+    """
+    global train_metrics
+    unregister_metrics(train_metrics)
+    train_metrics = record_metrics_from_dict(new_model_store.train_metrics)
+
+
+model_reloader = ModelReloader(
+    model_store,
+    load_function=load_configured_model_store,
+    version_function=(
+        mlflow_registry_version(
+            MLFLOW_MODEL_NAME,
+            MLFLOW_MODEL_VERSION,
+            MLFLOW_TRACKING_URI,
+            MLFLOW_REGISTRY_URI,
+        )
+        if "mlflow" == model_store_impl
+        else pickle_bundle_version(MODEL_PATH)
+    ),
+    interval_seconds=MODEL_RELOAD_INTERVAL_SECONDS,
+    warm_up_function=warm_up_model_store,
+    on_swap=swap_train_metrics,
+)
+setting_model_reload = MODEL_RELOAD_INTERVAL_SECONDS > 0
+
+
+def predict_with_model_store(store: ModelStore, X):
+    """
+    Predict with the model of a model store. If the store has materialized
+    predictions for the input space, rows are looked up and only rows
+    outside the declared input domains are passed to the model
+    """
+    predict_model = functools.partial(
+        predict_frame, store.model, chunk_size=PREDICT_CHUNK_SIZE
+    )
+    if store.prediction_table is None:
+        return predict_model(X)
+    return store.prediction_table.predict(X, predict_model)
+
+
+def predict_current_model(X):
+    """
+    Predict with the current model. The model is read once,
+    so a request is predicted by a single model even if it is swapped meanwhile
+    """
+    return predict_with_model_store(model_reloader.model_store, X)
+
+
+# Prediction function for typed input frames
+predict_batch = predict_current_model
+setting_micro_batching = env_flag("MICRO_BATCHING")
+if setting_micro_batching:
+    logging.info(
+        f"Micro-batching enabled: max_batch_size={MICRO_BATCH_MAX_SIZE}, max_wait_seconds={MICRO_BATCH_MAX_WAIT_SECONDS}"
+    )
+    predict_batch = MicroBatcher(
+        predict_batch,
+        max_batch_size=MICRO_BATCH_MAX_SIZE,
+        max_wait_seconds=MICRO_BATCH_MAX_WAIT_SECONDS,
+    ).predict
+setting_prediction_cache = env_flag("PREDICTION_CACHE")
+if setting_prediction_cache:
+    logging.info(
+        f"Prediction cache enabled: max_entries={PREDICTION_CACHE_MAX_ENTRIES}, ttl_seconds={PREDICTION_CACHE_TTL_SECONDS}"
+    )
+    predict_batch = PredictionCache(
+        predict_batch,
+        model_identity=lambda: model_reloader.model_store.model_identity,
+        max_entries=PREDICTION_CACHE_MAX_ENTRIES,
+        ttl_seconds=PREDICTION_CACHE_TTL_SECONDS,
+    ).predict
+
+setting_warmup = env_flag("WARMUP")
+
+# require HTTP basic authentication of prediction endpoints, see security/http_basic.py
+setting_predict_auth = env_flag("PREDICT_AUTH")
+
+setting_admission_control = env_flag("ADMISSION_CONTROL")
+admission_controller = None
+if setting_admission_control:
+    logging.info(
+        f"Admission control enabled: max_concurrency={ADMISSION_MAX_CONCURRENCY}, max_queue_depth={ADMISSION_MAX_QUEUE_DEPTH}, max_rows_in_flight={ADMISSION_MAX_ROWS_IN_FLIGHT}"
+    )
+    admission_controller = AdmissionController(
+        max_concurrency=ADMISSION_MAX_CONCURRENCY,
+        max_queue_depth=ADMISSION_MAX_QUEUE_DEPTH,
+        max_rows_in_flight=ADMISSION_MAX_ROWS_IN_FLIGHT,
+        max_wait_seconds=ADMISSION_MAX_WAIT_SECONDS,
+        retry_after_seconds=ADMISSION_RETRY_AFTER_SECONDS,
+    )
+
+# drift queues in shared memory: worker processes forked from this one put rows
+# to the same queues, and one of them computes the drift metrics
+setting_shared_drift_queues = env_flag("SHARED_DRIFT_QUEUES")
+if setting_shared_drift_queues:
+    logging.info(
+        f"Shared drift queues enabled: string_width={DRIFT_QUEUE_STRING_WIDTH}"
+    )
+    DRIFT_QUEUE_OPTIONS.update(shared=True, string_width=DRIFT_QUEUE_STRING_WIDTH)
+
+# input drift from streaming statistics: rows are not kept for computing drift metrics
+setting_streaming_drift_statistics = env_flag("STREAMING_DRIFT_STATISTICS")
+# input drift over sliding time windows, from streaming statistics too
+setting_windowed_drift_statistics = env_flag("WINDOWED_DRIFT_STATISTICS")
+
 # What for is this?
 version_info = pass_api_version_to_prometheus()
 
@@ -92,18 +301,125 @@ DynamicApiResponse = model_store.response_schema_class
 response_value_field = model_store.response_value_field
 response_value_type = model_store.response_value_type
 
-processing_drift = RequestMonitor(backup_file="../local_data/processing_fifo.feather")
-
-input_drift = DriftMonitor(
-    columns=model_store.request_columns,
-    backup_file="../local_data/input_fifo.feather",
-    metrics_name_prefix="input_drift_",
-    summary_statistics_function=distribution_summary_statistics,
+processing_drift = RequestMonitor(
+    backup_file="../local_data/processing_fifo.feather", **DRIFT_QUEUE_OPTIONS
 )
 
+if setting_windowed_drift_statistics:
+    logging.info(
+        f"Windowed input drift statistics enabled: windows={DRIFT_WINDOWS}, refresh_seconds={DRIFT_REFRESH_SECONDS}, decay_half_life={DRIFT_DECAY_HALF_LIFE}"
+    )
+    input_drift = WindowedDriftMonitor(
+        columns=model_store.request_columns,
+        windows=DRIFT_WINDOWS,
+        refresh_seconds=DRIFT_REFRESH_SECONDS,
+        decay_half_life=DRIFT_DECAY_HALF_LIFE,
+        metrics_name_prefix="input_drift_",
+    )
+elif setting_streaming_drift_statistics:
+    logging.info("Streaming input drift statistics enabled")
+    input_drift = StreamingDriftMonitor(
+        columns=model_store.request_columns, metrics_name_prefix="input_drift_"
+    )
+elif DRIFT_QUEUE_SAMPLING == "reservoir":
+    if setting_shared_drift_queues:
+        raise ValueError(
+            "DRIFT_QUEUE_SAMPLING=reservoir can not be combined with SHARED_DRIFT_QUEUES"
+        )
+    logging.info(
+        f"Reservoir sampled input drift queue enabled: horizon_seconds={DRIFT_SAMPLING_HORIZON_SECONDS}"
+    )
+    logging.warning(
+        "The reservoir sample of the input drift queue is not backed up, DRIFT_BACKUP_* settings apply to the other drift queues only"
+    )
+    input_drift = DriftMonitor(
+        columns=model_store.request_columns,
+        metrics_name_prefix="input_drift_",
+        summary_statistics_function=distribution_summary_statistics,
+        compact_dtypes=DRIFT_QUEUE_OPTIONS["compact_dtypes"],
+        sampling="reservoir",
+        sampling_horizon_seconds=DRIFT_SAMPLING_HORIZON_SECONDS,
+    )
+else:
+    input_drift = DriftMonitor(
+        columns=model_store.request_columns,
+        backup_file="../local_data/input_fifo.feather",
+        metrics_name_prefix="input_drift_",
+        summary_statistics_function=distribution_summary_statistics,
+        **DRIFT_QUEUE_OPTIONS,
+    )
+
 output_drift = DriftMonitor(
     columns=model_store.response_columns,
     backup_file="../local_data/output_fifo.feather",
     metrics_name_prefix="output_drift_",
     summary_statistics_function=categorical_summary_statistics,
+    **DRIFT_QUEUE_OPTIONS,
+)
+
+
+def use_worker_backup_files(worker_slot: int):
+    """
+    Back up the drift queues of a worker process to files of its own,
+    e.g. input_fifo.worker1.feather. Worker 0 keeps the default files.
+    Shared queues are backed up by the leader process to the default files.
+    """
+    if worker_slot == 0 or setting_shared_drift_queues:
+        return
+    for monitor in (processing_drift, input_drift, output_drift):
+        if not isinstance(monitor, DriftQueue) or monitor.backup_file == "":
+            continue  # not backed up
+        root, ext = os.path.splitext(monitor.backup_file)
+        monitor.set_backup_file(f"{root}.worker{worker_slot}{ext}")
+
+
+setting_shadow_model = env_flag("SHADOW_MODEL")
+shadow_scorer = None
+shadow_output_drift = None
+if setting_shadow_model:
+    shadow_model_store: ModelStore = load_model_store(
+        model_store_impl,
+        bundle_uri=str(
+            CONTEXT_PATH.joinpath(PICKLE_STORE_PATH + SHADOW_PICKLE_FILENAME)
+        ),
+        model_name=SHADOW_MLFLOW_MODEL_NAME,
+        model_version=SHADOW_MLFLOW_MODEL_VERSION,
+        tracking_uri=MLFLOW_TRACKING_URI,
+        registry_uri=MLFLOW_REGISTRY_URI,
+    )
+    logging.info(
+        f"Shadow model enabled: {shadow_model_store.model_identity}, sample_rate={SHADOW_SAMPLE_RATE}"
+    )
+    shadow_output_drift = DriftMonitor(
+        columns=model_store.response_columns,
+        metrics_name_prefix="shadow_output_drift_",
+        summary_statistics_function=categorical_summary_statistics,
+    )
+    shadow_scorer = ShadowScorer(
+        functools.partial(
+            predict_frame, shadow_model_store.model, chunk_size=PREDICT_CHUNK_SIZE
+        ),
+        max_queue_size=SHADOW_QUEUE_SIZE,
+        workers=SHADOW_WORKERS,
+        sample_rate=SHADOW_SAMPLE_RATE,
+        output_monitor=shadow_output_drift,
+    )
+
+
+def predict_job_chunk(X):
+    """
+    Predict a chunk of a bulk job. Bypasses micro-batching and prediction cache
+    """
+    return predictions_to_frame(
+        predict_current_model(X), response_value_field, response_value_type
+    )
+
+
+bulk_jobs = BulkJobs(
+    str(CONTEXT_PATH.joinpath(JOBS_SPOOL_DIR)),
+    predict_job_chunk,
+    model_store.request_columns,
+    chunk_size=JOBS_CHUNK_SIZE,
+    workers=JOBS_WORKERS,
+    max_queued=JOBS_MAX_QUEUED,
 )
@@ -0,0 +1,204 @@
+"""
+Offline batch scoring with the model from the model store.
+
+Loads the model exactly as the API does, streams a csv, parquet or feather file
+in chunks, scores the chunks in parallel in a pool of worker processes and
+writes the predictions to a csv, parquet or feather file (format by suffix).
+Summary statistics of the whole input and output are written next to the output
+file: input statistics are computed per chunk as by the streaming drift monitors
+and merged (the median is approximate), output category rates are pooled over chunks.
+
+Model store is configured with the same environment variables as the API,
+see app_base.py. Example, within the api folder:
+
+    MODEL_STORE=pickle python batch_score.py ../data.parquet ../predictions.parquet --workers 4
+"""
+import argparse
+import collections
+import logging
+import multiprocessing
+import os
+import pathlib
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from inference.batch_io import TableFileWriter, iter_frames
+from inference.batch_predict import predict_frame
+from inference.columnar import predictions_to_frame
+from metrics.prometheus_metrics import categorical_summary_statistics
+from metrics.streaming_statistics import StreamingStatistics
+
+# LOCAL IMPORTS
+current = os.path.dirname(os.path.realpath(__file__))
+parent_directory = os.path.dirname(current)
+sys.path.append(parent_directory)
+from model_store import ModelStore, load_model_store
+
+CONTEXT_PATH = pathlib.Path(__file__).parent.resolve()
+
+# model store of the worker processes, inherited from parent process at fork
+_model_store: ModelStore = None
+
+
+def _score_chunk(X: pd.DataFrame) -> tuple:
+    """
+    Score a chunk in a worker process.
+    Return predictions, input statistics and output summary statistics.
+    """
+    y = predictions_to_frame(
+        predict_frame(_model_store.model, X, chunk_size=X.shape[0] or 1),
+        _model_store.response_value_field,
+        _model_store.response_value_type,
+    )
+    return (
+        y,
+        StreamingStatistics(_model_store.request_columns).update(X),
+        categorical_summary_statistics(y),
+    )
+
+
+def _pool_categorical_summaries(
+    pooled: pd.DataFrame, summary: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Combine categorical_summary_statistics of two sets of rows:
+    rates are averaged weighted by sample size, missing categories count as 0
+    """
+    if pooled is None:
+        return summary
+    pooled_size = pooled.loc["sample_size"].iloc[0]
+    size = summary.loc["sample_size"].iloc[0]
+    counts = pd.concat(
+        (
+            pooled.drop("sample_size").iloc[:, 0] * pooled_size,
+            summary.drop("sample_size").iloc[:, 0] * size,
+        ),
+        axis=1,
+    )
+    rates = counts.fillna(0).sum(axis=1) / (pooled_size + size)
+    return pd.concat(
+        (
+            rates.to_frame("_"),
+            pd.DataFrame({"_": [pooled_size + size]}, index=["sample_size"]),
+        )
+    )
+
+
+def _summary_path(output_path: str, name: str) -> str:
+    stem, _ = os.path.splitext(output_path)
+    return f"{stem}_{name}_summary.csv"
+
+
+def batch_score(
+    model_store: ModelStore,
+    input_path: str,
+    output_path: str,
+    workers: int = os.cpu_count(),
+    chunk_size: int = 10000,
+) -> dict:
+    """
+    Score input_path to output_path in chunks, in parallel.
+    Return a dict with the number of rows, elapsed time and throughput.
+    """
+    global _model_store
+    _model_store = model_store
+    columns = model_store.request_columns
+
+    input_statistics = StreamingStatistics(columns)
+    output_summary = None
+    rows = 0
+    start = time.time()
+    # fork workers so that they share the model loaded in this process
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("fork")
+    ) as pool, TableFileWriter(output_path) as writer:
+        # keep a bounded number of chunks in flight & write results in input order
+        pending = collections.deque()
+
+        def write_oldest():
+            nonlocal rows, output_summary
+            y, chunk_statistics, chunk_summary = pending.popleft().result()
+            writer.write(y)
+            input_statistics.merge(chunk_statistics)
+            output_summary = _pool_categorical_summaries(output_summary, chunk_summary)
+            rows += y.shape[0]
+            logging.info(
+                f"Scored {rows} rows, {rows / (time.time() - start):.0f} rows/s"
+            )
+
+        for X in iter_frames(input_path, columns, chunk_size):
+            pending.append(pool.submit(_score_chunk, X))
+            if len(pending) >= 2 * workers:
+                write_oldest()
+        while pending:
+            write_oldest()
+
+    if rows > 0:
+        input_statistics.summary().to_csv(_summary_path(output_path, "input"))
+        output_summary.to_csv(_summary_path(output_path, "output"))
+
+    elapsed = time.time() - start
+    return {
+        "rows": rows,
+        "seconds": elapsed,
+        "rows_per_second": rows / elapsed if elapsed > 0 else float("nan"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Score a csv, parquet or feather file with the model from the model store."
+    )
+    parser.add_argument("input", help="input file: .csv, .parquet or .feather")
+    parser.add_argument("output", help="output file: .csv, .parquet or .feather")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of worker processes (default: number of cpus)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=10000,
+        help="number of rows scored at a time by a worker (default: 10000)",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    # same configuration as the API, see app_base.py
+    bundle_path = os.getenv(
+        "PICKLE_STORE_PATH", "../local_data/pickle_store/"
+    ) + os.getenv("PICKLE_FILENAME", "bundle_latest.pickle")
+    model_store = load_model_store(
+        os.getenv("MODEL_STORE", ""),
+        bundle_uri=str(CONTEXT_PATH.joinpath(bundle_path)),
+        model_name=os.getenv("MLFLOW_MODEL_NAME", "model"),
+        model_version=os.getenv("MLFLOW_MODEL_VERSION", "latest"),
+        tracking_uri=os.getenv("MLFLOW_TRACKING_URI", "file:../local_data/mlruns"),
+        registry_uri=os.getenv(
+            "MLFLOW_REGISTRY_URI", "sqlite:///../local_data/mlflow.sqlite"
+        ),
+    )
+    try:
+        result = batch_score(
+            model_store,
+            args.input,
+            args.output,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+        )
+    except ValueError as e:
+        # e.g. unsupported file format or input columns not matching the model
+        sys.exit(f"Batch scoring failed: {e}")
+    print(
+        f"Scored {result['rows']} rows in {result['seconds']:.2f} s "
+        f"({result['rows_per_second']:.0f} rows/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# Gunicorn configuration for serving the API with several worker processes.
+# Usage (within the api folder): gunicorn main:app -c gunicorn.conf.py
+#
+# The app, and with it the model from the model store, is loaded once in the
+# master process before forking. Workers share the model memory pages copy-on-write.
+#
+# Prometheus metrics are aggregated over workers when PROMETHEUS_MULTIPROC_DIR
+# is set to an empty directory before starting gunicorn (see entrypoint.sh).
+import gc
+import importlib.util
+import itertools
+import logging
+import os
+import sys
+import time
+
+
+def _available_cores() -> int:
+    """
+    Number of cores available to this process: cpu affinity, capped by the cgroup cpu quota
+    """
+    cores = len(os.sched_getaffinity(0))
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cores = min(cores, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass  # no cgroup v2 quota
+    return cores
+
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+# a worker per available core by default
+workers = int(os.getenv("WEB_CONCURRENCY", _available_cores()))
+# uvicorn selects the uvloop event loop and the httptools http parser when installed
+worker_class = "uvicorn.workers.UvicornWorker"
+# load app & model in master before forking workers
+preload_app = True
+# seconds to keep idle connections open. keep longer than the idle timeout of
+# a load balancer in front of the api, so that it does not reuse closed connections
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 75))
+# connections waiting to be accepted
+backlog = int(os.getenv("GUNICORN_BACKLOG", 2048))
+# restart workers that do not respond for this many seconds
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+# at shutdown workers stop accepting connections and finish requests in flight
+# for up to graceful_timeout seconds before they are killed
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+
+
+def _memory_usage_kb() -> dict:
+    """
+    Read resident and process private memory (kB) of the current process.
+    Private memory is the overhead of a worker on top of the pages shared with master.
+    """
+    usage = {"rss": None, "private": None}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        usage["rss"] = int(fields["Rss"].split()[0])
+        usage["private"] = int(fields["Private_Clean"].split()[0]) + int(
+            fields["Private_Dirty"].split()[0]
+        )
+    except (OSError, KeyError, ValueError):
+        pass  # not available outside linux
+    return usage
+
+
+def when_ready(server):
+    # move everything allocated so far, including the model, to the permanent
+    # generation of the garbage collector. Otherwise collections in workers
+    # write to the object headers and copy the shared pages to each worker.
+    gc.freeze()
+    usage = _memory_usage_kb()
+    server.log.info(
+        f"App loaded, froze {gc.get_freeze_count()} objects: master rss={usage['rss']} kB"
+    )
+    # a reservoir sample is kept by each worker, of the requests of that worker only
+    app_base = sys.modules.get("app_base")
+    if (
+        app_base is not None
+        and getattr(app_base.input_drift, "sampling", None) == "reservoir"
+        and server.num_workers > 1
+    ):
+        server.log.warning(
+            f"DRIFT_QUEUE_SAMPLING=reservoir with {server.num_workers} workers: each worker "
+            "samples and reports the input drift of its own share of the requests"
+        )
+
+
+def pre_fork(server, worker):
+    worker.fork_started = time.monotonic()
+    # number workers: a restarted worker takes over the slot, and the drift queue
+    # backup files, of the worker it replaces
+    used_slots = {getattr(w, "slot", None) for w in server.WORKERS.values()}
+    worker.slot = next(i for i in itertools.count() if i not in used_slots)
+
+
+def post_fork(server, worker):
+    # do not share database connections opened in master with workers
+    for handler in logging.getLogger().handlers:
+        engine = getattr(handler, "engine", None)
+        if engine is not None:
+            engine.dispose(close=False)
+    # workers must not overwrite the drift queue backup files of each other
+    app_base = sys.modules.get("app_base")
+    if app_base is not None:
+        app_base.use_worker_backup_files(worker.slot)
+
+
+def post_worker_init(worker):
+    usage = _memory_usage_kb()
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    worker.log.info(
+        f"Worker {worker.pid} (slot {worker.slot}) ready in "
+        f"{time.monotonic() - worker.fork_started:.3f} s: loop={loop}, http={http}, "
+        f"rss={usage['rss']} kB, private={usage['private']} kB"
+    )
+
+
+def child_exit(server, worker):
+    # drop live gauges of the exited worker from the aggregated metrics
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,183 @@
+import asyncio
+import time
+from typing import AsyncIterator, Callable
+
+import anyio.to_thread
+import pandas as pd
+from fastapi import HTTPException, Request
+from prometheus_client import Counter, Gauge, Histogram
+
+
+class AdmissionController:
+    """
+    Admission control and load shedding for prediction requests.
+
+    At most max_concurrency requests and max_rows_in_flight rows are processed at once.
+    Other requests wait in line for up to max_wait_seconds. Requests are rejected
+    with 503 and a Retry-After header, when max_queue_depth requests are already
+    waiting or when the wait times out, instead of queuing without bound in the threadpool.
+
+    A request larger than max_rows_in_flight is admitted only when no other rows
+    are in flight, so large requests wait for small ones instead of starving them.
+
+    Runs on the event loop of a single process. With several worker processes,
+    the limits apply to each worker, and the gauges are summed over live workers.
+
+    Parameters:
+        max_concurrency: int, maximum number of requests processed at once
+        max_queue_depth: int, maximum number of requests waiting for admission
+        max_rows_in_flight: int, maximum number of rows processed at once
+        max_wait_seconds: float, how long a request may wait for admission
+        retry_after_seconds: int, value of the Retry-After header of rejections
+        metrics_name_prefix: prefix for the prometheus metrics created
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        max_queue_depth: int = 32,
+        max_rows_in_flight: int = 100000,
+        max_wait_seconds: float = 1.0,
+        retry_after_seconds: int = 1,
+        metrics_name_prefix: str = "predict_admission_",
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.max_rows_in_flight = max_rows_in_flight
+        self.max_wait_seconds = max_wait_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self.in_flight = 0
+        self.rows_in_flight = 0
+        self.waiting = 0
+        self._condition = None
+
+        # gauges are updated with inc & dec: callback gauges are not exported
+        # when metrics are aggregated over worker processes
+        self.queue_depth_gauge = Gauge(
+            metrics_name_prefix + "queue_depth",
+            "How many requests are waiting for admission?",
+            multiprocess_mode="livesum",
+        )
+        self.in_flight_gauge = Gauge(
+            metrics_name_prefix + "in_flight_requests",
+            "How many admitted requests are being processed?",
+            multiprocess_mode="livesum",
+        )
+        self.rows_in_flight_gauge = Gauge(
+            metrics_name_prefix + "in_flight_rows",
+            "How many rows of admitted requests are being processed?",
+            multiprocess_mode="livesum",
+        )
+        self.rejection_counter = Counter(
+            metrics_name_prefix + "rejections_total",
+            "Requests rejected by admission control, by reason: queue_full or timeout",
+            ["reason"],
+        )
+        self.wait_histogram = Histogram(
+            metrics_name_prefix + "wait_seconds",
+            "How long did admitted requests wait for a request slot and rows in flight?",
+            buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+        )
+
+    def reserve_threadpool(self, reserved_threads: int = 4):
+        """
+        Size the anyio threadpool, used for sync endpoints and dependencies,
+        so that admitted requests leave reserved_threads free for other endpoints,
+        e.g. /metrics. Call on startup, from the event loop.
+        """
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        limiter.total_tokens = max(
+            limiter.total_tokens, self.max_concurrency + reserved_threads
+        )
+
+    def _slot_free(self) -> bool:
+        return self.in_flight < self.max_concurrency
+
+    def _rows_fit(self, rows: int) -> bool:
+        return (
+            self.rows_in_flight + rows <= self.max_rows_in_flight
+            or self.rows_in_flight == 0
+        )
+
+    def _reject(self, reason: str):
+        self.rejection_counter.labels(reason).inc()
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server overloaded ({reason}), retry later",
+            headers={"Retry-After": str(self.retry_after_seconds)},
+        )
+
+    async def _wait(self, predicate: Callable[[], bool]) -> float:
+        # call holding the condition lock. return seconds waited
+        start = time.monotonic()
+        if not predicate():
+            if self.waiting >= self.max_queue_depth:
+                self._reject("queue_full")
+            self.waiting += 1
+            self.queue_depth_gauge.inc()
+            try:
+                await asyncio.wait_for(
+                    self._condition.wait_for(predicate), self.max_wait_seconds
+                )
+            except asyncio.TimeoutError:
+                self._reject("timeout")
+            finally:
+                self.waiting -= 1
+                self.queue_depth_gauge.dec()
+        return time.monotonic() - start
+
+    async def acquire(self) -> float:
+        """
+        Wait for a free request slot. Return seconds waited.
+        Raise HTTPException 503 if the queue is full or the wait times out.
+        """
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            waited = await self._wait(self._slot_free)
+            self.in_flight += 1
+            self.in_flight_gauge.inc()
+        return waited
+
+    async def acquire_rows(self, rows: int) -> float:
+        """
+        Wait until rows fit in flight, holding a request slot. Return seconds waited.
+        Raise HTTPException 503 if the queue is full or the wait times out.
+        """
+        async with self._condition:
+            waited = await self._wait(lambda: self._rows_fit(rows))
+            self.rows_in_flight += rows
+            self.rows_in_flight_gauge.inc(rows)
+        return waited
+
+    async def release(self, rows: int = 0):
+        """
+        Release a request slot and its rows
+        """
+        async with self._condition:
+            self.in_flight -= 1
+            self.rows_in_flight -= rows
+            self.in_flight_gauge.dec()
+            self.rows_in_flight_gauge.dec(rows)
+            self._condition.notify_all()
+
+    def admitted(self, decoder: Callable) -> Callable:
+        """
+        Wrap a request decoder dependency with admission control.
+        A request slot is acquired before the body is decoded, and rows in flight
+        before prediction. Both are released after the response has been sent.
+        """
+
+        async def dependency(request: Request) -> AsyncIterator[pd.DataFrame]:
+            waited = await self.acquire()
+            rows = 0
+            try:
+                X = await decoder(request)
+                waited += await self.acquire_rows(X.shape[0])
+                rows = X.shape[0]
+                self.wait_histogram.observe(waited)
+                yield X
+            finally:
+                await self.release(rows)
+
+        return dependency
@@ -0,0 +1,123 @@
+import os
+from typing import Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from fastapi import HTTPException
+
+from inference.columnar import arrow_type, table_to_frame
+
+# file formats by suffix
+CSV_SUFFIXES = (".csv",)
+PARQUET_SUFFIXES = (".parquet", ".pq")
+FEATHER_SUFFIXES = (".feather", ".arrow", ".ipc")
+
+
+def file_format(path: str) -> str:
+    """
+    Infer table file format from file suffix: 'csv', 'parquet' or 'feather'
+    """
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix in CSV_SUFFIXES:
+        return "csv"
+    elif suffix in PARQUET_SUFFIXES:
+        return "parquet"
+    elif suffix in FEATHER_SUFFIXES:
+        return "feather"
+    raise ValueError(
+        f"Unsupported file format {suffix}, use one of {CSV_SUFFIXES + PARQUET_SUFFIXES + FEATHER_SUFFIXES}"
+    )
+
+
+def _iter_record_batches(path: str, columns: dict, chunk_size: int):
+    fmt = file_format(path)
+    try:
+        if fmt == "csv":
+            reader = pa_csv.open_csv(
+                path,
+                convert_options=pa_csv.ConvertOptions(
+                    column_types={name: arrow_type(tp) for name, tp in columns.items()},
+                    include_columns=list(columns),
+                ),
+            )
+            yield from reader
+        elif fmt == "parquet":
+            yield from pq.ParquetFile(path).iter_batches(
+                batch_size=chunk_size, columns=list(columns)
+            )
+        else:
+            with pa.memory_map(path) as source:
+                reader = pa.ipc.open_file(source)
+                for i in range(reader.num_record_batches):
+                    yield reader.get_batch(i)
+    except pa.ArrowException as e:
+        # e.g. a column missing from a csv file, or a value that can not be parsed
+        raise ValueError(f"Could not read {path}: {e}") from None
+
+
+def _to_frame(table: pa.Table, columns: dict) -> pd.DataFrame:
+    # file readers are not http endpoints: report invalid columns as ValueError
+    try:
+        return table_to_frame(table, columns)
+    except HTTPException as e:
+        errors = "; ".join(f"{error['loc'][-1]}: {error['msg']}" for error in e.detail)
+        raise ValueError(f"Invalid input columns: {errors}") from None
+
+
+def iter_frames(
+    path: str, columns: dict, chunk_size: int = 10000
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream a csv, parquet or feather file as typed dataframes of chunk_size rows
+    (the last chunk may be smaller). Only a few record batches are held in memory at a time.
+    Raise ValueError if the columns do not match the model schema.
+    """
+    pending = []
+    pending_rows = 0
+    for batch in _iter_record_batches(path, columns, chunk_size):
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= chunk_size:
+            table = pa.Table.from_batches(pending)
+            yield _to_frame(table.slice(0, chunk_size), columns)
+            rest = table.slice(chunk_size)
+            pending = rest.to_batches()
+            pending_rows = rest.num_rows
+    if pending_rows > 0:
+        yield _to_frame(pa.Table.from_batches(pending), columns)
+
+
+class TableFileWriter:
+    """
+    Incrementally write dataframes to a csv, parquet or feather file.
+    Format is inferred from file suffix. Use as a context manager.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.format = file_format(path)
+        self._writer = None
+
+    def write(self, df: pd.DataFrame):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            if self.format == "csv":
+                self._writer = pa_csv.CSVWriter(self.path, table.schema)
+            elif self.format == "parquet":
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                self._writer = pa.ipc.new_file(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
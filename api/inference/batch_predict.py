@@ -0,0 +1,122 @@
+import functools
+import json
+import os
+import sys
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse, ORJSONResponse
+from starlette import status
+from starlette.concurrency import run_in_threadpool
+
+# LOCAL IMPORTS
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+)
+from model_store.prediction_table import first_output
+
+
+def records_request_decoder(decoder) -> Callable:
+    """
+    Create a FastAPI dependency that decodes a record-oriented json request body,
+    a list of row objects, into a typed dataframe with the compiled request decoder
+    of the model store (model_store.request_decoder).
+    Validation errors are returned as 422, like pydantic validation errors.
+    """
+
+    def decode(body: bytes) -> pd.DataFrame:
+        try:
+            return decoder.decode(json.loads(body))
+        except ValueError as e:
+            errors = getattr(e, "errors", None)
+            if errors is None:  # invalid json
+                errors = [
+                    {"loc": ["body"], "msg": str(e), "type": "value_error.jsondecode"}
+                ]
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=errors
+            )
+
+    async def dependency(request: Request) -> pd.DataFrame:
+        body = await request.body()
+        # decoding is cpu bound: keep it off the event loop
+        return await run_in_threadpool(decode, body)
+
+    return dependency
+
+
+def records_request_openapi(request_schema_class) -> dict:
+    """
+    OpenAPI request body description for endpoints using records_request_decoder:
+    a list of objects of the pydantic request schema
+    """
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "title": "P List",
+                        "type": "array",
+                        "items": request_schema_class.schema(),
+                    }
+                }
+            },
+        }
+    }
+
+
+def frame_to_records(df: pd.DataFrame) -> list:
+    """
+    Convert a dataframe to a list of row dicts of python values
+    """
+    return [
+        dict(zip(df.columns, row)) for row in zip(*(df[c].tolist() for c in df.columns))
+    ]
+
+
+def records_response():
+    """
+    Decorator. Encode a dataframe returned by the decorated function straight
+    to json bytes as a list of row objects, e.g. [{"variety": "Virginica"}, ...].
+
+    Returning a response skips FastAPI response model validation & serialization,
+    while the response model is still published in the OpenAPI schema.
+    The bytes are the same as FastAPI would write: orjson writes floats in another
+    exponent notation (1e20, not 1e+20), so float columns use the standard json encoder.
+    """
+
+    def encoder(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            df = function(*args, **kwargs)
+            if any(dtype.kind == "f" for dtype in df.dtypes):
+                return JSONResponse(frame_to_records(df))
+            return ORJSONResponse(frame_to_records(df))
+
+        return wrapper
+
+    return encoder
+
+
+def predict_frame(model, X: pd.DataFrame, chunk_size: int = 10000) -> np.ndarray:
+    """
+    Predict a whole batch with a single model call.
+
+    Batches larger than chunk_size rows are split into bounded chunks
+    to cap peak memory. Return a one dimensional array with a prediction per row.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be a positive integer, got {chunk_size}")
+    if X.shape[0] == 0:
+        return np.empty(0)
+    if X.shape[0] <= chunk_size:
+        return first_output(model.predict(X))
+    return np.concatenate(
+        [
+            first_output(model.predict(X.iloc[start : start + chunk_size]))
+            for start in range(0, X.shape[0], chunk_size)
+        ]
+    )
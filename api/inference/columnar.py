@@ -0,0 +1,312 @@
+import functools
+import json
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from fastapi import HTTPException, Request
+from fastapi.responses import ORJSONResponse, Response
+from starlette import status
+from starlette.concurrency import run_in_threadpool
+
+# supported request & response media types for tables
+JSON_MEDIA_TYPE = "application/json"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+CSV_MEDIA_TYPE = "text/csv"
+TABLE_MEDIA_TYPES = [
+    JSON_MEDIA_TYPE,
+    ARROW_STREAM_MEDIA_TYPE,
+    PARQUET_MEDIA_TYPE,
+    CSV_MEDIA_TYPE,
+]
+
+
+# values accepted as booleans, as in the pydantic request schema and RequestDecoder
+_BOOL_VALUES = {
+    **{v: True for v in (True, 1, "1", "on", "t", "true", "y", "yes")},
+    **{v: False for v in (False, 0, "0", "off", "f", "false", "n", "no")},
+}
+
+
+def _column_dtype(dtype):
+    # object columns are validated as strings, as in the pydantic request schema
+    if dtype == np.object_ or dtype == object:
+        return str
+    return dtype
+
+
+def _to_bool(value) -> bool:
+    if isinstance(value, str):
+        value = value.lower()
+    try:
+        return _BOOL_VALUES[value]
+    except (KeyError, TypeError):
+        raise ValueError(f"value could not be parsed to a boolean: {value}")
+
+
+def columns_to_frame(data: dict, columns: dict) -> pd.DataFrame:
+    """
+    Validate a column-oriented request body and convert it to a typed dataframe.
+
+    Parameters:
+        data: dict of column name - list of values pairs, e.g. {"sepal_length": [6.7, 6.6], ...}
+        columns: dict of name-type pairs, e.g. model_store.request_columns
+
+    Validation runs once per column: each column must be present,
+    all columns must be of equal length, contain no nulls and be castable
+    to the dtype of the model schema. Extra columns are ignored.
+    Raise HTTPException 422 listing all errors, in the style of FastAPI validation errors.
+    """
+    errors = []
+    for name in columns:
+        if name not in data:
+            errors.append(
+                {
+                    "loc": ["body", name],
+                    "msg": "field required",
+                    "type": "value_error.missing",
+                }
+            )
+    if errors:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=errors
+        )
+
+    if len({len(data[name]) for name in columns}) > 1:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=[
+                {
+                    "loc": ["body"],
+                    "msg": "all columns must be of equal length",
+                    "type": "value_error.length",
+                }
+            ],
+        )
+
+    frame = {}
+    for name, dtype in columns.items():
+        values = pd.Series(data[name], dtype=object)
+        if values.isna().any():
+            errors.append(
+                {
+                    "loc": ["body", name, int(np.argmax(values.isna().to_numpy()))],
+                    "msg": "none is not an allowed value",
+                    "type": "type_error.none.not_allowed",
+                }
+            )
+            continue
+        try:
+            if pd.api.types.is_bool_dtype(dtype):
+                # astype(bool) would take any non-empty string, e.g. 'false', as True
+                frame[name] = values.map(_to_bool).astype(bool)
+            else:
+                frame[name] = values.astype(_column_dtype(dtype))
+        except (ValueError, TypeError) as e:
+            errors.append(
+                {
+                    "loc": ["body", name],
+                    "msg": f"value is not a valid {getattr(dtype, '__name__', dtype)}: {e}",
+                    "type": "type_error",
+                }
+            )
+    if errors:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=errors
+        )
+    return pd.DataFrame(frame, columns=list(columns))
+
+
+def arrow_type(dtype) -> pa.DataType:
+    """
+    Arrow data type for a model schema column type
+    """
+    dtype = _column_dtype(dtype)
+    if dtype == str:
+        return pa.string()
+    return pa.from_numpy_dtype(np.dtype(dtype))
+
+
+def table_to_frame(table: pa.Table, columns: dict) -> pd.DataFrame:
+    """
+    Validate an arrow table and convert it to a typed dataframe.
+
+    Same rules as columns_to_frame, but columns are checked and cast
+    with arrow compute before a single conversion to pandas.
+    """
+    errors = []
+    arrays = {}
+    for name, dtype in columns.items():
+        if name not in table.column_names:
+            errors.append(
+                {
+                    "loc": ["body", name],
+                    "msg": "field required",
+                    "type": "value_error.missing",
+                }
+            )
+            continue
+        column = table.column(name)
+        if column.null_count > 0:
+            errors.append(
+                {
+                    "loc": ["body", name],
+                    "msg": "none is not an allowed value",
+                    "type": "type_error.none.not_allowed",
+                }
+            )
+            continue
+        try:
+            arrays[name] = column.cast(arrow_type(dtype))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            errors.append(
+                {
+                    "loc": ["body", name],
+                    "msg": f"value is not a valid {getattr(dtype, '__name__', dtype)}: {e}",
+                    "type": "type_error",
+                }
+            )
+    if errors:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=errors
+        )
+    return pa.table(arrays).to_pandas()
+
+
+def media_type_of(request: Request) -> str:
+    """
+    Return request media type without parameters, defaults to json
+    """
+    content_type = request.headers.get("content-type", JSON_MEDIA_TYPE)
+    return content_type.split(";")[0].strip().lower()
+
+
+def read_table(body: bytes, media_type: str, columns: dict) -> pd.DataFrame:
+    """
+    Decode a request body of given media type into a typed dataframe.
+
+    Binary formats are decoded with the arrow C++ readers straight into
+    arrow memory. CSV columns are parsed directly to the schema types.
+    """
+    try:
+        if media_type == JSON_MEDIA_TYPE:
+            return columns_to_frame(json.loads(body), columns)
+        elif media_type == ARROW_STREAM_MEDIA_TYPE:
+            table = pa.ipc.open_stream(body).read_all()
+        elif media_type == PARQUET_MEDIA_TYPE:
+            table = pq.read_table(pa.BufferReader(body))
+        elif media_type == CSV_MEDIA_TYPE:
+            table = pa_csv.read_csv(
+                pa.BufferReader(body),
+                convert_options=pa_csv.ConvertOptions(
+                    column_types={
+                        name: arrow_type(dtype) for name, dtype in columns.items()
+                    }
+                ),
+            )
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail=f"Unsupported media type {media_type}, use one of {TABLE_MEDIA_TYPES}",
+            )
+    except (pa.ArrowInvalid, ValueError, TypeError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Could not decode {media_type} body: {e}",
+        )
+    return table_to_frame(table, columns)
+
+
+def write_table(df: pd.DataFrame, media_type: str) -> bytes:
+    """
+    Encode a dataframe to a response body of given (binary) media type
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    if media_type == ARROW_STREAM_MEDIA_TYPE:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    elif media_type == PARQUET_MEDIA_TYPE:
+        pq.write_table(table, sink)
+    elif media_type == CSV_MEDIA_TYPE:
+        pa_csv.write_csv(table, sink)
+    else:
+        raise ValueError(f"Unsupported media type {media_type}")
+    return sink.getvalue().to_pybytes()
+
+
+def table_request_decoder(columns: dict) -> Callable:
+    """
+    Create a FastAPI dependency that decodes a json (column-oriented), arrow stream,
+    parquet or csv request body into a typed dataframe, based on the content-type header.
+    """
+
+    async def decode(request: Request) -> pd.DataFrame:
+        body = await request.body()
+        # decoding is cpu bound: keep it off the event loop
+        return await run_in_threadpool(
+            read_table, body, media_type_of(request), columns
+        )
+
+    return decode
+
+
+def table_request_openapi(columns: dict) -> dict:
+    """
+    OpenAPI request body description for endpoints using table_request_decoder
+    """
+    json_schema = {
+        "type": "object",
+        "required": list(columns),
+        "properties": {name: {"type": "array", "items": {}} for name in columns},
+    }
+    binary_schema = {"type": "string", "format": "binary"}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                media_type: {
+                    "schema": json_schema
+                    if media_type == JSON_MEDIA_TYPE
+                    else binary_schema
+                }
+                for media_type in TABLE_MEDIA_TYPES
+            },
+        }
+    }
+
+
+def predictions_to_frame(
+    predictions: np.ndarray, field: str, value_type
+) -> pd.DataFrame:
+    """
+    Cast predicted values to the response type and return them as a single column dataframe
+    """
+    return pd.DataFrame({field: [value_type(value) for value in predictions.tolist()]})
+
+
+def table_response(parameter_name: str = "request"):
+    """
+    Decorator. Encode a dataframe returned by the decorated function
+    in the media type of the request: a column-oriented dict for json,
+    else a binary response of the same format.
+
+    parameter_name: name of the decorated function parameter holding the starlette request
+    """
+
+    def encoder(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            df = function(*args, **kwargs)
+            media_type = media_type_of(kwargs[parameter_name])
+            if media_type == JSON_MEDIA_TYPE:
+                return ORJSONResponse({c: df[c].tolist() for c in df.columns})
+            return Response(content=write_table(df, media_type), media_type=media_type)
+
+        return wrapper
+
+    return encoder
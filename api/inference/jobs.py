@@ -0,0 +1,294 @@
+import fcntl
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Callable
+
+import anyio
+import pandas as pd
+from fastapi import HTTPException
+from prometheus_client import Counter, Gauge, Histogram
+
+from inference.batch_io import TableFileWriter, iter_frames
+from inference.columnar import CSV_MEDIA_TYPE, PARQUET_MEDIA_TYPE
+
+ARROW_FILE_MEDIA_TYPE = "application/vnd.apache.arrow.file"
+# spool file suffixes by media type of the submitted data
+JOB_FILE_SUFFIXES = {
+    CSV_MEDIA_TYPE: ".csv",
+    PARQUET_MEDIA_TYPE: ".parquet",
+    ARROW_FILE_MEDIA_TYPE: ".feather",
+}
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class BulkJobs:
+    """
+    Asynchronous bulk scoring jobs, spooled on disk.
+
+    A job is a csv, parquet or arrow file submitted to the spool directory.
+    Jobs are scored in chunks by a pool of worker threads with the loaded model,
+    and the predictions are written to a result file of the same format.
+    Each job has a directory in the spool with its input, result and a status.json,
+    so jobs survive a restart: unfinished jobs are requeued by recover().
+
+    A job is processed holding an exclusive lock on its directory, so that
+    several API worker processes sharing a spool never score the same job at once.
+    The lock is released by the OS if the process dies, and the job is rerun
+    on the next recover().
+
+    Worker threads are started lazily, so that jobs also work in forked worker processes.
+
+    Parameters:
+        spool_dir: str, directory for job files
+        predict_function: function that takes a typed pd.DataFrame and returns
+            a dataframe of predictions
+        columns: dict of name-type pairs of the request schema
+        chunk_size: int, number of rows scored at a time
+        workers: int, number of scoring threads
+        max_queued: int, maximum number of queued jobs, more are rejected with 503
+        metrics_name_prefix: prefix for the prometheus metrics created
+    """
+
+    def __init__(
+        self,
+        spool_dir: str,
+        predict_function: Callable[[pd.DataFrame], pd.DataFrame],
+        columns: dict,
+        chunk_size: int = 10000,
+        workers: int = 1,
+        max_queued: int = 100,
+        metrics_name_prefix: str = "predict_jobs_",
+    ):
+        self.spool_dir = spool_dir
+        self.predict_function = predict_function
+        self.columns = columns
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.max_queued = max_queued
+        self._queue = queue.Queue()
+        self._threads = []
+        self._thread_lock = threading.Lock()
+
+        self.submitted_counter = Counter(
+            metrics_name_prefix + "submitted_total", "How many jobs were submitted?"
+        )
+        self.finished_counter = Counter(
+            metrics_name_prefix + "finished_total",
+            "How many jobs have finished, by status: done or failed",
+            ["status"],
+        )
+        self.row_counter = Counter(
+            metrics_name_prefix + "rows_total", "How many rows were scored in jobs?"
+        )
+        self.chunk_histogram = Histogram(
+            metrics_name_prefix + "chunk_seconds",
+            "How long did scoring a chunk of a job take?",
+        )
+        # summed over live worker processes
+        self.queue_gauge = Gauge(
+            metrics_name_prefix + "queue_size",
+            "How many jobs are waiting?",
+            multiprocess_mode="livesum",
+        )
+        self.running_gauge = Gauge(
+            metrics_name_prefix + "running",
+            "How many jobs are being scored?",
+            multiprocess_mode="livesum",
+        )
+
+    # spool files
+
+    def _job_dir(self, job_id: str) -> str:
+        if not JOB_ID_PATTERN.match(job_id):
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        return os.path.join(self.spool_dir, job_id)
+
+    def _read_status(self, job_id: str) -> dict:
+        try:
+            with open(os.path.join(self._job_dir(job_id), "status.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    def _write_status(self, status: dict):
+        # write and rename, so that readers never see a partial file
+        path = os.path.join(self._job_dir(status["job_id"]), "status.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(status, f)
+        os.replace(path + ".tmp", path)
+
+    # api
+
+    async def submit(self, body: AsyncIterator[bytes], media_type: str) -> dict:
+        """
+        Spool a request body as a new job and queue it. Return the job status.
+        """
+        if media_type not in JOB_FILE_SUFFIXES:
+            raise HTTPException(
+                status_code=415,
+                detail=f"Unsupported media type {media_type}, use one of {list(JOB_FILE_SUFFIXES)}",
+            )
+        if self._queue.qsize() >= self.max_queued:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many queued jobs, retry later",
+                headers={"Retry-After": "60"},
+            )
+        job_id = uuid.uuid4().hex
+        job_dir = self._job_dir(job_id)
+        os.makedirs(job_dir)
+        suffix = JOB_FILE_SUFFIXES[media_type]
+        async with await anyio.open_file(
+            os.path.join(job_dir, "input" + suffix), "wb"
+        ) as f:
+            async for chunk in body:
+                await f.write(chunk)
+        status = {
+            "job_id": job_id,
+            "status": QUEUED,
+            "media_type": media_type,
+            "suffix": suffix,
+            "rows_done": 0,
+            "submitted": time.time(),
+            "started": None,
+            "finished": None,
+            "rows_per_second": None,
+            "error": None,
+        }
+        self._write_status(status)
+        self.submitted_counter.inc()
+        self._enqueue(job_id)
+        return status
+
+    def status(self, job_id: str) -> dict:
+        """
+        Return the status of a job. Raise HTTPException 404 if not found.
+        """
+        return self._read_status(job_id)
+
+    def result_path(self, job_id: str) -> str:
+        """
+        Return the path of the result file of a finished job.
+        Raise HTTPException 404 if not found or 409 if not done.
+        """
+        status = self._read_status(job_id)
+        if status["status"] != DONE:
+            raise HTTPException(
+                status_code=409, detail=f"Job {job_id} is {status['status']}"
+            )
+        return os.path.join(self._job_dir(job_id), "result" + status["suffix"])
+
+    def delete(self, job_id: str):
+        """
+        Delete a job and its files. Raise HTTPException 409 if it is being scored.
+        """
+        job_dir = self._job_dir(job_id)
+        self._read_status(job_id)
+        with open(os.path.join(job_dir, "lock"), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise HTTPException(status_code=409, detail=f"Job {job_id} is running")
+            shutil.rmtree(job_dir)
+
+    def recover(self):
+        """
+        Requeue unfinished jobs of the spool, e.g. after a restart
+        """
+        os.makedirs(self.spool_dir, exist_ok=True)
+        for job_id in sorted(os.listdir(self.spool_dir)):
+            if not JOB_ID_PATTERN.match(job_id):
+                continue
+            try:
+                status = self._read_status(job_id)
+            except (HTTPException, ValueError):
+                continue
+            if status["status"] in (QUEUED, RUNNING):
+                logging.info(f"Requeue job {job_id}")
+                self._enqueue(job_id)
+
+    # workers
+
+    def _enqueue(self, job_id: str):
+        self._ensure_running()
+        self._queue.put(job_id)
+        self.queue_gauge.inc()
+
+    def _ensure_running(self):
+        if len(self._threads) == self.workers and all(
+            t.is_alive() for t in self._threads
+        ):
+            return
+        with self._thread_lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._run, name="bulk-jobs", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            self.queue_gauge.dec()
+            try:
+                with open(os.path.join(self._job_dir(job_id), "lock"), "a") as lock:
+                    try:
+                        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        # scored by another process
+                        continue
+                    status = self._read_status(job_id)
+                    if status["status"] in (QUEUED, RUNNING):
+                        self._score(status)
+            except (OSError, HTTPException) as e:
+                # e.g. deleted while queued
+                logging.warning(f"Skipped job {job_id}: {e}")
+
+    def _score(self, status: dict):
+        job_dir = self._job_dir(status["job_id"])
+        status.update(status=RUNNING, started=time.time(), rows_done=0, error=None)
+        self._write_status(status)
+        self.running_gauge.inc()
+        try:
+            with TableFileWriter(
+                os.path.join(job_dir, "result" + status["suffix"])
+            ) as writer:
+                for X in iter_frames(
+                    os.path.join(job_dir, "input" + status["suffix"]),
+                    self.columns,
+                    self.chunk_size,
+                ):
+                    start = time.monotonic()
+                    writer.write(self.predict_function(X))
+                    self.chunk_histogram.observe(time.monotonic() - start)
+                    self.row_counter.inc(X.shape[0])
+                    status["rows_done"] += X.shape[0]
+                    self._write_status(status)
+            if status["rows_done"] == 0:
+                raise ValueError("No rows in input")
+            status["status"] = DONE
+        except Exception as e:
+            logging.error(f"Job {status['job_id']} failed: {e}")
+            status.update(status=FAILED, error=str(getattr(e, "detail", e)))
+        finally:
+            self.running_gauge.dec()
+        status["finished"] = time.time()
+        status["rows_per_second"] = status["rows_done"] / max(
+            status["finished"] - status["started"], 1e-9
+        )
+        self._write_status(status)
+        self.finished_counter.labels(status["status"]).inc()
@@ -0,0 +1,121 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from prometheus_client import Histogram
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching for concurrent prediction requests.
+
+    Rows from concurrent calls to predict are collected into a single batch
+    of at most max_batch_size rows, for up to max_wait_seconds.
+    The batch is predicted with one vectorized call and the results are scattered
+    back to each caller. Requests of max_batch_size rows or more are predicted directly.
+
+    Batching runs in a single daemon thread that is started lazily, so that
+    the batcher also works in worker processes forked after it was created.
+
+    Parameters:
+        predict_function: function that takes a typed pd.DataFrame and returns
+            a one dimensional array with a prediction per row
+        max_batch_size: int, maximum number of rows in a batch
+        max_wait_seconds: float, maximum time the first request of a batch waits for others
+        metrics_name_prefix: prefix for the prometheus metrics created
+    """
+
+    def __init__(
+        self,
+        predict_function: Callable[[pd.DataFrame], np.ndarray],
+        max_batch_size: int = 256,
+        max_wait_seconds: float = 0.005,
+        metrics_name_prefix: str = "predict_micro_batch_",
+    ):
+        self.predict_function = predict_function
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+        self.batch_size_histogram = Histogram(
+            metrics_name_prefix + "size_rows",
+            "How many rows were predicted in a single micro-batch?",
+            buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, float("inf")),
+        )
+        self.queue_delay_histogram = Histogram(
+            metrics_name_prefix + "queue_delay_seconds",
+            "How long did requests wait in queue before their micro-batch was predicted?",
+            buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0),
+        )
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        """
+        Predict rows of X as part of the next micro-batch. Blocks until done.
+        """
+        if X.shape[0] >= self.max_batch_size:
+            self.batch_size_histogram.observe(X.shape[0])
+            self.queue_delay_histogram.observe(0)
+            return self.predict_function(X)
+        self._ensure_running()
+        future = Future()
+        self._queue.put((X, future, time.monotonic()))
+        return future.result()
+
+    def _ensure_running(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="micro-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        # a request that did not fit into the previous batch starts the next one
+        carried = None
+        while True:
+            batch = [carried or self._queue.get()]
+            carried = None
+            rows = batch[0][0].shape[0]
+            deadline = time.monotonic() + self.max_wait_seconds
+            # collect more requests until batch is full or wait time is over
+            while rows < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if rows + item[0].shape[0] > self.max_batch_size:
+                    carried = item
+                    break
+                batch.append(item)
+                rows += item[0].shape[0]
+            self._predict_batch(batch, rows)
+
+    def _predict_batch(self, batch: list, rows: int):
+        start = time.monotonic()
+        for _, _, queued_at in batch:
+            self.queue_delay_histogram.observe(start - queued_at)
+        self.batch_size_histogram.observe(rows)
+        try:
+            y = self.predict_function(
+                pd.concat([X for X, _, _ in batch], ignore_index=True)
+            )
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        # scatter results back to callers
+        offset = 0
+        for X, future, _ in batch:
+            future.set_result(y[offset : offset + X.shape[0]])
+            offset += X.shape[0]
@@ -0,0 +1,155 @@
+import logging
+import os
+import threading
+from typing import Callable
+
+from prometheus_client import Counter
+
+
+def pickle_bundle_version(bundle_uri: str) -> Callable[[], str]:
+    """
+    Version of a pickle bundle: its path and modification time,
+    the same as PickleModelStore.model_identity
+    """
+
+    def version() -> str:
+        return f"{os.path.realpath(bundle_uri)}:{os.path.getmtime(bundle_uri)}"
+
+    return version
+
+
+def mlflow_registry_version(
+    model_name: str, model_version: str, tracking_uri: str, registry_uri: str
+) -> Callable[[], str]:
+    """
+    Version of a model in the mlflow registry. For 'latest', the newest
+    registered version number, else the pinned version.
+    """
+    from mlflow.tracking import MlflowClient
+
+    client = MlflowClient(tracking_uri=tracking_uri, registry_uri=registry_uri)
+
+    def version() -> str:
+        if model_version != "latest":
+            return f"{model_name}:{model_version}"
+        versions = client.get_latest_versions(model_name)
+        return f"{model_name}:{max(int(v.version) for v in versions)}"
+
+    return version
+
+
+class ModelReloader:
+    """
+    Hot reload of the model store without restarting the process.
+
+    A watcher thread polls the model version every interval_seconds. When it changes,
+    a new model store is loaded and warmed up in the background, and swapped
+    in with a single reference assignment. Requests read the current model store once
+    and finish on it, so in-flight requests are served by the old model.
+
+    The request and response schemas of the new model must match the loaded ones,
+    since routes, request decoders and drift monitors are built from them at startup.
+    Models with a changed schema are not swapped and need a restart.
+
+    Parameters:
+        model_store: the loaded ModelStore
+        load_function: returns a newly loaded ModelStore
+        version_function: returns the version of the model in the store,
+            e.g. pickle_bundle_version() or mlflow_registry_version()
+        interval_seconds: float, how often to poll the version
+        warm_up_function: optional, called with the new ModelStore before the swap
+        on_swap: optional, called with the old and new ModelStore after the swap
+        metrics_name_prefix: str, prefix for prometheus metrics
+    """
+
+    def __init__(
+        self,
+        model_store,
+        load_function: Callable,
+        version_function: Callable[[], str],
+        interval_seconds: float = 30,
+        warm_up_function: Callable = None,
+        on_swap: Callable = None,
+        metrics_name_prefix: str = "model_reload_",
+    ):
+        self.model_store = model_store
+        self.load_function = load_function
+        self.version_function = version_function
+        self.interval_seconds = interval_seconds
+        self.warm_up_function = warm_up_function
+        self.on_swap = on_swap
+        self.version = self._current_version()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.reload_counter = Counter(
+            f"{metrics_name_prefix}total",
+            "Model reload attempts by result",
+            ["result"],
+        )
+
+    def _current_version(self):
+        try:
+            return self.version_function()
+        except Exception as e:
+            logging.warning(f"Could not read model version: {e}")
+            return None
+
+    def _compatible(self, new_store) -> bool:
+        return (
+            new_store.request_columns == self.model_store.request_columns
+            and new_store.response_columns == self.model_store.response_columns
+            and new_store.response_value_field == self.model_store.response_value_field
+        )
+
+    def check(self) -> bool:
+        """
+        Reload and swap the model store if its version has changed.
+        Return true if a new model store was swapped in.
+        """
+        with self._lock:
+            version = self._current_version()
+            if version is None or version == self.version:
+                return False
+            logging.info(f"Model version changed from {self.version} to {version}")
+            try:
+                new_store = self.load_function()
+                if not self._compatible(new_store):
+                    logging.error(
+                        f"Model {version} has a different schema, restart the API to load it"
+                    )
+                    self.version = version
+                    self.reload_counter.labels("incompatible").inc()
+                    return False
+                if self.warm_up_function:
+                    self.warm_up_function(new_store)
+            except Exception as e:
+                # keep serving the old model, retry on the next poll
+                logging.error(f"Model reload failed: {e}")
+                self.reload_counter.labels("failed").inc()
+                return False
+            old_store, self.model_store = self.model_store, new_store
+            self.version = version
+            if self.on_swap:
+                self.on_swap(old_store, new_store)
+            self.reload_counter.labels("success").inc()
+            logging.info(f"Swapped in model {new_store.model_identity}")
+            return True
+
+    def _watch(self):
+        while not self._stop.wait(self.interval_seconds):
+            self.check()
+
+    def start(self):
+        """
+        Start the watcher thread, if not running
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._watch, name="model-reload", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,90 @@
+import json
+from typing import AsyncIterator
+
+import pandas as pd
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from inference.columnar import columns_to_frame
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    Streaming response for generators that read the request body while responding.
+
+    StreamingResponse listens for client disconnect by consuming request messages,
+    which would steal the body from the generator. Here the generator reads the body
+    itself, and a disconnect surfaces as starlette.requests.ClientDisconnect.
+
+    The background task runs even if the response fails, e.g. to release resources
+    held for the stream when the client disconnects before the generator starts.
+    """
+
+    media_type = NDJSON_MEDIA_TYPE
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        finally:
+            if self.background is not None:
+                await self.background()
+
+
+def _lines_to_frame(lines: list, columns: dict, offset: int = 0) -> pd.DataFrame:
+    # parse all lines of a chunk with a single json call
+    records = json.loads(b"[" + b",".join(lines) + b"]")
+    try:
+        return columns_to_frame(
+            {name: [record.get(name) for record in records] for name in columns},
+            columns,
+        )
+    except HTTPException as e:
+        # row indices of errors count from the first row of the stream
+        for error in e.detail if isinstance(e.detail, list) else []:
+            loc = error["loc"]
+            if len(loc) > 2 and isinstance(loc[2], int):
+                loc[2] += offset
+        raise
+
+
+async def iter_ndjson_frames(
+    byte_stream: AsyncIterator[bytes], columns: dict, chunk_size: int = 1000
+) -> AsyncIterator[pd.DataFrame]:
+    """
+    Read newline-delimited json rows incrementally from a byte stream,
+    and yield them as typed dataframes of at most chunk_size rows.
+
+    Only one chunk of rows is held in memory at a time.
+    Raises HTTPException (422) for rows that do not match the schema,
+    locating rows by their line in the stream, and ValueError for invalid json.
+    """
+    lines = []
+    offset = 0  # rows yielded so far
+    remainder = b""
+    async for data in byte_stream:
+        data = remainder + data
+        *complete, remainder = data.split(b"\n")
+        for line in complete:
+            line = line.strip()
+            if line:
+                lines.append(line)
+            if len(lines) >= chunk_size:
+                yield _lines_to_frame(lines, columns, offset)
+                offset += len(lines)
+                lines = []
+    remainder = remainder.strip()
+    if remainder:
+        lines.append(remainder)
+    if lines:
+        yield _lines_to_frame(lines, columns, offset)
+
+
+def frame_to_ndjson(df: pd.DataFrame) -> bytes:
+    """
+    Encode rows of a dataframe as newline-delimited json
+    """
+    if df.empty:
+        return b""
+    return (df.to_json(orient="records", lines=True).rstrip("\n") + "\n").encode("utf8")
@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from prometheus_client import Counter, Gauge
+
+
+class PredictionCache:
+    """
+    In-process LRU cache with time-to-live for row predictions.
+
+    Rows are keyed by a stable 64 bit hash of the typed row values
+    (pd.util.hash_pandas_object), so identical feature vectors
+    share a cache entry regardless of the request they arrive in.
+    Only rows missing from the cache are passed to the prediction function.
+
+    The cache is bound to a model identity, e.g. bundle path and modification time
+    or MLflow model name and version. When the identity changes, the cache is cleared.
+
+    Memory is bound by max_entries: an entry holds a hash key,
+    a prediction and an expiry time, roughly 150-200 bytes for scalar predictions.
+
+    Parameters:
+        predict_function: function that takes a typed pd.DataFrame and returns
+            a one dimensional array with a prediction per row
+        model_identity: function returning the identity of the current model
+        max_entries: int, maximum number of cached predictions
+        ttl_seconds: float, time to live of a cached prediction
+        metrics_name_prefix: prefix for the prometheus metrics created
+    """
+
+    def __init__(
+        self,
+        predict_function: Callable[[pd.DataFrame], np.ndarray],
+        model_identity: Callable[[], str],
+        max_entries: int = 100000,
+        ttl_seconds: float = 3600,
+        metrics_name_prefix: str = "predict_cache_",
+    ):
+        self.predict_function = predict_function
+        self.model_identity = model_identity
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._identity = None
+        self._lock = threading.Lock()
+
+        self.hit_counter = Counter(
+            metrics_name_prefix + "hits", "How many predictions were read from cache?"
+        )
+        self.miss_counter = Counter(
+            metrics_name_prefix + "misses",
+            "How many predictions were not found in cache?",
+        )
+        self.eviction_counter = Counter(
+            metrics_name_prefix + "evictions",
+            "How many cached predictions were evicted or expired?",
+        )
+        self.invalidation_counter = Counter(
+            metrics_name_prefix + "invalidations",
+            "How many times was the cache cleared due to a model change?",
+        )
+        self.size_gauge = Gauge(
+            metrics_name_prefix + "size_entries", "How many predictions are cached?"
+        )
+
+    @staticmethod
+    def row_keys(X: pd.DataFrame) -> np.ndarray:
+        """
+        Stable hash of each row of a typed dataframe
+        """
+        return pd.util.hash_pandas_object(X, index=False).to_numpy()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_gauge.set(0)
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        """
+        Return predictions for rows of X, predicting only rows not in cache
+        """
+        identity = self.model_identity()
+        keys = self.row_keys(X)
+        now = time.monotonic()
+        cached = [None] * len(keys)
+        misses = []
+        expired = 0
+        with self._lock:
+            if identity != self._identity:
+                if self._entries:
+                    self.invalidation_counter.inc()
+                self._entries.clear()
+                self._identity = identity
+            for i, key in enumerate(keys.tolist()):
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(key)
+                    cached[i] = entry
+                else:
+                    if entry is not None:
+                        del self._entries[key]
+                        expired += 1
+                    misses.append(i)
+            self.size_gauge.set(len(self._entries))
+        self.eviction_counter.inc(expired)
+        self.hit_counter.inc(len(keys) - len(misses))
+        self.miss_counter.inc(len(misses))
+        if not misses:
+            return np.array([entry[0] for entry in cached], dtype=object)
+
+        y = self.predict_function(X.iloc[misses] if len(misses) < len(keys) else X)
+        self._store(identity, keys[misses], y, now + self.ttl_seconds)
+        if len(misses) == len(keys):
+            return y
+        ret = np.empty(len(keys), dtype=object)
+        for i, entry in enumerate(cached):
+            if entry is not None:
+                ret[i] = entry[0]
+        ret[misses] = y
+        return ret
+
+    def _store(self, identity: str, keys: np.ndarray, y: np.ndarray, expires: float):
+        with self._lock:
+            # model changed while predicting, do not cache stale predictions
+            if identity != self._identity:
+                return
+            for key, value in zip(keys.tolist(), y.tolist()):
+                self._entries[key] = (value, expires)
+                self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            self.eviction_counter.inc(evicted)
+            self.size_gauge.set(len(self._entries))
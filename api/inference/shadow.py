@@ -0,0 +1,139 @@
+import logging
+import queue
+import random
+import threading
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from prometheus_client import Counter, Gauge, Histogram
+
+
+class ShadowScorer:
+    """
+    Score requests with a shadow model off the request hot path, and compare
+    its predictions with the primary model's.
+
+    submit() only puts the input frame and primary predictions to a bounded queue
+    and returns. A pool of daemon threads, started lazily so that the scorer also works
+    in forked worker processes, predicts the queued batches with the shadow model.
+    Submissions are sampled with sample_rate, and dropped when the queue is full,
+    so shadow scoring never backs up the primary path.
+
+    The frames are queued without copying, they must not be modified after submit().
+
+    Parameters:
+        predict_function: function that takes a typed pd.DataFrame and returns
+            a one dimensional array with a shadow prediction per row
+        max_queue_size: int, maximum number of batches waiting to be scored
+        workers: int, number of scoring threads
+        sample_rate: float, share of submitted batches scored, 0-1
+        output_monitor: optional DriftMonitor to put shadow predictions to
+        metrics_name_prefix: prefix for the prometheus metrics created
+    """
+
+    def __init__(
+        self,
+        predict_function: Callable[[pd.DataFrame], np.ndarray],
+        max_queue_size: int = 100,
+        workers: int = 1,
+        sample_rate: float = 1.0,
+        output_monitor=None,
+        metrics_name_prefix: str = "shadow_",
+    ):
+        self.predict_function = predict_function
+        self.workers = workers
+        self.sample_rate = sample_rate
+        self.output_monitor = output_monitor
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._threads = []
+        self._thread_lock = threading.Lock()
+
+        self.request_counter = Counter(
+            metrics_name_prefix + "requests_total",
+            "Shadow scoring of request batches by result: scored, sampled_out, dropped or failed",
+            ["result"],
+        )
+        self.row_counter = Counter(
+            metrics_name_prefix + "rows_total",
+            "How many rows were scored by the shadow model?",
+        )
+        self.agreement_counter = Counter(
+            metrics_name_prefix + "agreeing_rows_total",
+            "How many rows had the same shadow and primary prediction?",
+        )
+        self.predict_histogram = Histogram(
+            metrics_name_prefix + "predict_seconds",
+            "How long did the shadow model take to predict a batch?",
+        )
+        self.lag_histogram = Histogram(
+            metrics_name_prefix + "lag_seconds",
+            "How long after the primary prediction was a batch scored by the shadow model?",
+            buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+        )
+        self.queue_gauge = Gauge(
+            metrics_name_prefix + "queue_size",
+            "How many batches are waiting for shadow scoring?",
+            multiprocess_mode="livesum",
+        )
+
+    def submit(self, X: pd.DataFrame, primary_predictions: np.ndarray):
+        """
+        Queue a batch for shadow scoring, unless sampled out or the queue is full.
+        Never blocks.
+        """
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.request_counter.labels("sampled_out").inc()
+            return
+        self._ensure_running()
+        try:
+            self._queue.put_nowait((X, primary_predictions, time.monotonic()))
+        except queue.Full:
+            self.request_counter.labels("dropped").inc()
+            return
+        self.queue_gauge.inc()
+
+    def _ensure_running(self):
+        if len(self._threads) == self.workers and all(
+            t.is_alive() for t in self._threads
+        ):
+            return
+        with self._thread_lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._run, name="shadow-scorer", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            X, primary_predictions, submitted_at = self._queue.get()
+            self.queue_gauge.dec()
+            try:
+                self._score(X, primary_predictions, submitted_at)
+            except Exception as e:
+                logging.warning(f"Shadow scoring failed: {e}")
+                self.request_counter.labels("failed").inc()
+
+    def _score(self, X: pd.DataFrame, primary_predictions, submitted_at: float):
+        start = time.monotonic()
+        shadow_predictions = np.asarray(self.predict_function(X))
+        end = time.monotonic()
+        self.predict_histogram.observe(end - start)
+        self.lag_histogram.observe(end - submitted_at)
+        agreeing = int(
+            np.count_nonzero(
+                shadow_predictions.astype(str)
+                == np.asarray(primary_predictions).astype(str)
+            )
+        )
+        self.row_counter.inc(len(shadow_predictions))
+        self.agreement_counter.inc(agreeing)
+        if self.output_monitor is not None:
+            self.output_monitor.put(
+                {list(self.output_monitor.columns)[0]: shadow_predictions}
+            )
+        self.request_counter.labels("scored").inc()
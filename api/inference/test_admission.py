@@ -0,0 +1,105 @@
+import asyncio
+import unittest
+
+import pandas as pd
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+
+from inference.admission import AdmissionController
+
+_controllers = 0
+
+
+def _controller(**kwargs) -> AdmissionController:
+    # metrics are registered once per name
+    global _controllers
+    _controllers += 1
+    return AdmissionController(
+        metrics_name_prefix=f"test_admission_{_controllers}_", **kwargs
+    )
+
+
+def _app(controller: AdmissionController) -> FastAPI:
+    async def decoder(request: Request) -> pd.DataFrame:
+        return pd.DataFrame(await request.json())
+
+    app = FastAPI()
+
+    @app.post("/predict")
+    def predict(X: pd.DataFrame = Depends(controller.admitted(decoder))):
+        return {"rows": X.shape[0], "in_flight": controller.in_flight}
+
+    return app
+
+
+class TestAdmissionController(unittest.TestCase):
+    def test_admitted(self):
+        # the request slot and rows are released after the response
+        controller = _controller()
+        response = TestClient(_app(controller)).post("/predict", json={"x": [1, 2]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"rows": 2, "in_flight": 1})
+        self.assertEqual((controller.in_flight, controller.rows_in_flight), (0, 0))
+        self.assertEqual(controller.in_flight_gauge._value.get(), 0)
+
+    def test_queue_full(self):
+        # 503 with Retry-After when no more requests may wait
+        controller = _controller(
+            max_concurrency=0, max_queue_depth=0, retry_after_seconds=3
+        )
+        response = TestClient(_app(controller)).post("/predict", json={"x": [1]})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "3")
+        self.assertEqual(
+            controller.rejection_counter.labels("queue_full")._value.get(), 1
+        )
+        self.assertEqual(controller.in_flight, 0)
+
+    def test_wait(self):
+        # a waiting request is admitted when a slot is released, or times out
+        controller = _controller(
+            max_concurrency=1, max_queue_depth=1, max_wait_seconds=0.2
+        )
+
+        async def scenario():
+            await controller.acquire()
+            waiting = asyncio.ensure_future(controller.acquire())
+            await asyncio.sleep(0.01)
+            self.assertEqual(controller.waiting, 1)
+            # the queue is full
+            with self.assertRaises(HTTPException) as context:
+                await controller.acquire()
+            self.assertEqual(context.exception.status_code, 503)
+            await controller.release()
+            await waiting
+            self.assertEqual((controller.in_flight, controller.waiting), (1, 0))
+            with self.assertRaises(HTTPException):
+                await controller.acquire()
+            self.assertEqual(
+                controller.rejection_counter.labels("timeout")._value.get(), 1
+            )
+            self.assertEqual(controller.queue_depth_gauge._value.get(), 0)
+
+        asyncio.run(scenario())
+
+    def test_rows_in_flight(self):
+        # a request larger than max_rows_in_flight waits until no rows are in flight
+        controller = _controller(max_rows_in_flight=10, max_wait_seconds=1.0)
+
+        async def scenario():
+            await controller.acquire()
+            await controller.acquire_rows(4)
+            await controller.acquire()
+            large = asyncio.ensure_future(controller.acquire_rows(20))
+            await asyncio.sleep(0.01)
+            self.assertFalse(large.done())
+            await controller.release(4)
+            await large
+            self.assertEqual(controller.rows_in_flight, 20)
+            self.assertEqual(controller.rows_in_flight_gauge._value.get(), 20)
+
+        asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from inference.batch_io import TableFileWriter, file_format, iter_frames
+
+COLUMNS = {"x": float, "n": int, "s": object}
+DF = pd.DataFrame(
+    {"x": [float(i) for i in range(7)], "n": list(range(7)), "s": list("abcdefg")}
+)
+
+
+class TestBatchIO(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.dir.name, name)
+
+    def test_file_format(self):
+        self.assertEqual(file_format("a/b.CSV"), "csv")
+        self.assertEqual(file_format("b.pq"), "parquet")
+        self.assertEqual(file_format("b.arrow"), "feather")
+        with self.assertRaises(ValueError):
+            file_format("b.json")
+
+    def test_round_trip(self):
+        # files written in several parts are read back in chunks of chunk_size rows
+        for name in ("data.csv", "data.parquet", "data.feather"):
+            path = self.path(name)
+            with TableFileWriter(path) as writer:
+                writer.write(DF.iloc[:4])
+                writer.write(DF.iloc[4:])
+            frames = list(iter_frames(path, COLUMNS, chunk_size=3))
+            self.assertEqual([len(X) for X in frames], [3, 3, 1], name)
+            X = pd.concat(frames, ignore_index=True)
+            self.assertEqual(
+                X.dtypes.astype(str).tolist(), ["float64", "int64", "object"], name
+            )
+            pd.testing.assert_frame_equal(X, DF)
+
+    def test_invalid_columns(self):
+        # invalid files raise ValueError, not an http error
+        path = self.path("data.parquet")
+        with TableFileWriter(path) as writer:
+            writer.write(DF[["x", "s"]])
+        with self.assertRaises(ValueError) as context:
+            list(iter_frames(path, {"x": float, "s": float}, chunk_size=3))
+        self.assertIn("s: value is not a valid float", str(context.exception))
+        path = self.path("data.csv")
+        with TableFileWriter(path) as writer:
+            writer.write(DF[["x", "s"]])
+        for columns in (COLUMNS, {"x": float, "s": float}):
+            with self.assertRaises(ValueError):
+                list(iter_frames(path, columns, chunk_size=3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+from typing import List
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import create_model
+
+from inference.batch_predict import predict_frame, records_response
+from inference.columnar import predictions_to_frame
+
+X = pd.DataFrame({"x": np.arange(25, dtype=float)})
+
+# predictions by response value type, as returned by models
+PREDICTIONS = {
+    int: np.array([0, 1, -7, 2**40]),
+    float: np.array([0.1, 1.0, -2.5, 1 / 3, 1e-7, 1e20]),
+    str: np.array(["Setosa", "Virginica", "ä", 'a "b"'], dtype=object),
+    bool: np.array([True, False, True]),
+}
+
+
+class Model:
+    def __init__(self, outputs: int = 0):
+        # outputs: number of output columns, 0 for a one dimensional output
+        self.outputs = outputs
+        self.batch_sizes = []
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        self.batch_sizes.append(X.shape[0])
+        y = X["x"].to_numpy() * 2
+        if self.outputs:
+            return np.stack([y + i for i in range(self.outputs)], axis=1)
+        return y
+
+
+def _app(value_type, encode_records: bool) -> TestClient:
+    # the baseline endpoint returning pydantic objects, or one using records_response
+    Response = create_model("Response", y=(value_type, ...))
+    predictions = PREDICTIONS[value_type]
+    app = FastAPI()
+
+    if encode_records:
+
+        @app.post("/predict", response_model=List[Response])
+        @records_response()
+        def predict():
+            return predictions_to_frame(predictions, "y", value_type)
+
+    else:
+
+        @app.post("/predict", response_model=List[Response])
+        def predict():
+            return [Response(y=value_type(value)) for value in predictions]
+
+    return TestClient(app)
+
+
+class TestPredictFrame(unittest.TestCase):
+    def test_chunks(self):
+        # ceil(n / chunk_size) model calls, predictions concatenated in input order
+        for outputs in (0, 1, 2):
+            model = Model(outputs)
+            y = predict_frame(model, X, chunk_size=10)
+            self.assertEqual(model.batch_sizes, [10, 10, 5])
+            self.assertEqual(y.shape, (25,))
+            self.assertEqual(y.tolist(), (X["x"] * 2).tolist())
+
+    def test_single_call(self):
+        model = Model()
+        predict_frame(model, X, chunk_size=25)
+        self.assertEqual(model.batch_sizes, [25])
+        self.assertEqual(len(predict_frame(model, X.iloc[:0])), 0)
+        self.assertEqual(model.batch_sizes, [25])
+
+    def test_invalid_chunk_size(self):
+        with self.assertRaises(ValueError):
+            predict_frame(Model(), X, chunk_size=0)
+
+
+class TestRecordsResponse(unittest.TestCase):
+    def test_same_json(self):
+        for value_type in PREDICTIONS:
+            baseline = _app(value_type, False).post("/predict")
+            records = _app(value_type, True).post("/predict")
+            self.assertEqual(records.status_code, 200)
+            self.assertEqual(records.content, baseline.content, value_type)
+            self.assertEqual(records.headers["content-type"], "application/json")
+
+    def test_same_openapi(self):
+        for value_type in PREDICTIONS:
+            baseline, records = (
+                _app(value_type, encode_records).get("/openapi.json").json()
+                for encode_records in (False, True)
+            )
+            self.assertEqual(records, baseline)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import json
+import unittest
+
+import pandas as pd
+from fastapi import HTTPException
+
+from inference.columnar import (
+    ARROW_STREAM_MEDIA_TYPE,
+    CSV_MEDIA_TYPE,
+    JSON_MEDIA_TYPE,
+    PARQUET_MEDIA_TYPE,
+    columns_to_frame,
+    read_table,
+    write_table,
+)
+
+COLUMNS = {"x": float, "n": int, "b": bool, "s": object}
+DF = pd.DataFrame({"x": [1.5, 2.5], "n": [1, 2], "b": [True, False], "s": ["a", "b"]})
+
+
+class TestColumnsToFrame(unittest.TestCase):
+    def test_types(self):
+        df = columns_to_frame(
+            {"x": [1.5, "2.5"], "n": [1, 2], "b": [True, False], "s": ["a", 1]},
+            COLUMNS,
+        )
+        self.assertEqual(
+            df.dtypes.astype(str).tolist(), ["float64", "int64", "bool", "object"]
+        )
+        self.assertEqual(df["s"].tolist(), ["a", "1"])
+
+    def test_bool_strings(self):
+        # booleans are coerced as in the pydantic schema, not by truthiness
+        df = columns_to_frame({"b": ["false", "True", "0", "yes", 0, 1]}, {"b": bool})
+        self.assertEqual(df["b"].tolist(), [False, True, False, True, False, True])
+        with self.assertRaises(HTTPException) as context:
+            columns_to_frame({"b": ["maybe"]}, {"b": bool})
+        self.assertEqual(context.exception.detail[0]["loc"], ["body", "b"])
+
+    def test_errors(self):
+        with self.assertRaises(HTTPException) as context:
+            columns_to_frame({"x": [1.0, None]}, COLUMNS)
+        self.assertEqual(context.exception.status_code, 422)
+        self.assertEqual(
+            [error["loc"] for error in context.exception.detail],
+            [["body", "n"], ["body", "b"], ["body", "s"]],
+        )
+        with self.assertRaises(HTTPException) as context:
+            columns_to_frame({"x": [1.0, None]}, {"x": float})
+        self.assertEqual(context.exception.detail[0]["loc"], ["body", "x", 1])
+        with self.assertRaises(HTTPException) as context:
+            columns_to_frame({"x": [1.0], "n": [1, 2]}, {"x": float, "n": int})
+        self.assertEqual(context.exception.detail[0]["type"], "value_error.length")
+
+
+class TestReadTable(unittest.TestCase):
+    def test_binary_formats(self):
+        for media_type in (ARROW_STREAM_MEDIA_TYPE, PARQUET_MEDIA_TYPE, CSV_MEDIA_TYPE):
+            df = read_table(write_table(DF, media_type), media_type, COLUMNS)
+            pd.testing.assert_frame_equal(df, DF, check_dtype=True)
+
+    def test_json(self):
+        body = json.dumps(DF.to_dict(orient="list")).encode()
+        pd.testing.assert_frame_equal(read_table(body, JSON_MEDIA_TYPE, COLUMNS), DF)
+
+    def test_invalid(self):
+        with self.assertRaises(HTTPException) as context:
+            read_table(b"not arrow", ARROW_STREAM_MEDIA_TYPE, COLUMNS)
+        self.assertEqual(context.exception.status_code, 400)
+        with self.assertRaises(HTTPException) as context:
+            read_table(b"", "text/plain", COLUMNS)
+        self.assertEqual(context.exception.status_code, 415)
+        with self.assertRaises(HTTPException) as context:
+            read_table(
+                write_table(DF[["x"]], PARQUET_MEDIA_TYPE), PARQUET_MEDIA_TYPE, COLUMNS
+            )
+        self.assertEqual(context.exception.status_code, 422)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import pandas as pd
+from fastapi import HTTPException
+
+from inference.columnar import CSV_MEDIA_TYPE
+from inference.jobs import DONE, FAILED, QUEUED, RUNNING, BulkJobs
+
+COLUMNS = {"x": float}
+CSV = b"x\n1.0\n2.0\n3.0\n"
+
+_jobs = 0
+
+
+def _predict(X: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({"y": X["x"] * 2})
+
+
+def _bulk_jobs(spool_dir: str, **kwargs) -> BulkJobs:
+    # metrics are registered once per name
+    global _jobs
+    _jobs += 1
+    return BulkJobs(
+        spool_dir,
+        _predict,
+        COLUMNS,
+        chunk_size=2,
+        metrics_name_prefix=f"test_jobs_{_jobs}_",
+        **kwargs,
+    )
+
+
+def _submit(jobs: BulkJobs, body: bytes, media_type: str = CSV_MEDIA_TYPE) -> dict:
+    async def stream():
+        yield body
+
+    return asyncio.run(jobs.submit(stream(), media_type))
+
+
+def _wait_for_status(jobs: BulkJobs, job_id: str, timeout: float = 5.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while jobs.status(job_id)["status"] in (QUEUED, RUNNING):
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+    return jobs.status(job_id)
+
+
+class TestBulkJobs(unittest.TestCase):
+    def setUp(self):
+        self.spool = tempfile.TemporaryDirectory()
+        self.spool_dir = self.spool.name
+
+    def tearDown(self):
+        self.spool.cleanup()
+
+    def test_score(self):
+        jobs = _bulk_jobs(self.spool_dir)
+        status = _submit(jobs, CSV)
+        self.assertEqual(status["status"], QUEUED)
+        status = _wait_for_status(jobs, status["job_id"])
+        self.assertEqual(status["status"], DONE)
+        self.assertEqual(status["rows_done"], 3)
+        result = pd.read_csv(jobs.result_path(status["job_id"]))
+        self.assertEqual(result["y"].tolist(), [2.0, 4.0, 6.0])
+        self.assertEqual(jobs.finished_counter.labels(DONE)._value.get(), 1)
+
+    def test_failed(self):
+        jobs = _bulk_jobs(self.spool_dir)
+        status = _wait_for_status(jobs, _submit(jobs, b"z\n1\n")["job_id"])
+        self.assertEqual(status["status"], FAILED)
+        self.assertTrue(status["error"])
+        with self.assertRaises(HTTPException) as context:
+            jobs.result_path(status["job_id"])
+        self.assertEqual(context.exception.status_code, 409)
+
+    def test_recover(self):
+        # jobs left queued or running by a restart are scored by the next process
+        stopped = _bulk_jobs(self.spool_dir, workers=0)
+        queued = _submit(stopped, CSV)["job_id"]
+        running = _submit(stopped, CSV)["job_id"]
+        path = os.path.join(self.spool_dir, running, "status.json")
+        with open(path) as f:
+            status = json.load(f)
+        status.update(status=RUNNING, rows_done=2)
+        with open(path, "w") as f:
+            json.dump(status, f)
+
+        jobs = _bulk_jobs(self.spool_dir)
+        jobs.recover()
+        for job_id in (queued, running):
+            status = _wait_for_status(jobs, job_id)
+            self.assertEqual((status["status"], status["rows_done"]), (DONE, 3))
+            self.assertEqual(len(pd.read_csv(jobs.result_path(job_id))), 3)
+
+    def test_invalid_requests(self):
+        jobs = _bulk_jobs(self.spool_dir, max_queued=0)
+        for body, media_type, status_code in (
+            (CSV, "application/json", 415),
+            (CSV, CSV_MEDIA_TYPE, 503),
+        ):
+            with self.assertRaises(HTTPException) as context:
+                _submit(jobs, body, media_type)
+            self.assertEqual(context.exception.status_code, status_code)
+        for job_id in ("../etc", "0" * 32):
+            with self.assertRaises(HTTPException) as context:
+                jobs.status(job_id)
+            self.assertEqual(context.exception.status_code, 404)
+
+    def test_delete(self):
+        jobs = _bulk_jobs(self.spool_dir)
+        job_id = _submit(jobs, CSV)["job_id"]
+        _wait_for_status(jobs, job_id)
+        jobs.delete(job_id)
+        self.assertFalse(os.path.exists(os.path.join(self.spool_dir, job_id)))
+        with self.assertRaises(HTTPException):
+            jobs.status(job_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
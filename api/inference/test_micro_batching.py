@@ -0,0 +1,78 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from inference.micro_batching import MicroBatcher
+
+
+class TestMicroBatcher(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def predict(self, X):
+        with self.lock:
+            self.batches.append(X.shape[0])
+        return X["x"].to_numpy() * 2
+
+    def test_concurrent_requests(self):
+        # concurrent requests are predicted together, each gets its own rows back
+        batcher = MicroBatcher(
+            self.predict,
+            max_batch_size=1000,
+            max_wait_seconds=0.2,
+            metrics_name_prefix="test_concurrent_",
+        )
+        frames = [pd.DataFrame({"x": np.arange(i, i + 3.0)}) for i in range(8)]
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(batcher.predict, frames))
+        for X, y in zip(frames, results):
+            np.testing.assert_array_equal(y, X["x"].to_numpy() * 2)
+        self.assertEqual(sum(self.batches), 24)
+        self.assertLess(len(self.batches), 8)
+
+    def test_batch_size_limit(self):
+        # a request that does not fit into the batch starts the next one
+        batcher = MicroBatcher(
+            self.predict,
+            max_batch_size=10,
+            max_wait_seconds=0.2,
+            metrics_name_prefix="test_batch_size_limit_",
+        )
+        frames = [pd.DataFrame({"x": np.arange(i, i + 4.0)}) for i in range(6)]
+        with ThreadPoolExecutor(6) as pool:
+            results = list(pool.map(batcher.predict, frames))
+        for X, y in zip(frames, results):
+            np.testing.assert_array_equal(y, X["x"].to_numpy() * 2)
+        self.assertEqual(sum(self.batches), 24)
+        self.assertLessEqual(max(self.batches), 10)
+
+    def test_large_request(self):
+        # requests of max_batch_size rows are predicted directly
+        batcher = MicroBatcher(
+            self.predict, max_batch_size=4, metrics_name_prefix="test_large_"
+        )
+        y = batcher.predict(pd.DataFrame({"x": np.arange(4.0)}))
+        np.testing.assert_array_equal(y, [0, 2, 4, 6])
+        self.assertIsNone(batcher._thread)
+
+    def test_error(self):
+        # an error of the batch is raised to every caller
+        def fail(X):
+            raise RuntimeError("model failed")
+
+        batcher = MicroBatcher(fail, metrics_name_prefix="test_error_")
+        with self.assertRaises(RuntimeError):
+            batcher.predict(pd.DataFrame({"x": [1.0]}))
+        # the batching thread survives
+        batcher.predict_function = self.predict
+        np.testing.assert_array_equal(
+            batcher.predict(pd.DataFrame({"x": [1.0]})), [2.0]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import time
+import unittest
+from types import SimpleNamespace
+
+from inference.model_reload import ModelReloader
+
+_reloaders = 0
+
+
+def _store(identity: str, request_columns: dict = None) -> SimpleNamespace:
+    # the ModelStore attributes used by the reloader
+    return SimpleNamespace(
+        model_identity=identity,
+        request_columns=request_columns or {"x": float},
+        response_columns={"y": float},
+        response_value_field="y",
+    )
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+class TestModelReloader(unittest.TestCase):
+    def setUp(self):
+        self.version = "v1"
+        self.new_store = _store("model-2")
+        self.load_error = None
+        self.loaded = []
+        self.swaps = []
+
+    def load(self):
+        self.loaded.append(self.version)
+        if self.load_error:
+            raise self.load_error
+        return self.new_store
+
+    def reloader(self, **kwargs) -> ModelReloader:
+        # metrics are registered once per name
+        global _reloaders
+        _reloaders += 1
+        return ModelReloader(
+            _store("model-1"),
+            load_function=self.load,
+            version_function=lambda: self.version,
+            on_swap=lambda old, new: self.swaps.append((old, new)),
+            metrics_name_prefix=f"test_reload_{_reloaders}_",
+            **kwargs,
+        )
+
+    def count(self, reloader, result):
+        return reloader.reload_counter.labels(result)._value.get()
+
+    def test_swap(self):
+        # a new model store is loaded and swapped in when the version changes
+        reloader = self.reloader()
+        old_store = reloader.model_store
+        self.assertFalse(reloader.check())
+        self.assertEqual(self.loaded, [])
+        self.version = "v2"
+        self.assertTrue(reloader.check())
+        self.assertIs(reloader.model_store, self.new_store)
+        self.assertEqual(reloader.version, "v2")
+        self.assertEqual(self.swaps, [(old_store, self.new_store)])
+        self.assertFalse(reloader.check())
+        self.assertEqual(self.loaded, ["v2"])
+        self.assertEqual(self.count(reloader, "success"), 1)
+
+    def test_incompatible_schema(self):
+        # a model with another request schema is not swapped, nor loaded again
+        self.new_store = _store("model-2", request_columns={"x": float, "z": int})
+        reloader = self.reloader()
+        old_store = reloader.model_store
+        self.version = "v2"
+        self.assertFalse(reloader.check())
+        self.assertFalse(reloader.check())
+        self.assertIs(reloader.model_store, old_store)
+        self.assertEqual(self.loaded, ["v2"])
+        self.assertEqual(self.swaps, [])
+        self.assertEqual(self.count(reloader, "incompatible"), 1)
+
+    def test_load_failure(self):
+        # the old model store is kept, and the reload retried on the next poll
+        reloader = self.reloader()
+        old_store = reloader.model_store
+        self.load_error = OSError("bundle not readable")
+        self.version = "v2"
+        self.assertFalse(reloader.check())
+        self.assertIs(reloader.model_store, old_store)
+        self.assertEqual(reloader.version, "v1")
+        self.load_error = None
+        self.assertTrue(reloader.check())
+        self.assertEqual(self.loaded, ["v2", "v2"])
+        self.assertEqual(self.count(reloader, "failed"), 1)
+
+    def test_warm_up_failure(self):
+        warmed_up = []
+
+        def warm_up(store):
+            warmed_up.append(store)
+            raise RuntimeError("warm-up failed")
+
+        reloader = self.reloader(warm_up_function=warm_up)
+        old_store = reloader.model_store
+        self.version = "v2"
+        self.assertFalse(reloader.check())
+        self.assertEqual(warmed_up, [self.new_store])
+        self.assertIs(reloader.model_store, old_store)
+        self.assertEqual(self.swaps, [])
+        self.assertEqual(self.count(reloader, "failed"), 1)
+
+    def test_version_failure(self):
+        def version():
+            raise OSError("bundle not found")
+
+        reloader = self.reloader()
+        reloader.version_function = version
+        self.assertFalse(reloader.check())
+        self.assertEqual(self.loaded, [])
+
+    def test_start_stop(self):
+        # the watcher thread polls the version until stopped
+        reloader = self.reloader(interval_seconds=0.01)
+        reloader.start()
+        self.version = "v2"
+        _wait_for(lambda: reloader.model_store is self.new_store)
+        reloader.stop()
+        reloader._thread.join(timeout=1.0)
+        self.assertFalse(reloader._thread.is_alive())
+        self.version = "v3"
+        time.sleep(0.05)
+        self.assertEqual(reloader.version, "v2")
+
+
+if __name__ == "__main__":
+    unittest.main()
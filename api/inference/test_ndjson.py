@@ -0,0 +1,82 @@
+import asyncio
+import unittest
+
+from fastapi import HTTPException
+from starlette.background import BackgroundTask
+
+from inference.ndjson import (
+    NDJSONStreamingResponse,
+    frame_to_ndjson,
+    iter_ndjson_frames,
+)
+
+COLUMNS = {"x": float, "y": str}
+
+
+async def _stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def _frames(*chunks, chunk_size=2):
+    async def collect():
+        return [
+            frame
+            async for frame in iter_ndjson_frames(_stream(*chunks), COLUMNS, chunk_size)
+        ]
+
+    return asyncio.run(collect())
+
+
+class TestIterNDJSONFrames(unittest.TestCase):
+    def test_chunks(self):
+        # rows split across reads, blank lines and no trailing newline
+        frames = _frames(
+            b'{"x": 1, "y": "a"}\n{"x": 2,',
+            b' "y": "b"}\n\n{"x": 3, "y": "c"}',
+        )
+        self.assertEqual([len(frame) for frame in frames], [2, 1])
+        self.assertEqual(frames[1]["x"].tolist(), [3.0])
+        self.assertEqual(str(frames[0]["x"].dtype), "float64")
+
+    def test_error_loc(self):
+        # row indices count from the start of the stream, not the chunk
+        with self.assertRaises(HTTPException) as context:
+            _frames(b'{"x": 1, "y": "a"}\n{"x": 2, "y": "b"}\n{"x": 3}\n')
+        self.assertEqual(context.exception.status_code, 422)
+        self.assertEqual(context.exception.detail[0]["loc"], ["body", "y", 2])
+
+    def test_invalid_json(self):
+        with self.assertRaises(ValueError):
+            _frames(b'{"x": 1, "y": "a"}\n{"x": \n')
+
+    def test_frame_to_ndjson(self):
+        frames = _frames(b'{"x": 1, "y": "a"}\n{"x": 2, "y": "b"}\n')
+        self.assertEqual(
+            frame_to_ndjson(frames[0]),
+            b'{"x":1.0,"y":"a"}\n{"x":2.0,"y":"b"}\n',
+        )
+        self.assertEqual(frame_to_ndjson(frames[0].iloc[:0]), b"")
+
+
+class TestNDJSONStreamingResponse(unittest.TestCase):
+    def test_background_on_failure(self):
+        # the background task runs if sending fails before the body is streamed
+        released = []
+
+        async def body():
+            yield b"{}\n"
+
+        async def send(message):
+            raise OSError("client disconnected")
+
+        response = NDJSONStreamingResponse(
+            body(), background=BackgroundTask(released.append, True)
+        )
+        with self.assertRaises(OSError):
+            asyncio.run(response({"type": "http"}, None, send))
+        self.assertEqual(released, [True])
+
+
+if __name__ == "__main__":
+    unittest.main()
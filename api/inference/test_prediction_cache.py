@@ -0,0 +1,133 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from inference.prediction_cache import PredictionCache
+
+
+class TestPredictionCache(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.identity = "model-1"
+
+    def predict(self, X):
+        self.calls.append(X["x"].tolist())
+        return X["x"].to_numpy() * 10
+
+    def cache(self, prefix, **kwargs):
+        return PredictionCache(
+            self.predict,
+            model_identity=lambda: self.identity,
+            metrics_name_prefix=prefix,
+            **kwargs,
+        )
+
+    def test_hits(self):
+        # only rows missing from the cache are predicted, in request order
+        cache = self.cache("test_hits_")
+        np.testing.assert_array_equal(
+            cache.predict(pd.DataFrame({"x": [1.0, 2.0]})), [10, 20]
+        )
+        y = cache.predict(pd.DataFrame({"x": [2.0, 3.0, 1.0]}))
+        np.testing.assert_array_equal(y.astype(float), [20, 30, 10])
+        self.assertEqual(self.calls, [[1.0, 2.0], [3.0]])
+        self.assertEqual(cache.hit_counter._value.get(), 2)
+        self.assertEqual(cache.miss_counter._value.get(), 3)
+        cache.predict(pd.DataFrame({"x": [3.0]}))
+        self.assertEqual(len(self.calls), 2)
+
+    def test_model_change(self):
+        # a new model identity clears the cache
+        cache = self.cache("test_model_change_")
+        cache.predict(pd.DataFrame({"x": [1.0]}))
+        self.identity = "model-2"
+        cache.predict(pd.DataFrame({"x": [1.0]}))
+        self.assertEqual(self.calls, [[1.0], [1.0]])
+        self.assertEqual(cache.invalidation_counter._value.get(), 1)
+
+    def test_model_change_while_predicting(self):
+        # predictions of a model swapped in meanwhile are not served for the new model
+        cache = self.cache("test_model_swap_")
+        cache.predict(pd.DataFrame({"x": [2.0]}))
+
+        def predict(X):
+            self.identity = "model-2"
+            return self.predict(X)
+
+        cache.predict_function = predict
+        cache.predict(pd.DataFrame({"x": [1.0]}))
+        cache.predict_function = self.predict
+        cache.predict(pd.DataFrame({"x": [1.0]}))
+        self.assertEqual(self.calls, [[2.0], [1.0], [1.0]])
+
+        # a request still predicting with the old model does not cache its rows,
+        # once another request has seen the new model
+        def predict_with_old_model(X):
+            self.identity = "model-3"
+            cache.predict_function = self.predict
+            cache.predict(pd.DataFrame({"x": [4.0]}))
+            return self.predict(X)
+
+        cache.predict_function = predict_with_old_model
+        cache.predict(pd.DataFrame({"x": [3.0]}))
+        self.assertEqual(
+            list(cache._entries),
+            PredictionCache.row_keys(pd.DataFrame({"x": [4.0]})).tolist(),
+        )
+
+    def test_eviction(self):
+        # least recently used entries are evicted
+        cache = self.cache("test_eviction_", max_entries=2)
+        cache.predict(pd.DataFrame({"x": [1.0, 2.0]}))
+        cache.predict(pd.DataFrame({"x": [1.0]}))
+        cache.predict(pd.DataFrame({"x": [3.0]}))
+        cache.predict(pd.DataFrame({"x": [1.0, 2.0]}))
+        self.assertEqual(self.calls, [[1.0, 2.0], [3.0], [2.0]])
+        self.assertEqual(cache.size_gauge._value.get(), 2)
+
+    def test_ttl(self):
+        cache = self.cache("test_ttl_", ttl_seconds=0)
+        cache.predict(pd.DataFrame({"x": [1.0]}))
+        cache.predict(pd.DataFrame({"x": [1.0]}))
+        self.assertEqual(self.calls, [[1.0], [1.0]])
+        self.assertEqual(cache.eviction_counter._value.get(), 1)
+        self.assertEqual(cache.size_gauge._value.get(), 1)
+
+    def test_size(self):
+        # the size gauge follows entries removed without storing new ones
+        cache = self.cache("test_size_", ttl_seconds=0)
+        cache.predict(pd.DataFrame({"x": [1.0, 2.0]}))
+        self.assertEqual(cache.size_gauge._value.get(), 2)
+
+        def fail(X):
+            raise RuntimeError("model failed")
+
+        cache.predict_function = fail
+        with self.assertRaises(RuntimeError):
+            cache.predict(pd.DataFrame({"x": [1.0, 2.0]}))
+        self.assertEqual(len(cache._entries), 0)
+        self.assertEqual(cache.size_gauge._value.get(), 0)
+
+        cache.predict_function = self.predict
+        cache.ttl_seconds = 3600
+        cache.predict(pd.DataFrame({"x": [1.0]}))
+        # cleared for a new model
+        self.identity = "model-2"
+        cache.predict_function = fail
+        with self.assertRaises(RuntimeError):
+            cache.predict(pd.DataFrame({"x": [1.0]}))
+        self.assertEqual(cache.size_gauge._value.get(), 0)
+
+    def test_row_keys(self):
+        # keys depend on row values only, not on the index
+        X = pd.DataFrame({"x": [1.0, 2.0], "s": ["a", "b"]})
+        keys = PredictionCache.row_keys(X)
+        self.assertEqual(len(set(keys.tolist())), 2)
+        np.testing.assert_array_equal(
+            PredictionCache.row_keys(X.iloc[::-1].reset_index(drop=True)), keys[::-1]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import threading
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from inference.shadow import ShadowScorer
+
+X = pd.DataFrame({"x": [1.0, 2.0, 3.0]})
+
+
+class OutputMonitor:
+    # records shadow predictions, as a DriftMonitor of the response schema
+    columns = {"y": float}
+
+    def __init__(self):
+        self.rows = []
+
+    def put(self, data):
+        self.rows.extend(data["y"].tolist())
+
+
+def _count(scorer, result):
+    return scorer.request_counter.labels(result)._value.get()
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+class TestShadowScorer(unittest.TestCase):
+    def test_score(self):
+        # shadow predictions are compared with the primary ones, and monitored
+        monitor = OutputMonitor()
+        scorer = ShadowScorer(
+            lambda X: X["x"].to_numpy() * 2,
+            output_monitor=monitor,
+            metrics_name_prefix="test_score_",
+        )
+        scorer.submit(X, np.array([2.0, 0.0, 6.0]))
+        _wait_for(lambda: _count(scorer, "scored") == 1)
+        self.assertEqual(scorer.row_counter._value.get(), 3)
+        self.assertEqual(scorer.agreement_counter._value.get(), 2)
+        self.assertEqual(monitor.rows, [2.0, 4.0, 6.0])
+        self.assertEqual(scorer.queue_gauge._value.get(), 0)
+
+    def test_sample_rate(self):
+        scorer = ShadowScorer(
+            lambda X: X["x"].to_numpy(),
+            sample_rate=0.0,
+            metrics_name_prefix="test_sample_rate_",
+        )
+        scorer.submit(X, X["x"].to_numpy())
+        self.assertEqual(_count(scorer, "sampled_out"), 1)
+        self.assertEqual(scorer._threads, [])
+
+    def test_full_queue(self):
+        # batches are dropped instead of waiting for a busy shadow model
+        release = threading.Event()
+
+        def predict(X):
+            release.wait()
+            return X["x"].to_numpy()
+
+        scorer = ShadowScorer(
+            predict, max_queue_size=1, metrics_name_prefix="test_full_queue_"
+        )
+        scorer.submit(X, X["x"].to_numpy())
+        _wait_for(lambda: scorer.queue_gauge._value.get() == 0)
+        start = time.monotonic()
+        for _ in range(3):
+            scorer.submit(X, X["x"].to_numpy())
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(_count(scorer, "dropped"), 2)
+        self.assertEqual(scorer.queue_gauge._value.get(), 1)
+        release.set()
+        _wait_for(lambda: _count(scorer, "scored") == 2)
+
+    def test_failure(self):
+        # a failing shadow model does not stop the scoring threads
+        def predict(X):
+            if X.shape[0] == 1:
+                raise ValueError("shadow model failed")
+            return X["x"].to_numpy()
+
+        scorer = ShadowScorer(predict, metrics_name_prefix="test_failure_")
+        scorer.submit(X.iloc[:1], np.array([1.0]))
+        scorer.submit(X, X["x"].to_numpy())
+        _wait_for(lambda: _count(scorer, "scored") == 1)
+        self.assertEqual(_count(scorer, "failed"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import threading
+import unittest
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from inference.warmup import WarmUp, synthetic_frame
+
+COLUMNS = {
+    "x": np.float64,
+    "f": np.float32,
+    "n": np.int64,
+    "u": np.uint8,
+    "b": bool,
+    "s": np.object_,
+    "t": str,
+    "d": np.dtype("datetime64[ns]"),
+}
+
+
+def _client(warm_up: WarmUp) -> TestClient:
+    # readiness check as in main.py
+    app = FastAPI()
+
+    @app.get("/ready")
+    async def ready():
+        return JSONResponse(warm_up.status(), status_code=200 if warm_up.ready else 503)
+
+    return TestClient(app)
+
+
+class TestSyntheticFrame(unittest.TestCase):
+    def test_types(self):
+        X = synthetic_frame(COLUMNS, rows=4)
+        self.assertEqual(list(X.columns), list(COLUMNS))
+        self.assertEqual(
+            X.dtypes.astype(str).tolist(),
+            [
+                "float64",
+                "float32",
+                "int64",
+                "uint8",
+                "bool",
+                "object",
+                "object",
+                "datetime64[ns]",
+            ],
+        )
+        self.assertEqual(X["b"].tolist(), [True, False, True, False])
+        self.assertEqual(X["s"].tolist(), ["warmup"] * 4)
+        self.assertFalse(X.isna().any().any())
+        # the same rows for the same seed
+        pd.testing.assert_frame_equal(X, synthetic_frame(COLUMNS, rows=4))
+
+
+class TestWarmUp(unittest.TestCase):
+    def test_ready(self):
+        # /ready is 503 while warming up, then 200 with cold and warm latencies
+        started, release = threading.Event(), threading.Event()
+        batches = []
+
+        def path(X):
+            started.set()
+            release.wait()
+            batches.append(X.shape)
+
+        warm_up = WarmUp(COLUMNS, path, rows=10, rounds=3)
+        client = _client(warm_up)
+        thread = warm_up.start()
+        started.wait(timeout=5.0)
+        response = client.get("/ready")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["status"], "warming up")
+        release.set()
+        thread.join(timeout=5.0)
+
+        response = client.get("/ready")
+        self.assertEqual(response.status_code, 200)
+        status = response.json()
+        self.assertEqual(status["status"], "ready")
+        self.assertGreater(status["cold_latency_seconds"], 0)
+        self.assertGreater(status["warm_latency_seconds"], 0)
+        self.assertIsNone(status["error"])
+        self.assertEqual(batches, [(10, len(COLUMNS))] * 3)
+
+    def test_failed(self):
+        def path(X):
+            raise ValueError("model failed")
+
+        warm_up = WarmUp(COLUMNS, path)
+        warm_up.start().join(timeout=5.0)
+        response = _client(warm_up).get("/ready")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["status"], "failed")
+        self.assertEqual(response.json()["error"], "model failed")
+
+    def test_disabled(self):
+        calls = []
+        warm_up = WarmUp(COLUMNS, calls.append, enabled=False)
+        warm_up.start()
+        self.assertEqual(_client(warm_up).get("/ready").status_code, 200)
+        self.assertEqual(calls, [])
+        self.assertIsNone(warm_up.status()["cold_latency_seconds"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import logging
+import threading
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+
+def synthetic_frame(columns: dict, rows: int = 100, seed: int = 0) -> pd.DataFrame:
+    """
+    Generate a typed dataframe of synthetic rows from model schema columns,
+    e.g. model_store.request_columns. Numeric columns are random, booleans alternate
+    and other columns are filled with a constant string.
+    """
+    rng = np.random.default_rng(seed)
+    data = {}
+    for name, dtype in columns.items():
+        if dtype == np.object_ or dtype == object or dtype == str:
+            data[name] = pd.Series(["warmup"] * rows, dtype=object)
+        elif np.dtype(dtype).kind == "b":
+            data[name] = np.arange(rows) % 2 == 0
+        elif np.dtype(dtype).kind in "iuf":
+            data[name] = (rng.random(rows) * 10).astype(dtype)
+        else:
+            data[name] = np.zeros(rows, dtype=dtype)
+    return pd.DataFrame(data, columns=list(columns))
+
+
+class WarmUp:
+    """
+    Warm up a prediction path with synthetic rows and track readiness.
+
+    The path is called rounds times with the same synthetic batch. The first call
+    is the cold latency, the median of the rest is the warm latency.
+    Run with start() in a background thread, so that the app serves
+    liveness checks while warming up.
+
+    Parameters:
+        columns: dict of name-type pairs of the request schema
+        path: function that takes a typed input dataframe and runs it through
+            prediction, monitoring calculations and serialization
+        enabled: bool, if false, report ready without warming up
+        rows: int, number of synthetic rows
+        rounds: int, how many times to run the path
+    """
+
+    def __init__(
+        self,
+        columns: dict,
+        path: Callable[[pd.DataFrame], object],
+        enabled: bool = True,
+        rows: int = 100,
+        rounds: int = 3,
+    ):
+        self.columns = columns
+        self.path = path
+        self.enabled = enabled
+        self.rows = rows
+        self.rounds = rounds
+        self.ready = not enabled
+        self.error = None
+        self.cold_latency_seconds = None
+        self.warm_latency_seconds = None
+
+    def run(self):
+        """
+        Run the warm up. Set ready when done, or store the error if it failed.
+        """
+        try:
+            X = synthetic_frame(self.columns, self.rows)
+            latencies = []
+            for _ in range(self.rounds):
+                start = time.perf_counter()
+                self.path(X)
+                latencies.append(time.perf_counter() - start)
+            self.cold_latency_seconds = latencies[0]
+            if len(latencies) > 1:
+                self.warm_latency_seconds = float(np.median(latencies[1:]))
+            self.ready = True
+            logging.info(
+                f"Warm up done: cold latency {self.cold_latency_seconds:.4f} s, warm latency {self.warm_latency_seconds} s"
+            )
+        except Exception as e:
+            self.error = str(e)
+            logging.error(f"Warm up failed: {e}")
+
+    def start(self) -> threading.Thread:
+        """
+        Run warm up in a background thread, unless disabled
+        """
+        thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+        if self.enabled:
+            thread.start()
+        return thread
+
+    def status(self) -> dict:
+        """
+        Readiness status with cold and warm latencies
+        """
+        return {
+            "status": "ready"
+            if self.ready
+            else ("failed" if self.error else "warming up"),
+            "cold_latency_seconds": self.cold_latency_seconds,
+            "warm_latency_seconds": self.warm_latency_seconds,
+            "error": self.error,
+        }
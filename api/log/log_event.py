@@ -1,3 +1,4 @@
+import json
 from logging import LogRecord
 from sqlite3 import Timestamp
 from typing import Optional
@@ -22,7 +23,13 @@ class LogEvent(SQLModel, table=True):
             self.message = None
             if "prediction" in record.msg:
                 self.type = "PREDICTION"
-                self.request = record.msg["request_parameters"].json()
+                request_parameters = record.msg["request_parameters"]
+                # pydantic request objects or plain dicts (column-oriented requests)
+                self.request = (
+                    request_parameters.json()
+                    if hasattr(request_parameters, "json")
+                    else json.dumps(request_parameters, default=str)
+                )
                 self.response = record.msg["prediction"]
         else:
             self.message = record.msg
@@ -1,11 +1,15 @@
+import json
 import logging
-from typing import List
+from typing import Dict, List
 
+import orjson
 import pandas as pd
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.params import Depends
-from fastapi.responses import HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
 
 from app_base import (
@@ -14,13 +18,49 @@ from app_base import (
     processing_drift,
     DynamicApiResponse,
     DynamicApiRequest,
-    model,
+    model_store,
+    predict_batch,
+    predict_current_model,
     setting_log_predictions,
     response_value_type,
     response_value_field,
+    NDJSON_CHUNK_SIZE,
+    setting_warmup,
+    setting_model_reload,
+    model_reloader,
+    shadow_scorer,
+    shadow_output_drift,
+    admission_controller,
+    ADMISSION_RESERVED_THREADS,
+    bulk_jobs,
+    setting_predict_auth,
+    WARMUP_ROWS,
 )
+from inference.batch_predict import (
+    frame_to_records,
+    records_request_decoder,
+    records_request_openapi,
+    records_response,
+)
+from inference.columnar import (
+    table_request_decoder,
+    table_request_openapi,
+    table_response,
+    predictions_to_frame,
+    write_table,
+    ARROW_STREAM_MEDIA_TYPE,
+    media_type_of,
+)
+from inference.jobs import JOB_FILE_SUFFIXES
+from inference.ndjson import (
+    NDJSON_MEDIA_TYPE,
+    NDJSONStreamingResponse,
+    iter_ndjson_frames,
+    frame_to_ndjson,
+)
+from inference.warmup import WarmUp
 from metrics.prometheus_metrics import monitor_output, monitor_input, generate_metrics
-from security.http_basic import http_auth_metrics
+from security.http_basic import http_auth_metrics, http_auth_predict
 
 # Start up API
 app = FastAPI(
@@ -38,44 +78,262 @@ app.add_middleware(
 )
 
 
+def warm_up_path(X: pd.DataFrame):
+    """
+    Prediction, monitoring and serialization path for warm up.
+    Drift queues, metrics and prediction logs are not touched by synthetic rows.
+    The model is called directly, so synthetic rows are neither cached nor micro-batched.
+    """
+    prediction_values = predict_current_model(X)
+    y = predictions_to_frame(
+        prediction_values, response_value_field, response_value_type
+    )
+    input_drift.summary_statistics_function(X)
+    output_drift.summary_statistics_function(y)
+    orjson.dumps(frame_to_records(y))
+    write_table(y, ARROW_STREAM_MEDIA_TYPE)
+
+
+warm_up = WarmUp(
+    model_store.request_columns, warm_up_path, enabled=setting_warmup, rows=WARMUP_ROWS
+)
+
+
+# opt-in authentication and per-client rate limiting of prediction endpoints
+predict_dependencies = [Depends(http_auth_predict)] if setting_predict_auth else []
+
+
+def admitted(decoder):
+    """
+    Wrap a request decoder dependency with admission control, if enabled
+    """
+    if admission_controller is None:
+        return decoder
+    return admission_controller.admitted(decoder)
+
+
+@app.on_event("startup")
+def start_background_tasks():
+    # warm up and watch for new models in background: liveness checks pass meanwhile
+    warm_up.start()
+    if setting_model_reload:
+        model_reloader.start()
+    # requeue bulk jobs left unfinished by a restart
+    bulk_jobs.recover()
+
+
+@app.on_event("shutdown")
+def stop_background_tasks():
+    # requests in flight have finished: stop watching for new models.
+    # unfinished bulk jobs are requeued at the next startup
+    model_reloader.stop()
+    # write drift queue rows not yet backed up
+    for monitor in (input_drift, output_drift, processing_drift):
+        monitor.close()
+
+
+@app.on_event("startup")
+async def reserve_threads():
+    # admitted predictions can not take up the whole threadpool
+    if admission_controller is not None:
+        admission_controller.reserve_threadpool(ADMISSION_RESERVED_THREADS)
+
+
+@app.get("/health")
+async def health():
+    """
+    Liveness check: the app is up
+    """
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness check: 200 once the prediction path is warmed up, else 503.
+    Reports cold and warm latency of the warm up.
+    """
+    return JSONResponse(warm_up.status(), status_code=200 if warm_up.ready else 503)
+
+
 @app.get("/metrics", response_model=dict)
 @input_drift.update_metrics_decorator()  # calculate drift metrics & pass to prometheus
 @output_drift.update_metrics_decorator()
 @processing_drift.update_metrics_decorator()
 def get_metrics(username: str = Depends(http_auth_metrics)):
+    if shadow_output_drift is not None:
+        shadow_output_drift.update_metrics()
     return HTMLResponse(generate_metrics())
 
 
-@app.post("/predict", response_model=List[DynamicApiResponse])
+def predict_table(X: pd.DataFrame) -> pd.DataFrame:
+    """
+    Predict a typed input frame, return predictions as a single column dataframe
+    """
+    prediction_values = predict_batch(X)
+    if shadow_scorer is not None:
+        shadow_scorer.submit(X, prediction_values)
+    if setting_log_predictions:
+        for p, prediction in zip(frame_to_records(X), prediction_values):
+            logging.info({"prediction": str(prediction), "request_parameters": p})
+    return predictions_to_frame(
+        prediction_values, response_value_field, response_value_type
+    )
+
+
+@app.post(
+    "/predict",
+    response_model=List[DynamicApiResponse],
+    openapi_extra=records_request_openapi(DynamicApiRequest),
+    dependencies=predict_dependencies,
+)
+@records_response()  # encode predictions straight to json
 @monitor_output(output_drift)  # add new data to fifos
-@monitor_input(input_drift)
-@processing_drift.monitor()
+@monitor_input(input_drift, parameter_name="X")
+@processing_drift.monitor(parameter_name="X")
 def predict(
-    p_list: List[DynamicApiRequest],
-):  # , username: str = Depends(auth_predict.auth)):
-    # loop trough parameter list
-    prediction_values = []
-    for p in p_list:
-        # pickle: convert parameter object to array for model
-        # parameter_array = [getattr(p, k) for k in vars(p)]
-        # prediction = model.predict([parameter_array])
-        # mlflow: convert to json
-        parameter_dict = {k: getattr(p, k) for k in vars(p)}
-        X = pd.json_normalize(parameter_dict)
-        prediction = model.predict(X)
-        # append prediction
-        prediction_values.append(prediction)
-        if setting_log_predictions:
-            logging.info({"prediction": str(prediction), "request_parameters": p})
-    # Construct response
-    response: List[DynamicApiResponse] = []
+    X: pd.DataFrame = Depends(
+        admitted(records_request_decoder(model_store.request_decoder))
+    ),
+):
+    # request rows are decoded straight to a typed frame & predicted at once
+    return predict_table(X)
+
+
+@app.post(
+    "/predict/columns",
+    response_model=Dict[str, list],
+    openapi_extra=table_request_openapi(model_store.request_columns),
+    dependencies=predict_dependencies,
+)
+@table_response()  # encode response in the request format
+@monitor_output(output_drift)  # add new data to fifos
+@monitor_input(input_drift, parameter_name="X")
+@processing_drift.monitor(parameter_name="X")
+def predict_columns(
+    request: Request,
+    X: pd.DataFrame = Depends(
+        admitted(table_request_decoder(model_store.request_columns))
+    ),
+):
+    """
+    Column-oriented variant of /predict. Request body is selected by content-type:
+    - application/json: a dict of equal length lists, e.g. {"sepal_length": [6.7, 6.6], ...}
+    - application/vnd.apache.arrow.stream: arrow IPC stream
+    - application/vnd.apache.parquet: parquet file
+    - text/csv: csv file with a header row
+    Predictions are returned as a single column in the same format.
+    """
+    return predict_table(X)
+
+
+@monitor_output(output_drift)  # add new data to fifos
+@monitor_input(input_drift, parameter_name="X")
+@processing_drift.monitor(parameter_name="X")
+def predict_stream_chunk(X: pd.DataFrame) -> pd.DataFrame:
+    """
+    Predict and monitor a chunk of a streamed request.
+    Each chunk is counted and timed as a request.
+    """
+    return predict_table(X)
+
+
+@app.post(
+    "/predict/stream",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {NDJSON_MEDIA_TYPE: {"schema": {"type": "string"}}},
+        }
+    },
+    dependencies=predict_dependencies,
+)
+async def predict_stream(request: Request):
+    """
+    Streaming variant of /predict for large batches.
+    Request body is newline-delimited json, one row object per line.
+    Rows are scored in chunks of NDJSON_CHUNK_SIZE as they are read,
+    and predictions are streamed back as newline-delimited json in the same order.
+    If a chunk can not be decoded, an error object is streamed and the response ends.
+    """
+    release = None
+    if admission_controller is not None:
+        # a stream holds a request slot and a chunk of rows until the response ends
+        await admission_controller.acquire()
+        try:
+            await admission_controller.acquire_rows(NDJSON_CHUNK_SIZE)
+        except HTTPException:
+            await admission_controller.release()
+            raise
+        release = BackgroundTask(admission_controller.release, NDJSON_CHUNK_SIZE)
+
+    async def predictions():
+        try:
+            async for X in iter_ndjson_frames(
+                request.stream(), model_store.request_columns, NDJSON_CHUNK_SIZE
+            ):
+                df = await run_in_threadpool(predict_stream_chunk, X=X)
+                yield frame_to_ndjson(df)
+        except HTTPException as e:
+            yield json.dumps({"detail": e.detail}).encode("utf8") + b"\n"
+        except (ValueError, AttributeError) as e:
+            yield json.dumps({"detail": f"Invalid ndjson: {e}"}).encode("utf8") + b"\n"
+
+    return NDJSONStreamingResponse(predictions(), background=release)
+
+
+@app.post(
+    "/jobs",
+    status_code=202,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                media_type: {"schema": {"type": "string", "format": "binary"}}
+                for media_type in JOB_FILE_SUFFIXES
+            },
+        }
+    },
+    dependencies=predict_dependencies,
+)
+async def submit_job(request: Request):
+    """
+    Submit a bulk scoring job. Request body is a csv, parquet or arrow file,
+    selected by content-type. The body is spooled to disk and scored in chunks
+    in background. Returns the job status with its job_id.
+    """
+    return await bulk_jobs.submit(request.stream(), media_type_of(request))
+
+
+@app.get("/jobs/{job_id}", dependencies=predict_dependencies)
+def job_status(job_id: str):
+    """
+    Status of a bulk scoring job: queued, running, done or failed,
+    with the number of rows scored and throughput
+    """
+    return bulk_jobs.status(job_id)
+
+
+@app.get("/jobs/{job_id}/result", dependencies=predict_dependencies)
+def job_result(job_id: str):
+    """
+    Download the predictions of a finished job, in the format of the submitted file
+    """
+    status = bulk_jobs.status(job_id)
+    return FileResponse(
+        bulk_jobs.result_path(job_id),
+        media_type=status["media_type"],
+        filename=f"{job_id}_result{status['suffix']}",
+    )
 
-    # Cast predicted values to correct type and add response value to response array
-    for predicted_value in prediction_values:
-        typed_value = response_value_type(predicted_value[0])
-        response.append(DynamicApiResponse(**{response_value_field: typed_value}))
 
-    return response
+@app.delete("/jobs/{job_id}", dependencies=predict_dependencies)
+def delete_job(job_id: str):
+    """
+    Delete a job and its files
+    """
+    bulk_jobs.delete(job_id)
+    return {"job_id": job_id, "status": "deleted"}
 
 
 if __name__ == "__main__":
@@ -1,11 +1,22 @@
 from __future__ import annotations
+import contextlib
+import contextvars
 import functools
 from typing import Iterable, Type, Union, Callable
 import os
-from prometheus_client import generate_latest, Counter, Gauge, Enum, Info
-import pyarrow.feather as feather
+from prometheus_client import (
+    generate_latest,
+    multiprocess,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Enum,
+    Info,
+    REGISTRY,
+)
 import datetime as dt
 import re
+import threading
 import time
 
 from itertools import product
@@ -13,6 +24,10 @@ from itertools import product
 import numpy as np
 import pandas as pd
 
+from .queue_backup import QueueBackup
+from .shared_memory import SharedQueueMemory
+from .streaming_statistics import SlidingWindowStatistics, StreamingStatistics
+
 # functions for checking data types:
 
 
@@ -451,6 +466,21 @@ def record_metrics_from_dict(
     return ret
 
 
+def unregister_metrics(metric_handles: list):
+    """
+    Unregister metric handles, e.g. from record_metrics_from_dict(),
+    from the default prometheus registry
+    """
+    for m in metric_handles:
+        try:
+            REGISTRY.unregister(m)
+        except KeyError:
+            pass
+
+
+SAMPLING_MODES = ("fifo", "reservoir")
+
+
 class DriftQueue:
     """
     A FIFO overwrite queue for storing [maxsize] latest items.
@@ -464,6 +494,30 @@ class DriftQueue:
         datapoints
      - if given a filename for backup, will try to initialize and back up the queue to given file.
         This is to avoid data loss due to container failures etc.
+        New rows are appended to a log and the queue is compacted to the file periodically
+        by a background thread, see QueueBackup.
+
+    The queue is a ring buffer of preallocated numpy arrays, one per column.
+    Putting n rows copies n values per column, and a clearing flush hands the arrays
+    over to the returned dataframe without copying and allocates new ones.
+    Strings and other objects are stored as references in object arrays.
+
+    A shared queue keeps the ring buffers in shared memory (see SharedQueueMemory).
+    Created before worker processes are forked, all workers put rows to the same
+    queue, and only one of them, the leader, gets rows at flush. Strings and other
+    objects are stored as fixed width strings of string_width characters.
+    With a backup file, the leader logs its own rows and snapshots the rows of all workers.
+    The leader is elected by the first flush: rows put before it are backed up
+    in the first snapshot of the leader.
+
+    A reservoir queue keeps a uniform random sample of maxsize rows of all rows put,
+    instead of the latest rows (reservoir sampling with random keys, A-Res): each row
+    gets a random key, and the rows with the largest keys are kept. Rows may be
+    weighted at put. Most rows of a long horizon are rejected by comparing keys with
+    the smallest key kept, so puts stay cheap, and reservoirs are merged by keeping
+    the largest keys of both (see merge). With sampling_horizon_seconds, the queue is
+    full once the horizon has passed, so that a flush returns a sample of e.g. a day.
+    Reservoir queues are not backed up nor shared.
 
     Parameters:
         columns: dict of name-type pairs to build a pd.DataFrame
@@ -471,6 +525,17 @@ class DriftQueue:
         maxsize: int, size of the fifo queue (dataframe rows)
         clear_at_flush: bool, if true, clear queue at flush if non-empty dataframe is returned
         only_flush_full: bool, if true, you can only get values from full queue
+        compact_dtypes: bool, if true, store float columns as float32. Halves the memory
+            of float columns, at the cost of float32 precision in summary statistics
+        backup_interval_seconds: float, how often new rows are appended to the backup log
+        snapshot_interval_seconds: float, how often the queue is written to the backup file
+        backup_fsync: 'always', 'snapshot' or 'never', when backups are synced to disk
+        backup_compression: 'lz4', 'zstd' or 'uncompressed'
+        shared: bool, if true, share the queue with worker processes forked later
+        string_width: int, characters stored per string in a shared queue
+        sampling: 'fifo' to keep the latest rows, 'reservoir' to keep a random sample
+        sampling_horizon_seconds: float, time after which a reservoir queue is full.
+            if 0, it is full once it holds maxsize rows
 
     """
 
@@ -481,55 +546,241 @@ class DriftQueue:
         maxsize: int = 1000,
         clear_at_flush: bool = True,
         only_flush_full: bool = True,
+        compact_dtypes: bool = False,
+        backup_interval_seconds: float = 1.0,
+        snapshot_interval_seconds: float = 60.0,
+        backup_fsync: str = "snapshot",
+        backup_compression: str = "lz4",
+        shared: bool = False,
+        string_width: int = 64,
+        sampling: str = "fifo",
+        sampling_horizon_seconds: float = 0.0,
     ):
+        if sampling not in SAMPLING_MODES:
+            raise ValueError(
+                f"sampling must be one of {SAMPLING_MODES}, got {sampling}"
+            )
+        if sampling == "reservoir" and (shared or backup_file != ""):
+            raise ValueError("Reservoir queues can not be shared nor backed up")
         self.maxsize = maxsize
         self.columns = columns
         self.clear_at_flush = clear_at_flush
         self.only_flush_full = only_flush_full
         self.backup_file = backup_file
+        self.backup_options = {
+            "interval_seconds": backup_interval_seconds,
+            "snapshot_interval_seconds": snapshot_interval_seconds,
+            "fsync": backup_fsync,
+            "compression": backup_compression,
+        }
+        self.shared = shared
+        self.sampling = sampling
+        self.sampling_horizon_seconds = sampling_horizon_seconds
+        self._rng = np.random.default_rng()
+        self.dtypes = {
+            name: _buffer_dtype(t, compact_dtypes, string_width if shared else 0)
+            for name, t in columns.items()
+        }
+        if shared:
+            self._memory = SharedQueueMemory(self.dtypes, maxsize)
+            self._header = self._memory.header
+            self._lock = self._memory.lock
+        else:
+            self._memory = None
+            self._header = np.zeros(2, dtype=np.int64)
+            self._lock = threading.Lock()
+        self._backup = None
+        self._restore()
+
+    def _allocate(self):
+        # empty ring buffers: start is the position of the oldest row
+        if self._memory is None:
+            self._buffers = {
+                name: np.empty(self.maxsize, dtype=dtype)
+                for name, dtype in self.dtypes.items()
+            }
+        else:  # shared buffers are allocated once
+            self._buffers = self._memory.buffers
+        self._start = 0
+        self._size = 0
+        if self.sampling == "reservoir":
+            # sampling keys of the rows kept, rows seen since the queue was cleared
+            self._keys = np.empty(self.maxsize)
+            self._seen = 0
+            self._horizon_start = time.monotonic()
+
+    # start & size of the ring live in a header array, shared with other processes
+    # if the queue is shared
+    @property
+    def _start(self) -> int:
+        return int(self._header[0])
+
+    @_start.setter
+    def _start(self, value: int):
+        self._header[0] = value
+
+    @property
+    def _size(self) -> int:
+        return int(self._header[1])
+
+    @_size.setter
+    def _size(self, value: int):
+        self._header[1] = value
+
+    def _restore(self):
+        self._allocate()
         # initialize from backup file if given one
-        if backup_file != "":
-            try:
-                with open(backup_file, "rb") as f:
-                    self.df = feather.read_feather(f)
-                    self._cut_to_maxsize()
-            except FileNotFoundError:
-                self.df = pd.DataFrame(columns=columns)
-        else:  # else just create new
-            self.df = pd.DataFrame(columns=columns)
+        if self.backup_file != "":
+            self._backup = QueueBackup(
+                self.backup_file,
+                lambda: self._frame().copy(),
+                self._lock,
+                self.dtypes,
+                **self.backup_options,
+            )
+            for rows in self._backup.recover():
+                self._put(rows)
+            self._backup.compact()
+
+    def set_backup_file(self, backup_file: str) -> DriftQueue:
+        """
+        Back up the queue to another file, and initialize the queue from it.
+        Used to give each worker process a backup file of its own.
+        Return reference to self.
+        """
+        self.close()
+        with self._lock:
+            self.backup_file = backup_file
+            self._restore()
+        return self
+
+    def close(self):
+        """
+        Write rows not yet backed up and stop backing up in background
+        """
+        if self._backup is not None:
+            self._backup.close()
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """
+        Queue contents as a dataframe, oldest row first
+        """
+        return self._frame().copy()
+
+    def _frame(self) -> pd.DataFrame:
+        # queue contents in order. a view of the buffers, unless the queue wraps around
+        end = self._start + self._size
+        if end <= self.maxsize:
+            data = {name: b[self._start : end] for name, b in self._buffers.items()}
+        else:
+            data = {
+                name: np.concatenate((b[self._start :], b[: end - self.maxsize]))
+                for name, b in self._buffers.items()
+            }
+        # fixed width strings of a shared queue are returned as objects
+        for name, values in data.items():
+            if values.dtype.kind == "U":
+                data[name] = values.astype(object)
+        return pd.DataFrame(data, columns=list(self.columns), copy=False)
 
     def is_full(self) -> bool:
         """
-        Check if queue has maxsize elements
+        Check if queue has maxsize elements,
+        or if a reservoir queue has been sampling for the sampling horizon
         """
-        if self.df.shape[0] >= self.maxsize:
+        if self.sampling == "reservoir" and self.sampling_horizon_seconds > 0:
+            return (
+                self._size > 0
+                and time.monotonic() - self._horizon_start
+                >= self.sampling_horizon_seconds
+            )
+        if self._size >= self.maxsize:
             return True
         else:
             return False
 
-    def _cut_to_maxsize(self):
-        # drop oldest rows exceeding maxsize
-        if self.is_full():
-            self.df = self.df.iloc[-self.maxsize :]
-
-    def put(self, rows: Union[np.ndarray, Iterable, dict, pd.DataFrame]) -> DriftQueue:
+    def _put(self, rows: pd.DataFrame):
+        # copy new rows to the buffers, overwriting the oldest rows if full
+        n = rows.shape[0]
+        if n >= self.maxsize:
+            rows = rows.iloc[n - self.maxsize :]
+            n = self.maxsize
+        end = (self._start + self._size) % self.maxsize
+        first = min(n, self.maxsize - end)  # rows before wrapping around
+        for name, column in zip(self.columns, rows.columns):
+            values = rows[column].to_numpy()
+            buffer = self._buffers[name]
+            buffer[end : end + first] = values[:first]
+            buffer[: n - first] = values[first:]
+        overflow = max(0, self._size + n - self.maxsize)
+        self._start = (self._start + overflow) % self.maxsize
+        self._size = min(self.maxsize, self._size + n)
+
+    def _put_sample(self, rows: pd.DataFrame, keys: np.ndarray):
+        # keep the rows with the largest keys of the rows kept and the new rows
+        self._seen += rows.shape[0]
+        free = min(rows.shape[0], self.maxsize - self._size)
+        slots = np.arange(self._size, self._size + free)
+        new = np.arange(free)
+        if free < rows.shape[0]:
+            # new rows with keys larger than the smallest key kept replace rows kept
+            kept_keys = self._keys[: self._size + free]
+            kept_keys[self._size :] = keys[:free]
+            candidates = free + np.flatnonzero(keys[free:] > kept_keys.min())
+            if candidates.size > 0:
+                top = np.argpartition(
+                    -np.concatenate((kept_keys, keys[candidates])), self.maxsize - 1
+                )[: self.maxsize]
+                evicted = np.setdiff1d(np.arange(self.maxsize), top)
+                replacing = candidates[top[top >= self.maxsize] - self.maxsize]
+                slots = np.concatenate((slots, evicted))
+                new = np.concatenate((new, replacing))
+                # a new row may be evicted by a later new row: keep the last row per slot
+                last = slots.size - 1 - np.unique(slots[::-1], return_index=True)[1]
+                slots, new = slots[last], new[last]
+        for name, column in zip(self.columns, rows.columns):
+            self._buffers[name][slots] = rows[column].to_numpy()[new]
+        self._keys[slots] = keys[new]
+        self._size += free
+
+    def put(
+        self,
+        rows: Union[np.ndarray, Iterable, dict, pd.DataFrame],
+        weights: np.ndarray = None,
+    ) -> DriftQueue:
         """
         Put new items to queue. If full, overwrite the oldest value.
-        Overwrite backupfile.
+        New rows are appended to the write-ahead log of the backup file,
+        a background thread writes snapshots of the queue.
+        A reservoir queue samples the rows, in proportion to weights if given,
+        and is not backed up.
         Return reference to self.
         """
-        # add new data
-        self.df = pd.concat(
-            (self.df, pd.DataFrame(rows, columns=self.columns)),
-            ignore_index=True,
+        # dataframes with the queue columns are added as is
+        if not (
+            isinstance(rows, pd.DataFrame) and list(rows.columns) == list(self.columns)
+        ):
+            rows = pd.DataFrame(rows, columns=self.columns)
+        # rows of other processes are backed up in snapshots of the leader.
+        # the leader is elected at flush
+        backup = self._backup is not None and (
+            self._memory is None or self._memory.leads()
         )
-
-        self._cut_to_maxsize()
-
-        # write backup for queue
-        if self.backup_file != "":
-            with open(self.backup_file, "wb") as f:
-                feather.write_feather(self.df, f)
+        if self.sampling == "reservoir":
+            # A-Res keys u^(1/w), as logarithms
+            keys = np.log(self._rng.random(rows.shape[0]))
+            if weights is not None:
+                keys = keys / np.asarray(weights, dtype=np.float64)
+            with self._lock:
+                self._put_sample(rows, keys)
+            return self
+        with self._lock:
+            self._put(rows)
+
+            # log new rows to backup in background
+            if backup:
+                self._backup.append(rows, max_pending_rows=self.maxsize)
 
         return self
 
@@ -540,15 +791,63 @@ class DriftQueue:
         Clear queue after flushing if required.
         If empty dataframe would be returned, but queue is not empty,
         queue is not cleared to not to loose data.
+        A shared queue is only flushed by the leader process.
         """
-        ret = self.df.copy()
-        # return empty dataframe if not completely full
-        if self.only_flush_full and not self.is_full():
-            ret.drop(ret.index, inplace=True)
-        # only allow clear queue if return is not empty
-        elif ret.shape[0] > 0 and self.clear_at_flush:
-            self.df.drop(self.df.index, inplace=True)
-        return ret
+        leader = self._memory is None or self._memory.is_leader()
+        with self._lock:
+            ret = self._frame()
+            # return empty dataframe if not completely full
+            if not leader or (self.only_flush_full and not self.is_full()):
+                return ret.iloc[:0].copy()
+            # only allow clear queue if return is not empty
+            if ret.shape[0] > 0 and self.clear_at_flush:
+                if self._memory is None:
+                    # hand the buffers over to the returned dataframe
+                    self._allocate()
+                else:  # shared buffers are reused
+                    ret = ret.copy()
+                    self._start = 0
+                    self._size = 0
+                if self._backup is not None:
+                    self._backup.request_snapshot()
+                return ret
+            # buffers are overwritten by later puts
+            return ret.copy()
+
+    def merge(self, other: DriftQueue) -> DriftQueue:
+        """
+        Merge the sample of another reservoir queue with the same columns into this one,
+        e.g. samples of worker processes or of consecutive days.
+        The merged sample is a sample of the rows seen by both queues.
+        Return reference to self.
+        """
+        if self.sampling != "reservoir" or other.sampling != "reservoir":
+            raise ValueError("Only reservoir queues can be merged")
+        with other._lock:
+            rows = other.df
+            keys = other._keys[: other._size].copy()
+            seen = other._seen
+        with self._lock:
+            self._put_sample(rows, keys)
+            self._seen += seen - rows.shape[0]
+        return self
+
+
+def _buffer_dtype(t, compact: bool = False, string_width: int = 0) -> np.dtype:
+    """
+    Internal: numpy dtype of a DriftQueue column buffer.
+    Objects are stored as strings of string_width characters if string_width > 0.
+    """
+    object_dtype = np.dtype(f"U{string_width}" if string_width > 0 else object)
+    try:
+        dtype = np.dtype(t)
+    except TypeError:  # e.g. pandas extension types
+        return object_dtype
+    if dtype.kind in "USO":  # strings are stored as references
+        return object_dtype
+    if compact and dtype.kind == "f" and dtype.itemsize > 4:
+        return np.dtype(np.float32)
+    return dtype
 
 
 def default_summary_statistics(df: pd.DataFrame) -> pd.DataFrame:
@@ -634,6 +933,14 @@ def simple_text_summary_statistics(df: pd.DataFrame) -> pd.DataFrame:
     return pd.DataFrame()
 
 
+def streaming_summary_statistics(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Distribution metrics of numeric columns, computed by StreamingStatistics.
+    Median is approximate.
+    """
+    return StreamingStatistics(dict(df.dtypes)).update(df).summary()
+
+
 class SummaryStatisticsMetrics:
     """
     Class wrapper for generic drift monitoring.
@@ -665,6 +972,7 @@ class SummaryStatisticsMetrics:
         summary_statistics_function: Callable = default_summary_statistics,
         convert_names_to_promql: bool = True,
         metrics_name_prefix: str = "",
+        gauge_multiprocess_mode: str = "all",
     ):
         """
         Parameters:
@@ -674,10 +982,13 @@ class SummaryStatisticsMetrics:
         convert_names_to_promql: metric names are inferred from given column and summary statistic function.
             If true, inferred names are auto-corrected to promql.
         metrics_name_prefix: an optional prefix to prometheus metric names created, e.g. 'input_'
+        gauge_multiprocess_mode: how gauges of worker processes are aggregated when
+            PROMETHEUS_MULTIPROC_DIR is set, e.g. 'livemax' for gauges set by one process only
         """
         self.summary_statistics_function = summary_statistics_function
         self.convert_names_to_promql = convert_names_to_promql
         self.metrics_name_prefix = metrics_name_prefix
+        self.gauge_multiprocess_mode = gauge_multiprocess_mode
         self.sumstat_df = pd.DataFrame()
         # Pandas category information is not conserved element-wise.
         # To ensure categorical variables are correctly
@@ -713,7 +1024,11 @@ class SummaryStatisticsMetrics:
             m = Enum(metric_name, metric_description, states=categories)
         # gauge
         elif is_time(dtypename) or is_numeric(dtypename) or is_bool(dtypename):
-            m = Gauge(metric_name, metric_description)
+            m = Gauge(
+                metric_name,
+                metric_description,
+                multiprocess_mode=self.gauge_multiprocess_mode,
+            )
         # string & rest
         else:
             m = Info(metric_name, metric_description)
@@ -742,17 +1057,22 @@ class SummaryStatisticsMetrics:
         self.input_df_dtypes = df.dtypes
         self.sumstat_df = self.summary_statistics_function(df)
 
-        # check if sumstat & input share all columns
-        if self.input_df_columns.values.sort() == self.sumstat_df.columns.values.sort():
+        # check if sumstat & input share all columns.
+        # categories are listed in the order of sumstat columns
+        if sorted(self.input_df_columns) == sorted(self.sumstat_df.columns):
             # boolean array where true indicates that the variable is categorical
             self.category_indicator = (
-                np.array([get_dtypename(dt) for dt in self.input_df_dtypes])
+                np.array(
+                    [get_dtypename(self.input_df_dtypes[c]) for c in self.sumstat_df]
+                )
                 == "category"
             )
         else:
             self.category_indicator = np.zeros(self.sumstat_df.shape[1])
         self.categories_list = []  # store categories for creating enums
-        for categorical, colname in zip(self.category_indicator, self.input_df_columns):
+        for categorical, colname in zip(
+            self.category_indicator, self.sumstat_df.columns
+        ):
             if categorical:
                 self.categories_list.append(list(df[colname].cat.categories.values))
             else:
@@ -822,7 +1142,12 @@ class DriftMonitor(DriftQueue, SummaryStatisticsMetrics):
         summary_statistics_function: Callable = default_summary_statistics,
         convert_names_to_promql: bool = True,
         metrics_name_prefix: str = "",
+        **queue_options,
     ):
+        """
+        queue_options: further DriftQueue parameters, e.g. backup_interval_seconds.
+            Summary statistics of a shared queue are exported by the leader process only.
+        """
 
         # init base classes
         DriftQueue.__init__(
@@ -832,12 +1157,14 @@ class DriftMonitor(DriftQueue, SummaryStatisticsMetrics):
             backup_file=backup_file,
             clear_at_flush=clear_at_flush,
             only_flush_full=only_flush_full,
+            **queue_options,
         )
         SummaryStatisticsMetrics.__init__(
             self,
             summary_statistics_function=summary_statistics_function,
             convert_names_to_promql=convert_names_to_promql,
             metrics_name_prefix=metrics_name_prefix,
+            gauge_multiprocess_mode="livemax" if self.shared else "all",
         )
 
     def update_metrics(self) -> DriftMonitor:
@@ -865,6 +1192,198 @@ class DriftMonitor(DriftQueue, SummaryStatisticsMetrics):
         return wrapper1
 
 
+class StreamingDriftMonitor(SummaryStatisticsMetrics):
+    """
+    Drift monitor that keeps streaming summary statistics of the rows put,
+    instead of the rows themselves (see StreamingStatistics).
+
+    Putting rows updates count, min, max, mean, variance and quantile estimates
+    of each numeric column. Once sample_size rows have been put, update_metrics
+    sets the metrics from the statistics in O(columns) and starts new statistics,
+    like a DriftMonitor flushing a full queue of sample_size rows.
+    Metrics are named as with distribution_summary_statistics.
+
+    No rows are retained, so there is nothing to back up: statistics not yet
+    exported are lost at restart.
+
+    Parameters:
+        columns: dict of name-type pairs. Columns that are not numeric are not monitored
+        sample_size: int, rows summarized per metrics update
+        quantiles: quantiles to estimate, 0.5 is exported as median
+        compression: float, t-digest compression of the quantile estimates
+        convert_names_to_promql: see SummaryStatisticsMetrics
+        metrics_name_prefix: an optional prefix to prometheus metric names created, e.g. 'input_'
+    """
+
+    def __init__(
+        self,
+        columns: dict,
+        sample_size: int = 1000,
+        quantiles: tuple = (0.5,),
+        compression: float = 100,
+        convert_names_to_promql: bool = True,
+        metrics_name_prefix: str = "",
+    ):
+        SummaryStatisticsMetrics.__init__(
+            self,
+            summary_statistics_function=streaming_summary_statistics,
+            convert_names_to_promql=convert_names_to_promql,
+            metrics_name_prefix=metrics_name_prefix,
+        )
+        self.columns = columns
+        self.sample_size = sample_size
+        self.quantiles = quantiles
+        self.compression = compression
+        self._lock = threading.Lock()
+        self.statistics = self._new_statistics()
+
+    def _new_statistics(self) -> StreamingStatistics:
+        return StreamingStatistics(self.columns, self.quantiles, self.compression)
+
+    def put(
+        self, rows: Union[np.ndarray, Iterable, dict, pd.DataFrame]
+    ) -> StreamingDriftMonitor:
+        """
+        Update statistics with new rows. Return reference to self.
+        """
+        if not (
+            isinstance(rows, pd.DataFrame) and list(rows.columns) == list(self.columns)
+        ):
+            rows = pd.DataFrame(rows, columns=self.columns)
+        with self._lock:
+            self.statistics.update(rows)
+        return self
+
+    def close(self):
+        """
+        Nothing to back up, for compatibility with DriftMonitor
+        """
+
+    def update_metrics(self) -> StreamingDriftMonitor:
+        """
+        If sample_size rows have been put, set metrics from the statistics and start new ones.
+        """
+        with self._lock:
+            if self.statistics.rows < self.sample_size:
+                return self
+            statistics, self.statistics = self.statistics, self._new_statistics()
+        self.sumstat_df = statistics.summary()
+        self.input_df_columns = self.sumstat_df.columns
+        self.input_df_dtypes = self.sumstat_df.dtypes
+        self.categories_list = [None] * self.sumstat_df.shape[1]
+        return self.set_metrics()
+
+    # use update_metrics as decorator
+    update_metrics_decorator = DriftMonitor.update_metrics_decorator
+
+
+class WindowedDriftMonitor(SummaryStatisticsMetrics):
+    """
+    Drift monitor over sliding time windows, e.g. the last 5 minutes, hour and day,
+    exported side by side: input_drift_x_mean_5m, input_drift_x_mean_1h, ...
+    (see SlidingWindowStatistics).
+
+    Metrics are refreshed every refresh_seconds whatever the request rate,
+    unlike a DriftMonitor that refreshes every maxsize rows. The 'auto' window
+    is the shortest window holding adaptive_sample_size rows, and its length
+    is exported once, as window_seconds_auto.
+
+    Like StreamingDriftMonitor, rows are not retained and there is nothing to back up.
+
+    Parameters:
+        columns: dict of name-type pairs. Columns that are not numeric are not monitored
+        windows: dict of window name - length in seconds pairs, by default 5m, 1h and 24h
+        refresh_seconds: float, minimum time between metrics updates
+        buckets_per_window: int, pre-aggregated buckets per window
+        decay_half_life: float, half-life of rows as a fraction of the window length, 0 for no decay
+        adaptive_sample_size: int, rows in the 'auto' window, 0 for no 'auto' window
+        quantiles: quantiles to estimate, 0.5 is exported as median
+        compression: float, t-digest compression of the quantile estimates
+        convert_names_to_promql: see SummaryStatisticsMetrics
+        metrics_name_prefix: an optional prefix to prometheus metric names created, e.g. 'input_'
+    """
+
+    def __init__(
+        self,
+        columns: dict,
+        windows: dict = None,
+        refresh_seconds: float = 15.0,
+        buckets_per_window: int = 12,
+        decay_half_life: float = 0.0,
+        adaptive_sample_size: int = 1000,
+        quantiles: tuple = (0.5,),
+        compression: float = 100,
+        convert_names_to_promql: bool = True,
+        metrics_name_prefix: str = "",
+    ):
+        SummaryStatisticsMetrics.__init__(
+            self,
+            summary_statistics_function=streaming_summary_statistics,
+            convert_names_to_promql=convert_names_to_promql,
+            metrics_name_prefix=metrics_name_prefix,
+        )
+        self.columns = columns
+        self.refresh_seconds = refresh_seconds
+        self.statistics = SlidingWindowStatistics(
+            columns,
+            windows or {"5m": 300, "1h": 3600, "24h": 86400},
+            buckets_per_window=buckets_per_window,
+            decay_half_life=decay_half_life,
+            adaptive_sample_size=adaptive_sample_size,
+            quantiles=quantiles,
+            compression=compression,
+        )
+        self._lock = threading.Lock()
+        self._refreshed = -np.inf
+        if adaptive_sample_size > 0:
+            self.metrics["window_seconds_auto"] = Gauge(
+                metrics_name_prefix + "window_seconds_auto",
+                "Length of the 'auto' window, in seconds",
+                multiprocess_mode=self.gauge_multiprocess_mode,
+            )
+
+    def put(
+        self, rows: Union[np.ndarray, Iterable, dict, pd.DataFrame]
+    ) -> WindowedDriftMonitor:
+        """
+        Add new rows to the current buckets. Return reference to self.
+        """
+        if not (
+            isinstance(rows, pd.DataFrame) and list(rows.columns) == list(self.columns)
+        ):
+            rows = pd.DataFrame(rows, columns=self.columns)
+        with self._lock:
+            self.statistics.update(rows, time.time())
+        return self
+
+    def close(self):
+        """
+        Nothing to back up, for compatibility with DriftMonitor
+        """
+
+    def update_metrics(self) -> WindowedDriftMonitor:
+        """
+        If refresh_seconds have passed, set metrics from the statistics of each window.
+        """
+        now = time.time()
+        with self._lock:
+            if now - self._refreshed < self.refresh_seconds:
+                return self
+            self._refreshed = now
+            self.sumstat_df = self.statistics.summary(now)
+            if "window_seconds_auto" in self.metrics:
+                self.metrics["window_seconds_auto"].set(
+                    self.statistics.windows[self.statistics.auto_window(now)]
+                )
+        self.input_df_columns = self.sumstat_df.columns
+        self.input_df_dtypes = self.sumstat_df.dtypes
+        self.categories_list = [None] * self.sumstat_df.shape[1]
+        return self.set_metrics()
+
+    # use update_metrics as decorator
+    update_metrics_decorator = DriftMonitor.update_metrics_decorator
+
+
 # util & wrappers
 
 
@@ -873,7 +1392,7 @@ class RequestMonitor(DriftMonitor):
     DriftMonitor wrapper for monitoring request & processing times
     """
 
-    def __init__(self, backup_file="", maxsize: int = 1000):
+    def __init__(self, backup_file="", maxsize: int = 1000, **queue_options):
         super().__init__(
             columns={
                 "processing_time_seconds": float,
@@ -884,6 +1403,7 @@ class RequestMonitor(DriftMonitor):
             metrics_name_prefix="predict_request_",
             summary_statistics_function=mean_max_summary_statistics,
             maxsize=maxsize,
+            **queue_options,
         )
 
         self.request_counter = Counter(
@@ -894,26 +1414,30 @@ class RequestMonitor(DriftMonitor):
             "How many individual predictions have been made in total? ",
         )
 
-    def monitor(self):
+    def monitor(self, parameter_name: str = "p_list"):
         """
         Decorator. Count requests, predictions and time it takes to process a request & predictions
+
+        parameter_name: name of the decorated function parameter holding the request rows
         """
 
         def timer(function):
             @functools.wraps(function)
             def wrapper(*args, **kwargs):
-                # add to requrest & prediction counters
-                self.request_counter.inc()
-                self.prediction_counter.inc(len(kwargs["p_list"]))
-                # time response
-                start = time.time()
-                response = function(*args, **kwargs)
-                end = time.time()
-                processing_time = end - start
-                N = len(response) + 1  # how many rows in request
-                self.put([[processing_time, N, processing_time / N]])
-                #
-                return response
+                with request_context() as context:
+                    context.input_frame(kwargs[parameter_name])
+                    N = context.rows  # how many rows in request
+                    # add to requrest & prediction counters
+                    self.request_counter.inc()
+                    self.prediction_counter.inc(N)
+                    # time response
+                    start = time.time()
+                    response = function(*args, **kwargs)
+                    end = time.time()
+                    processing_time = end - start
+                    self.put([[processing_time, N, processing_time / max(N, 1)]])
+                    #
+                    return response
 
             return wrapper
 
@@ -938,30 +1462,127 @@ def pass_api_version_to_prometheus():
     return m
 
 
+class _ProcessLocalCollector:
+    """
+    Internal: collect the info and enum metrics of this process.
+    They are not written to the multiprocess metric files.
+    """
+
+    def collect(self):
+        for metric in REGISTRY.collect():
+            if metric.type in ("info", "stateset"):
+                yield metric
+
+
 def generate_metrics():
     """
-    Wrapper for prometheus_client generate_latest()
+    Wrapper for prometheus_client generate_latest().
+    With several worker processes (PROMETHEUS_MULTIPROC_DIR set), counters, gauges and
+    histograms are aggregated over all workers, info and enum metrics are those of
+    the worker serving the request.
     """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_ProcessLocalCollector())
+        return generate_latest(registry)
     return generate_latest()
 
 
-def monitor_input(driftmonitor: DriftMonitor):
+class RequestContext:
+    """
+    Request scoped batch shared by the monitoring decorators of a request.
+
+    The request rows are materialized once as a typed columnar frame, and the same
+    frame is passed to the model, the drift monitors and the prediction logger.
+    Frames are matched to the monitored columns by position without copying.
+    """
+
+    def __init__(self):
+        self.X = None  # request rows
+        self.y = None  # predictions
+        self.rows = 0
+
+    def input_frame(self, values, columns: dict = None) -> pd.DataFrame:
+        """
+        Request rows as a dataframe, materialized at first call
+        """
+        if self.X is None:
+            self.X = _values_to_frame(values)
+            self.rows = self.X.shape[0]
+        return _align_columns(self.X, columns)
+
+    def output_frame(self, values, columns: dict = None) -> pd.DataFrame:
+        """
+        Predictions as a dataframe, materialized at first call
+        """
+        if self.y is None:
+            self.y = _values_to_frame(values)
+        return _align_columns(self.y, columns)
+
+
+_request_context: contextvars.ContextVar = contextvars.ContextVar(
+    "request_context", default=None
+)
+
+
+@contextlib.contextmanager
+def request_context():
+    """
+    Enter the context of the current request, or start one if there is none.
+    The outermost monitoring decorator of a request owns the context.
+    """
+    context = _request_context.get()
+    if context is not None:
+        yield context
+        return
+    context = RequestContext()
+    token = _request_context.set(context)
+    try:
+        yield context
+    finally:
+        _request_context.reset(token)
+
+
+def _values_to_frame(values) -> pd.DataFrame:
+    """
+    Internal: convert request or response values to a dataframe.
+    Dataframes are passed as is, column-oriented dicts are wrapped,
+    lists of pydantic objects are converted row by row.
+    """
+    if isinstance(values, pd.DataFrame):
+        return values
+    if isinstance(values, dict):
+        return pd.DataFrame(values)
+    return pd.DataFrame.from_records([vars(p) for p in values])
+
+
+def _align_columns(df: pd.DataFrame, columns: dict = None) -> pd.DataFrame:
+    """
+    Internal: match dataframe columns to monitored columns by position, without copying
+    """
+    if columns is None or list(df.columns) == list(columns):
+        return df
+    return df.set_axis(list(columns), axis=1, copy=False)
+
+
+def monitor_input(driftmonitor: DriftMonitor, parameter_name: str = "p_list"):
     """
     Monitor inputs of requests: summary statistics, count requests and individual rows in all requests
+
+    parameter_name: name of the decorated function parameter holding the request rows
     """
 
     def monitor(function):
         @functools.wraps(function)
         def wrapper(*args, **kwargs):
-            # loop through parameters
-            input_values = []
-            for p in kwargs["p_list"]:
-                parameter_array = [getattr(p, k) for k in vars(p)]
-                input_values.append(parameter_array)
-            # update driftmonitor
-            driftmonitor.put(input_values)
-            # call function with parameters
-            return function(*args, **kwargs)
+            with request_context() as context:
+                # update driftmonitor
+                driftmonitor.put(
+                    context.input_frame(kwargs[parameter_name], driftmonitor.columns)
+                )
+                # call function with parameters
+                return function(*args, **kwargs)
 
         return wrapper
 
@@ -976,17 +1597,13 @@ def monitor_output(driftmonitor: DriftMonitor):
     def monitor(function):
         @functools.wraps(function)
         def wrapper(*args, **kwargs):
-            # call function
-            ret = function(*args, **kwargs)
-            # loop through response and extract values
-            output_values = []
-            for p in ret:
-                label_array = [getattr(p, k) for k in vars(p)]
-                output_values.append(label_array)
-            # update DriftMonitor
-            driftmonitor.put(output_values)
-            # return original response
-            return ret
+            with request_context() as context:
+                # call function
+                ret = function(*args, **kwargs)
+                # update DriftMonitor
+                driftmonitor.put(context.output_frame(ret, driftmonitor.columns))
+                # return original response
+                return ret
 
         return wrapper
 
@@ -0,0 +1,241 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+FSYNC_POLICIES = ("always", "snapshot", "never")
+
+
+class QueueBackup:
+    """
+    Crash-safe backup of a DriftQueue: compacted snapshots and an append-only
+    write-ahead log (WAL) of the rows put after the latest snapshot.
+
+    Rows put to the queue are only referenced on the request path. A daemon thread
+    appends them to the log every interval_seconds, as record batches of an arrow IPC
+    stream in [backup_file].wal, and writes a snapshot of the whole queue to
+    backup_file (feather) every snapshot_interval_seconds, or when the queue is cleared.
+    After a snapshot the log is truncated. The thread is started lazily, so that
+    the backup also works in worker processes forked after it was created.
+
+    At startup the queue is recovered by reading the snapshot and replaying the log.
+    A record batch cut short by a crash ends the replay. A log left by another
+    process, e.g. the previous leader of a shared queue, is not appended to:
+    a snapshot is written instead, which truncates the log.
+
+    Parameters:
+        backup_file: str, path of the snapshot file
+        frame_function: function returning the queue contents as a dataframe
+        lock: the lock of the queue. append and request_snapshot are called holding it
+        columns: dict of queue column name - numpy dtype pairs, rows are logged in these types
+        interval_seconds: float, how often rows are appended to the log
+        snapshot_interval_seconds: float, how often the queue is compacted to a snapshot
+        fsync: 'always' to fsync the log after each append and every snapshot,
+            'snapshot' to fsync snapshots only, 'never' to leave it to the OS
+        compression: 'lz4', 'zstd' or 'uncompressed', for snapshots and log
+    """
+
+    def __init__(
+        self,
+        backup_file: str,
+        frame_function: Callable[[], pd.DataFrame],
+        lock: threading.Lock,
+        columns: dict,
+        interval_seconds: float = 1.0,
+        snapshot_interval_seconds: float = 60.0,
+        fsync: str = "snapshot",
+        compression: str = "lz4",
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync}")
+        self.backup_file = backup_file
+        self.wal_file = backup_file + ".wal"
+        self.frame_function = frame_function
+        self.lock = lock
+        self.columns = columns
+        self.interval_seconds = interval_seconds
+        self.snapshot_interval_seconds = snapshot_interval_seconds
+        self.fsync = fsync
+        self.compression = compression
+        self._pending = []
+        self._pending_rows = 0
+        self._snapshot_due = False
+        self._last_snapshot = time.monotonic()
+        self._wal_rows = 0  # rows logged since the latest snapshot
+        self._wal = None
+        self._wal_writer = None
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def recover(self) -> Iterator[pd.DataFrame]:
+        """
+        Yield the rows of the latest snapshot, then the rows logged after it
+        """
+        try:
+            with open(self.backup_file, "rb") as f:
+                yield feather.read_feather(f)
+        except FileNotFoundError:
+            pass
+        try:
+            with pa.ipc.open_stream(self.wal_file) as reader:
+                while True:
+                    try:
+                        batch = reader.read_next_batch()
+                    except StopIteration:
+                        break
+                    except (pa.ArrowInvalid, OSError):
+                        logging.warning(f"Truncated record batch in {self.wal_file}")
+                        break
+                    self._wal_rows += batch.num_rows
+                    yield batch.to_pandas()
+        except (pa.ArrowInvalid, OSError):
+            pass  # no log, or empty log
+
+    def compact(self):
+        """
+        Write a snapshot of the queue and truncate the log, if there is a log.
+        A new log can not be appended to a log cut short by a crash.
+        """
+        if os.path.exists(self.wal_file) and os.path.getsize(self.wal_file) > 0:
+            self._write_snapshot(self.frame_function())
+
+    def append(self, rows: pd.DataFrame, max_pending_rows: int):
+        """
+        Queue rows for the log. If more than max_pending_rows rows are waiting,
+        they are dropped and a snapshot is written instead.
+        """
+        self._pending.append(rows)
+        self._pending_rows += rows.shape[0]
+        if self._pending_rows > max_pending_rows:
+            self._pending = []
+            self._pending_rows = 0
+            self._snapshot_due = True
+        self._ensure_running()
+
+    def request_snapshot(self):
+        """
+        Write a snapshot at the next interval, e.g. after the queue was cleared
+        """
+        self._snapshot_due = True
+        self._ensure_running()
+
+    def close(self):
+        """
+        Stop the backup thread and write rows still waiting
+        """
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._write()
+        self._close_wal()
+
+    def _ensure_running(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._closed.is_set():
+                return
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="drift-queue-backup", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._closed.wait(self.interval_seconds):
+            try:
+                self._write()
+            except Exception:
+                logging.exception(
+                    f"Failed to back up drift queue to {self.backup_file}"
+                )
+
+    def _write(self):
+        # take the rows waiting and, if due, the queue contents at the same time:
+        # a snapshot includes all rows taken
+        with self.lock:
+            batches, self._pending, self._pending_rows = self._pending, [], 0
+            logged_rows = self._wal_rows + sum(b.shape[0] for b in batches)
+            snapshot = self._snapshot_due or (
+                logged_rows > 0
+                and time.monotonic() - self._last_snapshot
+                >= self.snapshot_interval_seconds
+            )
+            # a log stream written by another process can not be continued
+            snapshot = snapshot or (
+                bool(batches) and self._wal_writer is None and self._foreign_wal()
+            )
+            frame = self.frame_function() if snapshot else None
+            self._snapshot_due = False
+        if snapshot:
+            self._write_snapshot(frame)
+        elif batches:
+            try:
+                self._write_wal(batches)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, ValueError):
+                # rows do not match the log schema: write them in a snapshot
+                with self.lock:
+                    self._snapshot_due = True
+
+    def _foreign_wal(self) -> bool:
+        # a non-empty log not opened by this process
+        return os.path.exists(self.wal_file) and os.path.getsize(self.wal_file) > 0
+
+    def _write_snapshot(self, frame: pd.DataFrame):
+        tmp_file = self.backup_file + ".tmp"
+        with open(tmp_file, "wb") as f:
+            feather.write_feather(frame, f, compression=self.compression)
+            if self.fsync != "never":
+                f.flush()
+                os.fsync(f.fileno())
+        # replace the snapshot atomically, then drop the rows logged before it
+        os.replace(tmp_file, self.backup_file)
+        self._close_wal()
+        open(self.wal_file, "wb").close()
+        self._wal_rows = 0
+        self._last_snapshot = time.monotonic()
+
+    def _write_wal(self, batches: list):
+        for rows in batches:
+            table = pa.Table.from_pandas(
+                pd.DataFrame(
+                    {
+                        name: rows[column].to_numpy().astype(dtype, copy=False)
+                        for (name, dtype), column in zip(
+                            self.columns.items(), rows.columns
+                        )
+                    }
+                ),
+                preserve_index=False,
+            )
+            if self._wal_writer is None:
+                self._wal = open(self.wal_file, "ab")
+                self._wal_writer = pa.ipc.new_stream(
+                    self._wal,
+                    table.schema,
+                    options=pa.ipc.IpcWriteOptions(
+                        compression=(
+                            None
+                            if self.compression == "uncompressed"
+                            else self.compression
+                        )
+                    ),
+                )
+            self._wal_writer.write_table(table)
+            self._wal_rows += table.num_rows
+        self._wal.flush()
+        if self.fsync == "always":
+            os.fsync(self._wal.fileno())
+
+    def _close_wal(self):
+        if self._wal_writer is not None:
+            self._wal_writer.close()
+            self._wal.close()
+        self._wal_writer = None
+        self._wal = None
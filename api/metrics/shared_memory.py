@@ -0,0 +1,82 @@
+import mmap
+import multiprocessing
+import os
+
+import numpy as np
+
+# header fields: ring start & size, pid of the leader process
+_START, _SIZE, _LEADER = range(3)
+
+
+class SharedQueueMemory:
+    """
+    Ring buffers of a DriftQueue in anonymous shared memory.
+
+    Created before worker processes are forked, e.g. in the gunicorn master with
+    preload_app, the memory and its lock are shared by all workers: every worker
+    appends to the same queue, and the queue covers the traffic of the whole fleet
+    without extra memory per worker.
+
+    One process at a time is the leader. The leader flushes the queue and computes
+    summary statistics; when it exits, the next process asking takes over.
+
+    The header array holds the start and size of the ring, and the pid of the leader.
+
+    Parameters:
+        dtypes: dict of column name - numpy dtype pairs. Object columns are not supported
+        maxsize: int, rows in the ring
+    """
+
+    def __init__(self, dtypes: dict, maxsize: int):
+        header_bytes = 3 * np.dtype(np.int64).itemsize
+        offsets = {}
+        size = header_bytes
+        for name, dtype in dtypes.items():
+            if dtype.hasobject:
+                raise ValueError(f"Column {name} of type {dtype} can not be shared")
+            size += -size % 8  # align columns to 8 bytes
+            offsets[name] = size
+            size += maxsize * dtype.itemsize
+        self._mmap = mmap.mmap(-1, max(size, 1))
+        self.header = np.frombuffer(self._mmap, dtype=np.int64, count=_LEADER + 1)
+        self.buffers = {
+            name: np.frombuffer(
+                self._mmap, dtype=dtype, count=maxsize, offset=offsets[name]
+            )
+            for name, dtype in dtypes.items()
+        }
+        self.lock = multiprocessing.Lock()
+
+    def leads(self) -> bool:
+        """
+        Check if this process is the leader, without electing one
+        """
+        return int(self.header[_LEADER]) == os.getpid()
+
+    def is_leader(self) -> bool:
+        """
+        Check if this process is the leader, and become one if there is no live leader.
+        Must not be called holding the lock.
+        """
+        pid = os.getpid()
+        leader = int(self.header[_LEADER])
+        if leader == pid:
+            return True
+        if leader != 0 and _is_alive(leader):
+            return False
+        with self.lock:
+            leader = int(self.header[_LEADER])
+            if leader == 0 or not _is_alive(leader):
+                self.header[_LEADER] = pid
+                return True
+        return False
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, owned by another user
+    return True
@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+
+class TDigest:
+    """
+    Approximate quantiles of a stream of numbers: a merging t-digest.
+
+    The distribution is summarized by at most about compression weighted centroids,
+    kept small at the tails so that extreme quantiles stay accurate.
+    New values are buffered and merged into the centroids buffer_size values at a time,
+    by sorting them together and grouping neighbours by the k1 scale function.
+    Digests of separate streams can be merged.
+
+    Parameters:
+        compression: float, number of centroids, trades memory for accuracy
+        buffer_size: int, values buffered before merging into the centroids
+    """
+
+    def __init__(self, compression: float = 100, buffer_size: int = 1000):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+        self._buffer = []  # (means, weights) pairs not yet merged
+        self._buffered = 0
+
+    def update(self, values: np.ndarray) -> TDigest:
+        """
+        Add values, NaNs are skipped. Return reference to self.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size > 0:
+            self.min = min(self.min, values.min())
+            self.max = max(self.max, values.max())
+            self._add(values, np.ones(values.size))
+        return self
+
+    def merge(self, other: TDigest, weight: float = 1.0) -> TDigest:
+        """
+        Add the values summarized by another digest, each value counted weight times.
+        Return reference to self.
+        """
+        other._compress()
+        if other.weights.size > 0:
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._add(other.means, other.weights * weight)
+        return self
+
+    def quantile(self, q: float) -> float:
+        """
+        Approximate q-quantile of the values added, NaN if none
+        """
+        self._compress()
+        if self.weights.size == 0:
+            return np.nan
+        cumulative = np.cumsum(self.weights)
+        total = cumulative[-1]
+        # interpolate between centroid centres, and the extremes at both ends
+        return float(
+            np.interp(
+                q * total,
+                np.r_[0, cumulative - self.weights / 2, total],
+                np.r_[self.min, self.means, self.max],
+            )
+        )
+
+    def _add(self, means: np.ndarray, weights: np.ndarray):
+        self._buffer.append((means, weights))
+        self._buffered += means.size
+        if self._buffered >= self.buffer_size:
+            self._compress()
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        means = np.concatenate([self.means] + [m for m, _ in self._buffer])
+        weights = np.concatenate([self.weights] + [w for _, w in self._buffer])
+        self._buffer = []
+        self._buffered = 0
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        # centroids within the same unit of the k1 scale are merged
+        k = np.floor(self.compression * (np.arcsin(2 * q - 1) / np.pi + 0.5))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+
+class StreamingStatistics:
+    """
+    Summary statistics of numeric columns, updated a batch of rows at a time
+    without keeping the rows: count, min, max, mean and variance, and approximate
+    quantiles (see TDigest).
+
+    Mean and variance are updated with Welford's algorithm, generalized to batches
+    (Chan et al.): the mean and sum of squared deviations of a batch are combined
+    with those of the rows before it. The same update merges the statistics
+    of separate streams, e.g. of worker processes.
+
+    Columns that are not numeric or boolean are not summarized.
+
+    Parameters:
+        columns: dict of name-type pairs, as for DriftQueue
+        quantiles: quantiles to estimate, 0.5 is exported as median
+        compression: float, t-digest compression of the quantile estimates
+    """
+
+    def __init__(
+        self, columns: dict, quantiles: tuple = (0.5,), compression: float = 100
+    ):
+        self.columns = [name for name, t in columns.items() if _is_numeric_type(t)]
+        self.quantiles = tuple(quantiles)
+        self.compression = compression
+        self.rows = 0
+        k = len(self.columns)
+        self.count = np.zeros(k)
+        self.mean = np.zeros(k)
+        self.m2 = np.zeros(k)  # sum of squared deviations from the mean
+        self.min = np.full(k, np.inf)
+        self.max = np.full(k, -np.inf)
+        self.digests = [TDigest(compression) for _ in self.columns] if quantiles else []
+
+    def update(self, df: pd.DataFrame) -> StreamingStatistics:
+        """
+        Add the rows of a dataframe with the columns given at init. Return reference to self.
+        """
+        self.rows += df.shape[0]
+        if not self.columns or df.shape[0] == 0:
+            return self
+        x = df[self.columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(x)
+        n = valid.sum(axis=0).astype(np.float64)
+        mean = _divide(np.where(valid, x, 0).sum(axis=0), n)
+        m2 = (np.where(valid, x - mean, 0) ** 2).sum(axis=0)
+        self._combine(n, mean, m2)
+        self.min = np.fmin(self.min, np.where(valid, x, np.inf).min(axis=0))
+        self.max = np.fmax(self.max, np.where(valid, x, -np.inf).max(axis=0))
+        for digest, values in zip(self.digests, x.T):
+            digest.update(values)
+        return self
+
+    def merge(
+        self, other: StreamingStatistics, weight: float = 1.0
+    ) -> StreamingStatistics:
+        """
+        Add the statistics of another stream with the same columns. Return reference to self.
+        With weight < 1, the rows of the other stream count less, e.g. to decay old rows:
+        sample_size is then the effective number of rows.
+        """
+        self.rows += other.rows
+        self._combine(other.count * weight, other.mean, other.m2 * weight)
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        for digest, other_digest in zip(self.digests, other.digests):
+            digest.merge(other_digest, weight)
+        return self
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Summary statistics in the format of distribution_summary_statistics:
+        a column per input column, a row per statistic
+        """
+        statistics = {
+            "sample_size": self.count,
+            "min": np.where(self.count > 0, self.min, np.nan),
+            "mean": np.where(self.count > 0, self.mean, np.nan),
+        }
+        for q in self.quantiles:
+            statistics[_quantile_name(q)] = [d.quantile(q) for d in self.digests]
+        statistics["std"] = np.sqrt(_divide(self.m2, self.count - 1, fill=np.nan))
+        statistics["max"] = np.where(self.count > 0, self.max, np.nan)
+        return pd.DataFrame(statistics, index=self.columns).T
+
+    def _combine(self, n: np.ndarray, mean: np.ndarray, m2: np.ndarray):
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean = self.mean + _divide(delta * n, total)
+        self.m2 = self.m2 + m2 + _divide(delta**2 * self.count * n, total)
+        self.count = total
+
+
+class SlidingWindowStatistics:
+    """
+    StreamingStatistics over sliding time windows, e.g. the last 5 minutes, hour and day.
+
+    Each window is kept as a ring of buckets_per_window buckets of pre-aggregated
+    statistics, so that a window covers its length to within a bucket, and its
+    statistics are merged from a few buckets instead of computed from rows.
+    Rows are added to a bucket of the shortest bucket length, which is merged into
+    the buckets of every window when it closes. Buckets older than the window are dropped.
+
+    With decay_half_life > 0, the rows of older buckets are weighted down exponentially:
+    rows a half-life old count half as much as new rows.
+
+    With adaptive_sample_size > 0, an 'auto' window is reported too: the shortest window
+    holding at least adaptive_sample_size rows, or the longest window. At high request
+    rates it follows the latest traffic, at low rates it grows to have enough rows.
+
+    Parameters:
+        columns: dict of name-type pairs, as for StreamingStatistics
+        windows: dict of window name - length in seconds pairs, e.g. {'5m': 300}
+        buckets_per_window: int, buckets per window
+        decay_half_life: float, half-life of the rows in a window, as a fraction of
+            the window length. 0 weights all rows in a window equally
+        adaptive_sample_size: int, rows in the 'auto' window. 0 for no 'auto' window
+        quantiles: quantiles to estimate, 0.5 is exported as median
+        compression: float, t-digest compression of the quantile estimates
+    """
+
+    def __init__(
+        self,
+        columns: dict,
+        windows: dict,
+        buckets_per_window: int = 12,
+        decay_half_life: float = 0.0,
+        adaptive_sample_size: int = 0,
+        quantiles: tuple = (0.5,),
+        compression: float = 100,
+    ):
+        self.columns = columns
+        # shortest window first
+        self.windows = dict(sorted(windows.items(), key=lambda item: item[1]))
+        self.bucket_seconds = {
+            name: seconds / buckets_per_window for name, seconds in windows.items()
+        }
+        self.decay_half_life = decay_half_life
+        self.adaptive_sample_size = adaptive_sample_size
+        self.quantiles = quantiles
+        self.compression = compression
+        self._buckets = {name: [] for name in self.windows}  # (start, statistics)
+        self._current_seconds = min(self.bucket_seconds.values())
+        self._current_start = None
+        self._current = self._new_statistics()
+
+    def _new_statistics(self) -> StreamingStatistics:
+        return StreamingStatistics(self.columns, self.quantiles, self.compression)
+
+    def update(self, df: pd.DataFrame, now: float) -> SlidingWindowStatistics:
+        """
+        Add rows arrived at time now (seconds). Return reference to self.
+        """
+        self._rotate(now)
+        self._current.update(df)
+        return self
+
+    def window(self, name: str, now: float) -> StreamingStatistics:
+        """
+        Statistics of the rows in a window at time now (seconds)
+        """
+        self._rotate(now)
+        width = self.bucket_seconds[name]
+        half_life = self.decay_half_life * self.windows[name]
+        statistics = self._new_statistics()
+        for start, bucket in self._window_buckets(name, now):
+            age = max(0.0, now - (start + width / 2))
+            statistics.merge(bucket, 0.5 ** (age / half_life) if half_life else 1.0)
+        return statistics
+
+    def auto_window(self, now: float) -> str:
+        """
+        Name of the 'auto' window at time now (seconds): the shortest window
+        holding at least adaptive_sample_size rows, or the longest window
+        """
+        self._rotate(now)
+        return next(
+            (
+                name
+                for name in self.windows
+                if sum(b.rows for _, b in self._window_buckets(name, now))
+                >= self.adaptive_sample_size
+            ),
+            list(self.windows)[-1],
+        )
+
+    def summary(self, now: float) -> pd.DataFrame:
+        """
+        Summary statistics of all windows side by side at time now (seconds):
+        a column per input column, a row per statistic and window, e.g. 'mean_5m'.
+        The length of the 'auto' window is given by auto_window.
+        """
+        summaries = []
+        windows = {name: self.window(name, now) for name in self.windows}
+        if self.adaptive_sample_size > 0:
+            summary = windows[self.auto_window(now)].summary()
+            summaries.append(summary.rename(index=lambda stat: f"{stat}_auto"))
+        for name, statistics in windows.items():
+            summaries.append(
+                statistics.summary().rename(index=lambda stat: f"{stat}_{name}")
+            )
+        return pd.concat(summaries)
+
+    def _window_buckets(self, name: str, now: float):
+        # (start, statistics) of the buckets in a window, the current bucket included
+        seconds = self.windows[name]
+        width = self.bucket_seconds[name]
+        for start, bucket in self._buckets[name] + [
+            (self._current_start, self._current)
+        ]:
+            if start is not None and start + width > now - seconds:
+                yield start, bucket
+
+    def _rotate(self, now: float):
+        # close the current bucket, if now is past it
+        if self._current_start is None:
+            self._current_start = now - now % self._current_seconds
+            return
+        if now < self._current_start + self._current_seconds:
+            return
+        for name, buckets in self._buckets.items():
+            width = self.bucket_seconds[name]
+            start = self._current_start - self._current_start % width
+            if not buckets or buckets[-1][0] != start:
+                buckets.append((start, self._new_statistics()))
+            buckets[-1][1].merge(self._current)
+            # drop buckets out of the window
+            while buckets and buckets[0][0] + width <= now - self.windows[name]:
+                buckets.pop(0)
+        self._current_start = now - now % self._current_seconds
+        self._current = self._new_statistics()
+
+
+def _is_numeric_type(t) -> bool:
+    try:
+        return np.dtype(t).kind in "biuf"
+    except TypeError:  # e.g. pandas extension types
+        return False
+
+
+def _divide(a: np.ndarray, b: np.ndarray, fill: float = 0.0) -> np.ndarray:
+    # elementwise a / b, fill where b is not positive
+    return np.divide(a, b, out=np.full(np.shape(a), fill), where=b > 0)
+
+
+def _quantile_name(q: float) -> str:
+    if q == 0.5:
+        return "median"
+    return f"percentile_{q * 100:g}".replace(".", "_")
@@ -1,5 +1,8 @@
 import numpy as np
+import multiprocessing
+import os
 import pandas as pd
+import tempfile
 import unittest
 
 from metrics import (
@@ -132,6 +135,154 @@ class TestDriftQueue(unittest.TestCase):
         self.assertEqual(fifof.df.iloc[0, 0], "b")
         self.assertEqual(fifof.df.iloc[-1, 0], "d")
 
+    def test_put_wrap_around(self):
+        fifof = DriftQueue({"x": int}, maxsize=4)
+        fifof.put(range(3))
+        fifof.put(range(3, 6))
+        self.assertEqual(fifof.df["x"].tolist(), [2, 3, 4, 5])
+        fifof.put(pd.DataFrame({"x": [6]}))
+        self.assertEqual(fifof.df["x"].tolist(), [3, 4, 5, 6])
+
+    def test_compact_dtypes(self):
+        fifof = DriftQueue({"x": float, "y": str, "z": int}, compact_dtypes=True)
+        fifof.put([[1.5, "a", 1]])
+        self.assertEqual(str(fifof.df.dtypes["x"]), "float32")
+        self.assertEqual(str(fifof.df.dtypes["y"]), "object")
+        self.assertEqual(str(fifof.df.dtypes["z"]), "int64")
+        # float64 by default
+        fifof = DriftQueue({"x": float})
+        fifof.put([1.5])
+        self.assertEqual(str(fifof.df.dtypes["x"]), "float64")
+
+    def test_flush_not_overwritten(self):
+        fifof = DriftQueue({"x": int}, maxsize=2)
+        fifof.put([1, 2])
+        ret = fifof.flush()
+        fifof.put([3, 4])
+        self.assertEqual(ret["x"].tolist(), [1, 2])
+
+    def test_backup_recovery(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            backup_file = os.path.join(tmpdir, "fifo.feather")
+            # rows logged, not compacted
+            fifof = DriftQueue({"x": int, "y": str}, backup_file=backup_file)
+            fifof.put([[1, "a"], [2, "b"]])
+            fifof.close()
+            self.assertTrue(os.path.getsize(backup_file + ".wal") > 0)
+            fifof = DriftQueue({"x": int, "y": str}, backup_file=backup_file)
+            self.assertEqual(fifof.df["x"].tolist(), [1, 2])
+            self.assertEqual(fifof.df["y"].tolist(), ["a", "b"])
+            # recovered log compacted to snapshot, more rows logged
+            fifof.put([[3, "c"]])
+            fifof.close()
+            fifof = DriftQueue({"x": int, "y": str}, backup_file=backup_file)
+            self.assertEqual(fifof.df["x"].tolist(), [1, 2, 3])
+            fifof.close()
+
+    def test_backup_cleared_at_flush(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            backup_file = os.path.join(tmpdir, "fifo.feather")
+            fifof = DriftQueue({"x": int}, maxsize=2, backup_file=backup_file)
+            fifof.put([1, 2])
+            fifof.flush()
+            fifof.close()
+            fifof = DriftQueue({"x": int}, maxsize=2, backup_file=backup_file)
+            self.assertEqual(fifof.df.shape[0], 0)
+            fifof.close()
+
+    def test_shared_queue(self):
+        fork = multiprocessing.get_context("fork")
+        fifof = DriftQueue({"x": int, "y": str}, maxsize=4, shared=True)
+        fifof.put([[1, "a"]])
+        self.assertFalse(fifof._memory.leads())  # put does not elect a leader
+        # this process flushes first and becomes the leader
+        self.assertTrue(fifof.flush().empty)
+        # rows put by a forked process
+        child = fork.Process(target=fifof.put, args=([[2, "b"], [3, "c"]],))
+        child.start()
+        child.join()
+        self.assertEqual(fifof.df["x"].tolist(), [1, 2, 3])
+        self.assertEqual(fifof.df["y"].tolist(), ["a", "b", "c"])
+        # other processes do not clear the queue
+        child = fork.Process(target=fifof.flush)
+        child.start()
+        child.join()
+        self.assertEqual(fifof.df.shape[0], 3)
+        fifof.put([[4, "d"]])
+        ret = fifof.flush()
+        self.assertEqual(ret["x"].tolist(), [1, 2, 3, 4])
+        self.assertEqual(fifof.df.shape[0], 0)
+
+    def test_shared_backup_leader_change(self):
+        fork = multiprocessing.get_context("fork")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            backup_file = os.path.join(tmpdir, "fifo.feather")
+            fifof = DriftQueue(
+                {"x": int},
+                backup_file=backup_file,
+                shared=True,
+                backup_interval_seconds=60,
+            )
+
+            def lead_and_crash():
+                fifof.flush()  # becomes the leader
+                fifof.put([1, 2])
+                fifof._backup._write()
+                os._exit(0)  # log stream left open
+
+            child = fork.Process(target=lead_and_crash)
+            child.start()
+            child.join()
+            # the leader has exited: this process takes over
+            self.assertTrue(fifof.flush().empty)
+            fifof.put([3])
+            fifof.close()
+            recovered = DriftQueue({"x": int}, backup_file=backup_file)
+            self.assertEqual(recovered.df["x"].tolist(), [1, 2, 3])
+            recovered.close()
+
+    def test_reservoir_uniform(self):
+        fifof = DriftQueue({"x": int}, sampling="reservoir")
+        for i in range(0, 10000, 100):
+            fifof.put(np.arange(i, i + 100))
+        x = fifof.df["x"]
+        self.assertEqual(x.shape[0], 1000)
+        self.assertTrue(x.is_unique)
+        # a uniform sample, not the latest rows
+        self.assertLess(abs(x.mean() - 5000), 500)
+        self.assertEqual(fifof._seen, 10000)
+
+    def test_reservoir_weights(self):
+        fifof = DriftQueue({"x": int}, maxsize=100, sampling="reservoir")
+        fifof.put(
+            np.r_[np.zeros(1000), np.ones(1000)],
+            weights=np.r_[np.ones(1000), np.ones(1000) * 1000],
+        )
+        self.assertGreater(fifof.df["x"].mean(), 0.9)
+
+    def test_reservoir_merge(self):
+        first = DriftQueue({"x": int}, maxsize=100, sampling="reservoir")
+        second = DriftQueue({"x": int}, maxsize=100, sampling="reservoir")
+        first.put(np.zeros(1000))
+        second.put(np.ones(3000))
+        first.merge(second)
+        self.assertEqual(first.df.shape[0], 100)
+        self.assertEqual(first._seen, 4000)
+        self.assertLess(abs(first.df["x"].mean() - 0.75), 0.2)
+
+    def test_reservoir_horizon(self):
+        fifof = DriftQueue(
+            {"x": int}, maxsize=10, sampling="reservoir", sampling_horizon_seconds=3600
+        )
+        fifof.put(np.arange(100))
+        self.assertTrue(fifof.flush().empty)
+        fifof.sampling_horizon_seconds = 0.01
+        time.sleep(0.01)
+        self.assertEqual(fifof.flush().shape[0], 10)
+        self.assertEqual(fifof.df.shape[0], 0)
+        with self.assertRaises(ValueError):
+            DriftQueue({"x": int}, backup_file="fifo.feather", sampling="reservoir")
+
     def test_flush(self):
         fifof = DriftQueue({"x": int}, maxsize=1)
         ret = fifof.flush()
@@ -614,7 +765,172 @@ from metrics import RequestMonitor
 
 class TestRequestMonitor(unittest.TestCase):
     def test_init(self):
+        clean_registry()
         RequestMonitor()
 
     def test_update_metrics_decorator(self):
         pass  # difficult to unit test
+
+    def test_monitor_size_rows(self):
+        clean_registry()
+        monitor = RequestMonitor()
+
+        @monitor.monitor(parameter_name="X")
+        def foo(X: pd.DataFrame):
+            return X
+
+        foo(X=pd.DataFrame({"x": [1, 2, 3]}))
+        self.assertEqual(monitor.df["size_rows"].iloc[-1], 3)
+
+
+from metrics import monitor_input, monitor_output
+
+
+class TestMonitorDecorators(unittest.TestCase):
+    def test_shared_request_frame(self):
+        clean_registry()
+        input_monitor = DriftMonitor(columns={"a": float, "b": float})
+        output_monitor = DriftMonitor(columns={"y": int})
+        X = pd.DataFrame({"a": [1.0, 2.0], "b": [3.0, 4.0]})
+
+        @monitor_output(output_monitor)
+        @monitor_input(input_monitor, parameter_name="X")
+        def foo(X: pd.DataFrame):
+            return pd.DataFrame({"prediction": [0, 1]})
+
+        foo(X=X)
+        self.assertEqual(input_monitor.df.shape, (2, 2))
+        self.assertEqual(list(output_monitor.df.columns), ["y"])
+        self.assertEqual(output_monitor.df["y"].tolist(), [0, 1])
+
+
+from metrics import StreamingDriftMonitor, WindowedDriftMonitor
+from metrics.streaming_statistics import SlidingWindowStatistics, StreamingStatistics
+
+
+class TestStreamingStatistics(unittest.TestCase):
+    def test_summary(self):
+        df = pd.DataFrame({"x": np.random.normal(size=10000), "y": "a"})
+        statistics = StreamingStatistics({"x": float, "y": str})
+        for i in range(0, 10000, 100):
+            statistics.update(df.iloc[i : i + 100])
+        summary = statistics.summary()
+        self.assertEqual(list(summary.columns), ["x"])
+        self.assertEqual(summary.loc["sample_size", "x"], 10000)
+        self.assertAlmostEqual(summary.loc["mean", "x"], df["x"].mean())
+        self.assertAlmostEqual(summary.loc["std", "x"], df["x"].std())
+        self.assertEqual(summary.loc["min", "x"], df["x"].min())
+        self.assertEqual(summary.loc["max", "x"], df["x"].max())
+        self.assertAlmostEqual(summary.loc["median", "x"], df["x"].median(), 1)
+
+    def test_merge(self):
+        df = pd.DataFrame({"x": np.arange(100.0)})
+        df.loc[3, "x"] = np.nan
+        first = StreamingStatistics({"x": float}).update(df.iloc[:30])
+        second = StreamingStatistics({"x": float}).update(df.iloc[30:])
+        summary = first.merge(second).summary()
+        self.assertEqual(summary.loc["sample_size", "x"], 99)
+        self.assertAlmostEqual(summary.loc["mean", "x"], df["x"].mean())
+        self.assertAlmostEqual(summary.loc["std", "x"], df["x"].std())
+
+    def test_update_metrics(self):
+        clean_registry()
+        monitor = StreamingDriftMonitor(columns={"x": float}, sample_size=2)
+        monitor.put([[1.0]])
+        monitor.update_metrics()
+        self.assertTrue(monitor.get_sumstat().empty)
+        monitor.put([[3.0]])
+        monitor.update_metrics()
+        self.assertEqual(monitor.get_sumstat().loc["mean", "x"], 2.0)
+        self.assertEqual(monitor.statistics.rows, 0)
+
+    def test_sliding_windows(self):
+        statistics = SlidingWindowStatistics(
+            {"x": float}, {"1m": 60, "10m": 600}, buckets_per_window=6
+        )
+        statistics.update(pd.DataFrame({"x": [1.0, 1.0]}), now=0)
+        statistics.update(pd.DataFrame({"x": [3.0]}), now=300)
+        summary = statistics.summary(now=301)
+        self.assertEqual(summary.loc["sample_size_1m", "x"], 1)
+        self.assertEqual(summary.loc["mean_1m", "x"], 3.0)
+        self.assertEqual(summary.loc["sample_size_10m", "x"], 3)
+        # rows older than the window are dropped
+        summary = statistics.summary(now=700)
+        self.assertEqual(summary.loc["sample_size_1m", "x"], 0)
+        self.assertEqual(summary.loc["sample_size_10m", "x"], 1)
+
+    def test_adaptive_window(self):
+        statistics = SlidingWindowStatistics(
+            {"x": float}, {"1m": 60, "10m": 600}, adaptive_sample_size=2
+        )
+        statistics.update(pd.DataFrame({"x": [1.0]}), now=0)
+        statistics.update(pd.DataFrame({"x": [2.0]}), now=300)
+        self.assertEqual(statistics.auto_window(now=301), "10m")
+        self.assertEqual(statistics.summary(now=301).loc["mean_auto", "x"], 1.5)
+        statistics.update(pd.DataFrame({"x": [3.0]}), now=302)
+        self.assertEqual(statistics.auto_window(now=303), "1m")
+        self.assertEqual(statistics.summary(now=303).loc["mean_auto", "x"], 2.5)
+
+    def test_windowed_update_metrics(self):
+        # the length of the auto window is exported once, not per column
+        clean_registry()
+        monitor = WindowedDriftMonitor(
+            columns={"x": float, "y": float},
+            windows={"1m": 60, "10m": 600},
+            adaptive_sample_size=2,
+            metrics_name_prefix="test_windowed_",
+        )
+        monitor.put([[1.0, 2.0], [3.0, 4.0]])
+        monitor.update_metrics()
+        self.assertNotIn("window_seconds_auto", monitor.get_sumstat().index)
+        self.assertEqual(
+            REGISTRY.get_sample_value("test_windowed_window_seconds_auto"), 60
+        )
+        self.assertEqual(REGISTRY.get_sample_value("test_windowed_x_mean_auto"), 2.0)
+
+    def test_decay(self):
+        statistics = SlidingWindowStatistics(
+            {"x": float}, {"10m": 600}, buckets_per_window=10, decay_half_life=0.5
+        )
+        statistics.update(pd.DataFrame({"x": [0.0]}), now=0)
+        statistics.update(pd.DataFrame({"x": [1.0]}), now=300)
+        summary = statistics.summary(now=330)
+        # the older row counts half as much
+        self.assertAlmostEqual(summary.loc["mean_10m", "x"], 2 / 3)
+
+
+import subprocess
+import sys
+import textwrap
+
+
+class TestGenerateMetrics(unittest.TestCase):
+    def test_multiprocess_gauges(self):
+        # prometheus_client selects multiprocess mode at import: scrape in a new process
+        script = textwrap.dedent(
+            """
+            import asyncio
+            from inference.admission import AdmissionController
+            from metrics.prometheus_metrics import generate_metrics
+
+            async def admit():
+                controller = AdmissionController()
+                await controller.acquire()
+                await controller.acquire_rows(5)
+
+            asyncio.run(admit())
+            print(generate_metrics().decode())
+            """
+        )
+        with tempfile.TemporaryDirectory() as tmpdir:
+            result = subprocess.run(
+                [sys.executable, "-c", script],
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                env={**os.environ, "PROMETHEUS_MULTIPROC_DIR": tmpdir},
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+        self.assertIn("predict_admission_in_flight_requests 1.0", result.stdout)
+        self.assertIn("predict_admission_in_flight_rows 5.0", result.stdout)
+        self.assertIn("predict_admission_queue_depth 0.0", result.stdout)
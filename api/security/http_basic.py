@@ -1,53 +1,179 @@
+import logging
+import math
+import os
 import secrets
-from http.client import HTTPException
+import threading
+import time
+from typing import Dict
 
-from fastapi import Depends
+from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from prometheus_client import Counter
 from starlette import status
-import os
 
 security = HTTPBasic()
 
 
-def http_auth_metrics(credentials: HTTPBasicCredentials = Depends(security)):
-    correct_username_bytes = os.getenv("METRICS_USERNAME", "").encode("utf8")
-    correct_password_bytes = os.getenv("METRICS_PASSWORD", "").encode("utf8")
-
-    current_username_bytes = credentials.username.encode("utf8")
-    is_correct_username = secrets.compare_digest(
-        current_username_bytes, correct_username_bytes
-    )
-    current_password_bytes = credentials.password.encode("utf8")
-    is_correct_password = secrets.compare_digest(
-        current_password_bytes, correct_password_bytes
-    )
-
-    if not (is_correct_username and is_correct_password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password",
-            headers={"WWW-Authenticate": "Basic"},
+class TokenBucket:
+    """
+    Token bucket rate limiter: holds up to burst tokens, refilled at rate tokens per second.
+    A request takes a token, or is throttled if the bucket is empty.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        """
+        Take a token. Return 0 if a token was taken,
+        else the number of seconds until the next token is available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class HTTPBasicAuthenticator:
+    """
+    FastAPI dependency for HTTP basic authentication of a set of clients,
+    with an in-memory token bucket rate limit per client.
+
+    Credentials are encoded once at startup, and passwords are compared in constant time.
+    Unknown usernames are compared against a dummy password, so that response times
+    do not reveal which usernames exist. Returns the username of the client.
+
+    Rate limits are enforced per worker process: with several workers,
+    the limit of a client is multiplied by the number of workers.
+
+    Parameters:
+        clients: dict of username - password pairs
+        rate_limit_per_second: float, sustained requests per second per client. 0 disables rate limiting
+        rate_limit_burst: int, requests a client may make at once after being idle
+        metrics_name_prefix: prefix for the prometheus metrics created, e.g. 'predict_auth_'
+    """
+
+    def __init__(
+        self,
+        clients: Dict[str, str],
+        rate_limit_per_second: float = 0,
+        rate_limit_burst: int = 10,
+        metrics_name_prefix: str = "",
+    ):
+        self._passwords = {
+            username.encode("utf8"): password.encode("utf8")
+            for username, password in clients.items()
+        }
+        self._dummy_password = secrets.token_bytes(16)
+        self.rate_limit_per_second = rate_limit_per_second
+        self._buckets = {}
+        if rate_limit_per_second > 0:
+            self._buckets = {
+                username: TokenBucket(rate_limit_per_second, rate_limit_burst)
+                for username in clients
+            }
+
+        self.request_counter = Counter(
+            metrics_name_prefix + "requests",
+            "How many requests have been authenticated, by client?",
+            ["client"],
+        )
+        self.throttle_counter = Counter(
+            metrics_name_prefix + "throttled",
+            "How many requests have been rejected by the rate limit, by client?",
+            ["client"],
+        )
+        self.unauthorized_counter = Counter(
+            metrics_name_prefix + "unauthorized",
+            "How many requests have been rejected with incorrect credentials?",
+        )
+
+    @classmethod
+    def from_env(cls, prefix: str, metrics_name_prefix: str = ""):
+        """
+        Read clients and rate limits from environment variables:
+        - {prefix}_USERNAME & {prefix}_PASSWORD: a single client
+        - {prefix}_CLIENTS: more clients, comma separated 'username:password' pairs
+        - {prefix}_RATE_LIMIT_PER_SECOND & {prefix}_RATE_LIMIT_BURST: rate limit of each client
+        """
+        clients = {}
+        username = os.getenv(f"{prefix}_USERNAME", "")
+        if username:
+            clients[username] = os.getenv(f"{prefix}_PASSWORD", "")
+        for client in os.getenv(f"{prefix}_CLIENTS", "").split(","):
+            if client.strip():
+                username, _, password = client.strip().partition(":")
+                clients[username] = password
+        if not clients:
+            logging.warning(f"No clients configured for {prefix} authentication")
+        return cls(
+            clients,
+            rate_limit_per_second=float(
+                os.getenv(f"{prefix}_RATE_LIMIT_PER_SECOND", 0)
+            ),
+            rate_limit_burst=int(os.getenv(f"{prefix}_RATE_LIMIT_BURST", 10)),
+            metrics_name_prefix=metrics_name_prefix,
         )
-    return credentials.username
-
-
-def http_auth_predict(credentials: HTTPBasicCredentials = Depends(security)):
-    correct_username_bytes = os.getenv("PREDICT_USERNAME", "").encode("utf8")
-    correct_password_bytes = os.getenv("PREDICT_PASSWORD", "").encode("utf8")
-
-    current_username_bytes = credentials.username.encode("utf8")
-    is_correct_username = secrets.compare_digest(
-        current_username_bytes, correct_username_bytes
-    )
-    current_password_bytes = credentials.password.encode("utf8")
-    is_correct_password = secrets.compare_digest(
-        current_password_bytes, correct_password_bytes
-    )
-
-    if not (is_correct_username and is_correct_password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password",
-            headers={"WWW-Authenticate": "Basic"},
+
+    def authenticate(self, credentials: HTTPBasicCredentials) -> str:
+        """
+        Check credentials, return the username or raise 401
+        """
+        current_username_bytes = credentials.username.encode("utf8")
+        correct_password_bytes = self._passwords.get(current_username_bytes)
+        is_correct_password = secrets.compare_digest(
+            credentials.password.encode("utf8"),
+            (
+                self._dummy_password
+                if correct_password_bytes is None
+                else correct_password_bytes
+            ),
         )
-    return credentials.username
+        if correct_password_bytes is None or not is_correct_password:
+            self.unauthorized_counter.inc()
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Incorrect username or password",
+                headers={"WWW-Authenticate": "Basic"},
+            )
+        return credentials.username
+
+    def rate_limit(self, username: str):
+        """
+        Take a token from the bucket of the client, or raise 429
+        """
+        bucket = self._buckets.get(username)
+        if bucket is None:
+            return
+        wait_seconds = bucket.take()
+        if wait_seconds > 0:
+            self.throttle_counter.labels(client=username).inc()
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(math.ceil(wait_seconds))},
+            )
+
+    def __call__(self, credentials: HTTPBasicCredentials = Depends(security)) -> str:
+        username = self.authenticate(credentials)
+        self.rate_limit(username)
+        self.request_counter.labels(client=username).inc()
+        return username
+
+
+http_auth_metrics = HTTPBasicAuthenticator.from_env(
+    "METRICS", metrics_name_prefix="metrics_auth_"
+)
+http_auth_predict = HTTPBasicAuthenticator.from_env(
+    "PREDICT", metrics_name_prefix="predict_auth_"
+)
@@ -0,0 +1,110 @@
+import os
+import unittest
+from unittest import mock
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from security.http_basic import HTTPBasicAuthenticator, TokenBucket
+
+_authenticators = 0
+
+
+def _authenticator(clients: dict, **kwargs) -> HTTPBasicAuthenticator:
+    # metrics are registered once per name
+    global _authenticators
+    _authenticators += 1
+    return HTTPBasicAuthenticator(
+        clients, metrics_name_prefix=f"test_auth_{_authenticators}_", **kwargs
+    )
+
+
+def _client(authenticator: HTTPBasicAuthenticator) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/")
+    def root(username: str = Depends(authenticator)):
+        return {"username": username}
+
+    return TestClient(app)
+
+
+class TestTokenBucket(unittest.TestCase):
+    @mock.patch("security.http_basic.time.monotonic")
+    def test_take(self, monotonic):
+        monotonic.return_value = 100.0
+        bucket = TokenBucket(rate=2, burst=3)
+        self.assertEqual([bucket.take() for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(bucket.take(), 0.5)
+        # refilled at rate tokens per second, up to burst
+        monotonic.return_value = 100.5
+        self.assertEqual(bucket.take(), 0)
+        self.assertGreater(bucket.take(), 0)
+        monotonic.return_value = 200.0
+        self.assertEqual([bucket.take() for _ in range(3)], [0, 0, 0])
+        self.assertGreater(bucket.take(), 0)
+
+
+class TestHTTPBasicAuthenticator(unittest.TestCase):
+    def test_authenticate(self):
+        authenticator = _authenticator({"a": "secret", "b": "other"})
+        client = _client(authenticator)
+        response = client.get("/", auth=("b", "other"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"username": "b"})
+        for auth in (("a", "other"), ("c", "secret"), ("a", "")):
+            response = client.get("/", auth=auth)
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response.headers["WWW-Authenticate"], "Basic")
+        self.assertEqual(client.get("/").status_code, 401)
+        self.assertEqual(authenticator.unauthorized_counter._value.get(), 3)
+        self.assertEqual(
+            authenticator.request_counter.labels(client="b")._value.get(), 1
+        )
+
+    def test_rate_limit(self):
+        # 429 with Retry-After once a client has used its burst, other clients pass
+        authenticator = _authenticator(
+            {"a": "secret", "b": "other"},
+            rate_limit_per_second=0.1,
+            rate_limit_burst=2,
+        )
+        client = _client(authenticator)
+        statuses = [client.get("/", auth=("a", "secret")).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        response = client.get("/", auth=("a", "secret"))
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response.headers["Retry-After"]) <= 10)
+        self.assertEqual(client.get("/", auth=("b", "other")).status_code, 200)
+        self.assertEqual(
+            authenticator.throttle_counter.labels(client="a")._value.get(), 2
+        )
+
+    def test_no_rate_limit(self):
+        client = _client(_authenticator({"a": "secret"}))
+        statuses = {
+            client.get("/", auth=("a", "secret")).status_code for _ in range(20)
+        }
+        self.assertEqual(statuses, {200})
+
+    def test_from_env(self):
+        env = {
+            "TEST_USERNAME": "a",
+            "TEST_PASSWORD": "secret",
+            "TEST_CLIENTS": "b:other, c:pass:word",
+            "TEST_RATE_LIMIT_PER_SECOND": "5",
+            "TEST_RATE_LIMIT_BURST": "7",
+        }
+        with mock.patch.dict(os.environ, env):
+            authenticator = HTTPBasicAuthenticator.from_env(
+                "TEST", metrics_name_prefix="test_auth_env_"
+            )
+        self.assertEqual(set(authenticator._buckets), {"a", "b", "c"})
+        self.assertEqual(authenticator._buckets["a"].burst, 7)
+        client = _client(authenticator)
+        for auth in (("a", "secret"), ("b", "other"), ("c", "pass:word")):
+            self.assertEqual(client.get("/", auth=auth).status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
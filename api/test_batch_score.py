@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from batch_score import batch_score
+from inference.batch_io import TableFileWriter
+
+COLUMNS = {"x": float, "n": int}
+DF = pd.DataFrame({"x": [float(i) for i in range(10)], "n": list(range(10))})
+
+
+class Model:
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        # (n, 1) output, as some models return
+        return np.where(X["n"] % 2 == 0, "even", "odd").reshape(-1, 1)
+
+
+def _expected(X: pd.DataFrame) -> list:
+    return Model().predict(X)[:, 0].tolist()
+
+
+class TestBatchScore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        # the ModelStore attributes used for batch scoring
+        self.model_store = SimpleNamespace(
+            model=Model(),
+            request_columns=COLUMNS,
+            response_value_field="label",
+            response_value_type=str,
+        )
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.dir.name, name)
+
+    def test_batch_score(self):
+        # every format is scored in chunks by 2 workers, predictions in input order
+        for suffix in (".csv", ".parquet", ".feather"):
+            input_path = self.path("input" + suffix)
+            output_path = self.path("predictions" + suffix)
+            with TableFileWriter(input_path) as writer:
+                writer.write(DF)
+            result = batch_score(
+                self.model_store, input_path, output_path, workers=2, chunk_size=3
+            )
+            self.assertEqual(result["rows"], 10)
+
+            output = {
+                ".csv": pd.read_csv,
+                ".parquet": pd.read_parquet,
+                ".feather": pd.read_feather,
+            }[suffix](output_path)
+            self.assertEqual(output["label"].tolist(), _expected(DF), suffix)
+
+            # one summary of the whole input and output, not one per chunk
+            input_summary = pd.read_csv(
+                self.path("predictions_input_summary.csv"), index_col=0
+            )
+            self.assertEqual(input_summary.loc["sample_size"].tolist(), [10, 10])
+            self.assertEqual(input_summary.loc["max"].tolist(), [9.0, 9.0])
+            self.assertAlmostEqual(input_summary.loc["mean", "x"], 4.5)
+            output_summary = pd.read_csv(
+                self.path("predictions_output_summary.csv"), index_col=0
+            )
+            self.assertAlmostEqual(
+                output_summary.loc["label_proportion_of_even_rate", "_"], 0.5
+            )
+            self.assertEqual(output_summary.loc["sample_size", "_"], 10)
+
+    def test_invalid_input(self):
+        input_path = self.path("input.csv")
+        with TableFileWriter(input_path) as writer:
+            writer.write(DF[["x"]])
+        with self.assertRaises(ValueError):
+            batch_score(
+                self.model_store, input_path, self.path("predictions.csv"), workers=2
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,9 +2,19 @@
 MODE=${MODE:-vsc}
 if [[ $MODE = api ]]
 then
-    # start api
+    # start api. new models are hot reloaded without restarting the process
     cd api
-    uvicorn main:app --reload --reload-include *.pickle --host 0.0.0.0
+    MODEL_RELOAD_INTERVAL_SECONDS=${MODEL_RELOAD_INTERVAL_SECONDS:-10} uvicorn main:app --reload --host 0.0.0.0
+
+elif [[ $MODE = serve ]]
+then
+    # start api with several worker processes sharing the loaded model.
+    # workers write prometheus metrics to files that are aggregated at /metrics
+    cd api
+    export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+    # exec: gunicorn receives the stop signal and drains the workers
+    exec gunicorn main:app -c gunicorn.conf.py
 
 elif [[ $MODE = vsc ]]
 then
@@ -17,5 +27,5 @@ then
     jupyter-lab --allow-root --ip 0.0.0.0 --port 8888
     
 else
-    echo "unknown mode: "$MODE", use 'api', 'vsc' or leave empty (defaults to 'vsc')"
+    echo "unknown mode: "$MODE", use 'api', 'serve', 'vsc' or leave empty (defaults to 'vsc')"
 fi
\ No newline at end of file
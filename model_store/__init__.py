@@ -1,3 +1,6 @@
 from .model_store import ModelStore
+from .request_decoder import RequestDecoder, DecodeError
+from .prediction_table import PredictionTable
 from .pickle_model_store import PickleModelStore, ModelSchemaContainer
 from .mlflow_model_store import MlFlowModelStore
+from .loader import load_model_store
@@ -0,0 +1,40 @@
+import logging
+
+from .model_store import ModelStore
+from .mlflow_model_store import MlFlowModelStore
+from .pickle_model_store import PickleModelStore
+
+
+def load_model_store(
+    model_store_impl: str,
+    bundle_uri: str = "local_data/bundle_latest.pickle",
+    model_name: str = "model",
+    model_version: str = "latest",
+    tracking_uri: str = "file:../local_data/mlruns",
+    registry_uri: str = "sqlite:///../local_data/mlflow.sqlite",
+) -> ModelStore:
+    """
+    Load model and schema definitions from the configured model store.
+
+    Parameters:
+        model_store_impl: 'pickle' or 'mlflow'
+        bundle_uri: path to the pickle bundle, if using pickle store
+        model_name, model_version, tracking_uri, registry_uri: if using mlflow store
+    """
+    model_store_impl = str(model_store_impl).lower()
+    logging.info(f"Configured model store: {model_store_impl}")
+    if "mlflow" == model_store_impl:
+        logging.info(
+            f"Loading model from mlflow store: model_name={model_name}, model_version={model_version}, tracking_uri={tracking_uri}, registry_uri={registry_uri}"
+        )
+        return MlFlowModelStore(
+            model_name=model_name,
+            model_version=model_version,
+            tracking_uri=tracking_uri,
+            registry_uri=registry_uri,
+        )
+    elif "pickle" == model_store_impl:
+        logging.info(f"Loading model from pickle store: {bundle_uri}")
+        return PickleModelStore(bundle_uri=bundle_uri).load_bundle()
+    else:
+        raise ValueError(f"Invalid value for MODEL_STORE: {model_store_impl}")
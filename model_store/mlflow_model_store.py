@@ -8,6 +8,8 @@ from pydantic import create_model
 from pydantic.fields import FieldInfo
 
 from .model_store import ModelStore
+from .prediction_table import PredictionTable
+from .request_decoder import RequestDecoder
 
 
 class MlFlowModelStore(ModelStore):
@@ -34,6 +36,7 @@ class MlFlowModelStore(ModelStore):
 
         # Model
         self.model = model
+        self.model_identity = f"{model_name}:{model_version}:{metadata['run_id']}"
 
         # metrics
         run = mlflow.get_run(run_id=metadata["run_id"])
@@ -55,6 +58,7 @@ class MlFlowModelStore(ModelStore):
         self.request_schema_class = self.__create_pydantic_model(
             "DynamicApiRequest", request_types
         )
+        self.request_decoder = RequestDecoder(request_types)
         # Schema for response (y)
         self.response_schema_class = self.__create_pydantic_model(
             "DynamicApiResponse", response_types
@@ -71,6 +75,14 @@ class MlFlowModelStore(ModelStore):
         )
         self.request_columns = self.__schema_to_pandas_columns(request_types)
         self.response_columns = self.__schema_to_pandas_columns(response_types)
+
+        # materialize predictions if the model metadata declares the values
+        # of every input, e.g. mlflow.sklearn.log_model(..., metadata={"input_domains": {...}})
+        input_domains = (metadata.get("metadata") or {}).get("input_domains")
+        if input_domains:
+            self.prediction_table = PredictionTable(
+                input_domains, self.request_columns, model.predict
+            )
         logging.info(f"Retrieved model with run id {metadata['run_id']}")
 
     @staticmethod
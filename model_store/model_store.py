@@ -9,11 +9,17 @@ class ModelStore:
     model = None
     train_metrics = None
     request_schema_class = None
+    # decodes request rows straight to typed columns, see RequestDecoder
+    request_decoder = None
     response_schema_class = None
     request_columns: dict = None
     response_columns: dict = None
     response_value_type = None
     response_value_field = None
+    # identifies the loaded model version, e.g. for invalidating caches
+    model_identity: str = None
+    # materialized predictions of models with small input domains, see PredictionTable
+    prediction_table = None
 
     @abstractmethod
     def persist(self, classifier, dtypes_x, dtypes_y, metrics_parsed):
@@ -1,4 +1,5 @@
 import logging
+import os
 import pickle
 from typing import List
 
@@ -8,25 +9,39 @@ from pydantic.fields import FieldInfo
 from sklearn.base import BaseEstimator
 
 from .model_store import ModelStore
+from .prediction_table import PredictionTable
+from .request_decoder import RequestDecoder
 
 
 class ModelSchemaContainer:
     """
     req & res schema: [{'name': value, 'type': dtype}]
+    input_domains: optional {'name': [values]} of every request column, see PredictionTable
     """
 
     model: BaseEstimator
     req_schema: List[dict]
     res_schema: List[dict]
     metrics: dict
+    input_domains: dict = None
+    prediction_table: PredictionTable = None
 
 
 class PickleModelStore(ModelStore):
     def __init__(self, bundle_uri="local_data/bundle_latest.pickle"):
         self.bundle_uri = bundle_uri
 
-    def persist(self, classifier, dtypes_x, dtypes_y, metrics_parsed):
-        return self.__pickle_bundle(classifier, dtypes_x, dtypes_y, metrics_parsed)
+    def persist(
+        self, classifier, dtypes_x, dtypes_y, metrics_parsed, input_domains=None
+    ):
+        """
+        Pickle model, schemas and metrics to the bundle.
+        If input_domains lists the values of every request column,
+        predictions for all combinations are materialized in the bundle.
+        """
+        return self.__pickle_bundle(
+            classifier, dtypes_x, dtypes_y, metrics_parsed, input_domains
+        )
 
     def get_model(self) -> BaseEstimator:
         if not self.model:
@@ -39,12 +54,16 @@ class PickleModelStore(ModelStore):
             f"Open {self.bundle_uri}",
         )
         bundle = self.__load_pickled_bundle(self.bundle_uri)
+        self.model_identity = (
+            f"{os.path.realpath(self.bundle_uri)}:{os.path.getmtime(self.bundle_uri)}"
+        )
         self.model = bundle.model
         self.train_metrics = bundle.metrics
         # Schema for request (X)
         self.request_schema_class = self.__create_pydantic_model(
             "DynamicApiRequest", bundle.req_schema
         )
+        self.request_decoder = RequestDecoder(bundle.req_schema)
         # Schema for response (y)
         self.response_schema_class = self.__create_pydantic_model(
             "DynamicApiResponse", bundle.res_schema
@@ -60,6 +79,8 @@ class PickleModelStore(ModelStore):
         )
         self.request_columns = self.__schema_to_pandas_columns(bundle.req_schema)
         self.response_columns = self.__schema_to_pandas_columns(bundle.res_schema)
+        # bundles pickled before prediction tables have no such attribute
+        self.prediction_table = getattr(bundle, "prediction_table", None)
         return self
 
     @staticmethod
@@ -78,7 +99,13 @@ class PickleModelStore(ModelStore):
         schema_x=None,
         schema_y=None,
         metrics: str = None,
+        input_domains: dict = None,
     ):
+        prediction_table = None
+        if input_domains:
+            prediction_table = PredictionTable(
+                input_domains, self.__schema_to_pandas_columns(schema_x), model.predict
+            )
         try:
             with open(self.bundle_uri, "wb") as f:
                 container: ModelSchemaContainer = ModelSchemaContainer()
@@ -86,6 +113,8 @@ class PickleModelStore(ModelStore):
                 container.req_schema = schema_x
                 container.res_schema = schema_y
                 container.metrics = metrics
+                container.input_domains = input_domains
+                container.prediction_table = prediction_table
                 pickle.dump(container, f, protocol=pickle.HIGHEST_PROTOCOL)
             logging.info(f"Persisted model to file  {self.bundle_uri}")
         except FileNotFoundError as nfe:
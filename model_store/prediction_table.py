@@ -0,0 +1,112 @@
+import logging
+from typing import Callable, Dict
+
+import numpy as np
+import pandas as pd
+
+
+class PredictionTable:
+    """
+    Materialized predictions for the complete input space of a model
+    whose inputs all have small declared domains, e.g. categorical or bucketed features.
+
+    Predictions are computed once for the Cartesian product of the input domains.
+    A request row is answered by indexing an array: the position of each value
+    in its domain gives the row index of the product, as in np.ravel_multi_index.
+    Distinct predictions are stored once, and the table holds the smallest
+    unsigned integer code of a prediction per combination.
+
+    Rows with values outside the declared domains are not in the table and are
+    predicted with the model.
+
+    Parameters:
+        domains: dict of column name - list of values pairs, covering all request columns
+        columns: dict of request column name - type pairs, in model input order
+        predict_function: function that takes a typed pd.DataFrame and returns
+            a prediction per row
+        max_size: int, maximum number of combinations to materialize
+    """
+
+    def __init__(
+        self,
+        domains: Dict[str, list],
+        columns: dict,
+        predict_function: Callable,
+        max_size: int = 1000000,
+    ):
+        missing = [c for c in columns if c not in domains]
+        if missing:
+            raise ValueError(f"No input domain declared for columns: {missing}")
+        size = int(np.prod([len(domains[c]) for c in columns]))
+        if size > max_size:
+            raise ValueError(
+                f"Input space of {size} combinations exceeds max_size={max_size}"
+            )
+        self.columns = list(columns)
+        # typed domain values, indexed for looking up value positions
+        self.domains = {
+            c: pd.Index(pd.Series(domains[c]).astype(_pandas_type(t)).unique())
+            for c, t in columns.items()
+        }
+        self.shape = tuple(len(self.domains[c]) for c in self.columns)
+
+        # predict all combinations of domain values at once
+        X = (
+            pd.MultiIndex.from_product(
+                [self.domains[c] for c in self.columns], names=self.columns
+            )
+            .to_frame(index=False)
+            .astype({c: _pandas_type(t) for c, t in columns.items()})
+        )
+        predictions = first_output(predict_function(X))
+        self.labels, codes = np.unique(predictions, return_inverse=True)
+        self.codes = codes.astype(np.min_scalar_type(max(len(self.labels) - 1, 0)))
+        logging.info(
+            f"Materialized prediction table: {len(self.codes)} combinations, "
+            f"{len(self.labels)} distinct predictions, {self.codes.nbytes} bytes"
+        )
+
+    def lookup(self, X: pd.DataFrame):
+        """
+        Look up predictions of the rows of a typed dataframe.
+        Return the predictions and a boolean array marking the rows found in the table.
+        """
+        positions = [self.domains[c].get_indexer(X[c].to_numpy()) for c in self.columns]
+        found = np.logical_and.reduce([p >= 0 for p in positions])
+        flat_index = np.ravel_multi_index(
+            [np.where(found, p, 0) for p in positions], self.shape
+        )
+        return self.labels[self.codes[flat_index]], found
+
+    def predict(self, X: pd.DataFrame, fallback_function: Callable) -> np.ndarray:
+        """
+        Predict the rows of a typed dataframe by table lookup.
+        Rows not found in the table are predicted with fallback_function,
+        e.g. the model. Return a one dimensional array with a prediction per row.
+        """
+        predictions, found = self.lookup(X)
+        if found.all():
+            return predictions
+        missing = ~found
+        fallback = first_output(fallback_function(X[missing]))
+        predictions = predictions.astype(np.result_type(predictions, fallback))
+        predictions[missing] = fallback
+        return predictions
+
+
+def _pandas_type(t):
+    # object and string columns are decoded as python objects
+    if t == np.object_ or t == object or t == str:
+        return object
+    return t
+
+
+def first_output(y) -> np.ndarray:
+    """
+    Predictions as a one dimensional array. Models may return lists, series
+    or (n, 1) matrices: the first output is used.
+    """
+    y = np.asarray(y)
+    if y.ndim > 1:
+        y = y[:, 0]
+    return y
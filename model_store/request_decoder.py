@@ -0,0 +1,164 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+
+# pydantic names of coerced types by numpy dtype kind
+_TYPE_NAMES = {"b": "bool", "i": "integer", "u": "integer", "f": "float", "O": "str"}
+# pydantic error messages by type name, if not 'value is not a valid <type name>'
+_TYPE_MESSAGES = {
+    "bool": "value could not be parsed to a boolean",
+    "str": "str type expected",
+}
+# values accepted as strings, as in pydantic: lists and dicts are rejected
+_STR_TYPES = (str, int, float)
+# values accepted as booleans, as in pydantic
+_BOOL_VALUES = {
+    **{v: True for v in (True, 1, "1", "on", "t", "true", "y", "yes")},
+    **{v: False for v in (False, 0, "0", "off", "f", "false", "n", "no")},
+}
+
+
+def _to_str(value) -> str:
+    if not isinstance(value, _STR_TYPES):
+        raise TypeError(f"str type expected: {value!r}")
+    return str(value)
+
+
+def _to_bool(value) -> bool:
+    if isinstance(value, str):
+        value = value.lower()
+    try:
+        return _BOOL_VALUES[value]
+    except (KeyError, TypeError):
+        raise ValueError(f"value could not be parsed to a boolean: {value}")
+
+
+class DecodeError(ValueError):
+    """
+    Request does not match the schema.
+    errors: list of errors in pydantic / FastAPI format: {'loc': ..., 'msg': ..., 'type': ...}
+    """
+
+    def __init__(self, errors: List[dict]):
+        super().__init__(errors)
+        self.errors = errors
+
+
+class RequestDecoder:
+    """
+    Compiled request decoder derived from a model request schema.
+
+    Decodes a record-oriented request body (a list of row objects) straight into typed
+    column arrays, without creating and validating a pydantic object per row.
+    Type coercion and null checks run once per column, and errors match the
+    errors of the pydantic request schema.
+
+    schema: [{'name': value, 'type': dtype}], as ModelSchemaContainer.req_schema
+    """
+
+    def __init__(self, schema: List[dict]):
+        fields = []
+        for coltype in schema:
+            t = coltype["type"]
+            # object types are validated as strings, as in the pydantic schema
+            if t == np.object_ or t == object or t == str:
+                fields.append((coltype["name"], np.dtype(object)))
+            else:
+                fields.append((coltype["name"], np.dtype(t)))
+        # structured dtype describing a single request row
+        self.dtype = np.dtype(fields)
+        self.names = list(self.dtype.names)
+
+    def decode(self, records) -> pd.DataFrame:
+        """
+        Decode a list of row dicts to a typed dataframe. Raise DecodeError if invalid.
+        """
+        if not isinstance(records, list):
+            raise DecodeError(
+                [
+                    {
+                        "loc": ["body"],
+                        "msg": "value is not a valid list",
+                        "type": "type_error.list",
+                    }
+                ]
+            )
+        if not all(isinstance(r, dict) for r in records):
+            raise DecodeError(
+                [
+                    {
+                        "loc": ["body", i],
+                        "msg": "value is not a valid dict",
+                        "type": "type_error.dict",
+                    }
+                    for i, r in enumerate(records)
+                    if not isinstance(r, dict)
+                ]
+            )
+        errors = []
+        columns = {}
+        for name in self.names:
+            dtype = self.dtype[name]
+            values = np.fromiter(
+                (r.get(name) for r in records), dtype=object, count=len(records)
+            )
+            nulls = pd.isna(values)
+            if nulls.any():
+                errors.extend(self._null_errors(records, name, np.flatnonzero(nulls)))
+                continue
+            try:
+                if dtype == object:
+                    columns[name] = np.array([_to_str(v) for v in values], dtype=object)
+                elif dtype.kind == "b":
+                    columns[name] = np.array([_to_bool(v) for v in values], dtype=bool)
+                else:
+                    columns[name] = values.astype(dtype)
+            except (ValueError, TypeError, OverflowError):
+                errors.extend(self._type_errors(values, name, dtype))
+        if errors:
+            raise DecodeError(errors)
+        return pd.DataFrame(columns, columns=self.names)
+
+    @staticmethod
+    def _null_errors(records, name, indices) -> List[dict]:
+        # error path only: tell apart missing fields and nulls
+        return [
+            {
+                "loc": ["body", int(i), name],
+                "msg": "field required",
+                "type": "value_error.missing",
+            }
+            if name not in records[i]
+            else {
+                "loc": ["body", int(i), name],
+                "msg": "none is not an allowed value",
+                "type": "type_error.none.not_allowed",
+            }
+            for i in indices
+        ]
+
+    @staticmethod
+    def _type_errors(values, name, dtype) -> List[dict]:
+        # error path only: find the values that can not be coerced
+        errors = []
+        type_name = _TYPE_NAMES.get(dtype.kind, dtype.name)
+        msg = _TYPE_MESSAGES.get(type_name, f"value is not a valid {type_name}")
+        for i, value in enumerate(values):
+            try:
+                if dtype == object:
+                    _to_str(value)
+                elif dtype.kind == "b":
+                    _to_bool(value)
+                else:
+                    np.array([value], dtype=object).astype(dtype)
+            except (ValueError, TypeError, OverflowError):
+                errors.append(
+                    {
+                        "loc": ["body", i, name],
+                        "msg": msg,
+                        "type": f"type_error.{type_name}",
+                    }
+                )
+        return errors
@@ -0,0 +1,90 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from model_store.prediction_table import PredictionTable
+
+COLUMNS = {"color": np.object_, "size": np.int64, "flag": bool}
+DOMAINS = {
+    "color": ["red", "green", "blue"],
+    "size": [1, 2, 3, 4],
+    "flag": [True, False],
+}
+
+
+def _model(X: pd.DataFrame) -> np.ndarray:
+    # a class label from all inputs
+    labels = X["color"] + "-" + X["size"].astype(str)
+    return labels.where(X["flag"], "off").to_numpy()
+
+
+class TestPredictionTable(unittest.TestCase):
+    def setUp(self):
+        self.table = PredictionTable(DOMAINS, COLUMNS, _model)
+        self.fallback_rows = []
+
+    def fallback(self, X):
+        self.fallback_rows.append(X.shape[0])
+        return _model(X)
+
+    def test_materialized(self):
+        # 24 combinations, 13 distinct predictions stored once
+        self.assertEqual(self.table.shape, (3, 4, 2))
+        self.assertEqual(len(self.table.labels), 13)
+        self.assertEqual(self.table.codes.dtype, np.uint8)
+
+    def test_lookup(self):
+        X = pd.DataFrame(
+            {
+                "color": ["blue", "red", "green"],
+                "size": [4, 1, 2],
+                "flag": [True, True, False],
+            }
+        )
+        predictions, found = self.table.lookup(X)
+        self.assertTrue(found.all())
+        self.assertEqual(predictions.tolist(), ["blue-4", "red-1", "off"])
+        # no model call for rows in the table
+        self.assertEqual(
+            self.table.predict(X, self.fallback).tolist(), _model(X).tolist()
+        )
+        self.assertEqual(self.fallback_rows, [])
+
+    def test_fallback(self):
+        # rows with values outside the domains are predicted by the model only
+        X = pd.DataFrame(
+            {
+                "color": ["red", "purple", "green", "blue"],
+                "size": [1, 2, 99, 3],
+                "flag": [True, True, True, True],
+            }
+        )
+        _, found = self.table.lookup(X)
+        self.assertEqual(found.tolist(), [True, False, False, True])
+        predictions = self.table.predict(X, self.fallback)
+        self.assertEqual(
+            predictions.tolist(), ["red-1", "purple-2", "green-99", "blue-3"]
+        )
+        self.assertEqual(self.fallback_rows, [2])
+
+    def test_fallback_type(self):
+        # fallback predictions of another type are not truncated
+        table = PredictionTable({"x": [1, 2]}, {"x": np.int64}, lambda X: X["x"] * 10)
+        X = pd.DataFrame({"x": [1, 3]})
+        predictions = table.predict(X, lambda X: X["x"] * 0.5)
+        self.assertEqual(predictions.tolist(), [10.0, 1.5])
+
+    def test_empty(self):
+        X = pd.DataFrame({c: pd.Series([], dtype=t) for c, t in COLUMNS.items()})
+        self.assertEqual(len(self.table.predict(X, self.fallback)), 0)
+
+    def test_invalid_domains(self):
+        with self.assertRaises(ValueError):
+            PredictionTable({"color": ["red"]}, COLUMNS, _model)
+        with self.assertRaises(ValueError):
+            PredictionTable(DOMAINS, COLUMNS, _model, max_size=10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+from typing import List
+
+import numpy as np
+from pydantic import ValidationError, create_model, parse_obj_as
+
+from model_store.request_decoder import DecodeError, RequestDecoder
+
+SCHEMA = [
+    {"name": "x", "type": np.float64},
+    {"name": "n", "type": np.int64},
+    {"name": "b", "type": bool},
+    {"name": "s", "type": np.object_},
+]
+# pydantic request schema, as created by the model stores
+Request = create_model(
+    "Request", x=(float, ...), n=(int, ...), b=(bool, ...), s=(str, ...)
+)
+ROW = {"x": 1.5, "n": 1, "b": True, "s": "a"}
+
+
+def _pydantic_errors(body) -> list:
+    # errors of a FastAPI endpoint taking List[Request] as body
+    try:
+        parse_obj_as(List[Request], body)
+    except ValidationError as e:
+        return [
+            {**error, "loc": ["body", *error["loc"][1:]]}
+            for error in e.errors()
+            if "ctx" not in error
+        ]
+    return []
+
+
+class TestRequestDecoder(unittest.TestCase):
+    def setUp(self):
+        self.decoder = RequestDecoder(SCHEMA)
+
+    def assertSameErrors(self, body):
+        with self.assertRaises(DecodeError) as context:
+            self.decoder.decode(body)
+        self.assertCountEqual(context.exception.errors, _pydantic_errors(body))
+
+    def test_decode(self):
+        # values are coerced as by the pydantic schema
+        body = [ROW, {"x": "2", "n": "3", "b": "false", "s": 4}]
+        df = self.decoder.decode(body)
+        self.assertEqual(list(df.columns), ["x", "n", "b", "s"])
+        self.assertEqual(
+            df.dtypes.astype(str).tolist(), ["float64", "int64", "bool", "object"]
+        )
+        expected = [dict(row) for row in parse_obj_as(List[Request], body)]
+        self.assertEqual(df.to_dict(orient="records"), expected)
+
+    def test_extra_fields(self):
+        df = self.decoder.decode([{**ROW, "extra": 1}])
+        self.assertEqual(list(df.columns), ["x", "n", "b", "s"])
+
+    def test_empty(self):
+        self.assertEqual(self.decoder.decode([]).shape, (0, 4))
+
+    def test_missing_and_null(self):
+        self.assertSameErrors([ROW, {"x": None, "n": 1, "b": True}])
+
+    def test_invalid_values(self):
+        self.assertSameErrors([{**ROW, "x": "a"}, ROW, {**ROW, "n": "b", "b": "maybe"}])
+
+    def test_non_scalar_strings(self):
+        # lists and dicts are not coerced to strings
+        self.assertSameErrors([{**ROW, "s": [1, 2]}, ROW, {**ROW, "s": {"k": 1}}])
+
+    def test_overflow(self):
+        with self.assertRaises(DecodeError) as context:
+            self.decoder.decode([ROW, {**ROW, "x": 10**400, "n": 10**400}])
+        self.assertEqual(
+            [(e["loc"], e["type"]) for e in context.exception.errors],
+            [
+                (["body", 1, "x"], "type_error.float"),
+                (["body", 1, "n"], "type_error.integer"),
+            ],
+        )
+
+    def test_not_a_list(self):
+        with self.assertRaises(DecodeError) as context:
+            self.decoder.decode(ROW)
+        self.assertEqual(context.exception.errors[0]["type"], "type_error.list")
+        self.assertSameErrors([ROW, 1])
+
+    def test_decode_error(self):
+        # a DecodeError is a ValueError carrying the errors
+        error = DecodeError([{"loc": ["body"], "msg": "m", "type": "t"}])
+        self.assertIsInstance(error, ValueError)
+        self.assertEqual(error.errors[0]["msg"], "m")
+
+
+if __name__ == "__main__":
+    unittest.main()